@@ -1,25 +1,165 @@
-from django.contrib import admin
-from .models import Car, DailyEntry, WeeklySummary, MaintenanceEntry
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Min
+from django.utils.functional import cached_property
+
+from .models import Car, CarGroup, DailyEntry, WeeklySummary, MaintenanceEntry, SparePart, ServiceDue, Job
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that reads the planner's row estimate instead of running COUNT(*) on
+    an unfiltered PostgreSQL table of ESTIMATE_THRESHOLD rows or more.
+    Filtered changelists still get an exact count.
+    """
+    ESTIMATE_THRESHOLD = 100_000
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        query = getattr(qs, 'query', None)
+        if query is not None and not query.where and connections[qs.db].vendor == 'postgresql':
+            with connections[qs.db].cursor() as cursor:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [qs.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] >= self.ESTIMATE_THRESHOLD:
+                return int(row[0])
+        return super().count
+
+
+class CarAutocompleteFilter(admin.SimpleListFilter):
+    """Car filter with a search box (admin autocomplete) instead of one link per car."""
+    title = 'car'
+    parameter_name = 'car'
+    template = 'admin/cars/car_autocomplete_filter.html'
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        field = forms.ModelChoiceField(
+            queryset=Car.objects.all(), required=False,
+            widget=AutocompleteSelect(model._meta.get_field('car'), model_admin.admin_site),
+        )
+        self.widget_html = field.widget.render(self.parameter_name, self.car_id(), attrs={'id': 'car-filter'})
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def car_id(self):
+        try:
+            return int(self.value())
+        except (TypeError, ValueError):
+            return None
+
+    def queryset(self, request, queryset):
+        car_id = self.car_id()
+        if car_id is None:
+            return queryset
+        return queryset.filter(car_id=car_id)
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'display': 'All',
+        }
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables with millions of rows."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_select_related = ("car",)
+
+    @property
+    def media(self):
+        # select2 assets for CarAutocompleteFilter
+        car_field = self.model._meta.get_field('car')
+        return super().media + AutocompleteSelect(car_field, self.admin_site).media
+
+
+def _enqueue_week_recompute(modeladmin, request, queryset):
+    """One recompute job per car covering the selected weeks (one grouped query, no per-row saves)."""
+    from .jobs import enqueue_recompute
+    ranges = queryset.order_by().values('car_id').annotate(lo=Min('week_start'), hi=Max('week_start'))
+    jobs = [enqueue_recompute(r['car_id'], r['lo'], r['hi']) for r in ranges]
+    if any(job is not None for job in jobs):
+        modeladmin.message_user(request, f"Queued weekly recompute for {len(jobs)} car(s); see Jobs for progress.", messages.SUCCESS)
+    else:
+        modeladmin.message_user(request, f"Recomputed weekly summaries for {len(jobs)} car(s).", messages.SUCCESS)
+
 
 @admin.register(Car)
 class CarAdmin(admin.ModelAdmin):
     list_display = ("id", "car_model", "license_start", "license_end")
     search_fields = ("car_model",)
 
+@admin.register(CarGroup)
+class CarGroupAdmin(admin.ModelAdmin):
+    list_display = ("id", "name")
+    search_fields = ("name",)
+    autocomplete_fields = ("cars",)
+
 @admin.register(DailyEntry)
-class DailyEntryAdmin(admin.ModelAdmin):
-    list_display = ("id", "car", "inspection_date", "driver_name", "freight", "without")
-    list_filter = ("car", "week_start")
+class DailyEntryAdmin(ScalableAdmin):
+    list_display = ("id", "car__car_model", "inspection_date", "driver_name", "freight", "without")
+    list_filter = (CarAutocompleteFilter, "week_start")
     search_fields = ("driver_name", "area")
+    date_hierarchy = "inspection_date"
+    autocomplete_fields = ("car",)
+    actions = ("recompute_weeks",)
+
+    @admin.action(description="Recompute weekly summaries of the selected entries' weeks")
+    def recompute_weeks(self, request, queryset):
+        _enqueue_week_recompute(self, request, queryset)
 
 @admin.register(WeeklySummary)
-class WeeklySummaryAdmin(admin.ModelAdmin):
-    list_display = ("id", "car", "week_start", "odometer_start", "odometer_end", "net_revenue", "default_net_revenue")
-    list_filter = ("car", "week_start")
+class WeeklySummaryAdmin(ScalableAdmin):
+    list_display = ("id", "car__car_model", "week_start", "odometer_start", "odometer_end", "net_revenue", "default_net_revenue")
+    list_filter = (CarAutocompleteFilter, "week_start")
     search_fields = ("description",)
+    date_hierarchy = "week_start"
+    autocomplete_fields = ("car",)
+    actions = ("recompute_weeks",)
+
+    @admin.action(description="Recompute selected weekly summaries")
+    def recompute_weeks(self, request, queryset):
+        _enqueue_week_recompute(self, request, queryset)
 
 @admin.register(MaintenanceEntry)
-class MaintenanceEntryAdmin(admin.ModelAdmin):
-    list_display = ("id", "car", "date", "spare_part_type", "air_filter", "oil_filter", "gas_filter", "oil_change", "price")
-    list_filter = ("car", "date")
+class MaintenanceEntryAdmin(ScalableAdmin):
+    list_display = ("id", "car__car_model", "date", "spare_part_type", "spare_part", "air_filter", "oil_filter", "gas_filter", "oil_change", "price")
+    list_filter = (CarAutocompleteFilter, "date")
     search_fields = ("spare_part_type",)
+    autocomplete_fields = ("car", "spare_part")
+    list_select_related = ("car", "spare_part")
+
+    def save_model(self, request, obj, form, change):
+        # A part picked here is kept when the week's description changes
+        if "spare_part" in form.changed_data:
+            obj.spare_part_explicit = obj.spare_part is not None
+        super().save_model(request, obj, form, change)
+
+@admin.register(SparePart)
+class SparePartAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "key")
+    search_fields = ("name", "key")
+    readonly_fields = ("key",)
+
+@admin.register(ServiceDue)
+class ServiceDueAdmin(admin.ModelAdmin):
+    list_display = ("car", "service", "status", "last_service_date", "km_since", "days_since", "due_date", "computed_at")
+    list_filter = ("status", "service")
+    list_select_related = ("car",)
+    autocomplete_fields = ("car",)
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "job_type", "car_id", "week_start", "status", "attempts", "created_at", "finished_at")
+    list_filter = ("status", "job_type")
+    readonly_fields = ("dedupe_key", "created_at", "updated_at", "started_at", "finished_at")
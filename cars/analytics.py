@@ -0,0 +1,248 @@
+"""
+Vectorized fleet analytics.
+
+Functions here take plain NumPy arrays (one row per car-week, sorted by car then
+week) so that the whole fleet history is processed with array operations
+instead of one Decimal calculation per week.
+"""
+import numpy as np
+
+
+def group_bounds(car_ids):
+    """
+    For car_ids sorted ascending, return (codes, starts):
+    - codes: 0..n_cars-1 group index per row
+    - starts: index of the first row of each row's group
+    """
+    n = len(car_ids)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    new_group = np.empty(n, dtype=bool)
+    new_group[0] = True
+    new_group[1:] = car_ids[1:] != car_ids[:-1]
+    codes = np.cumsum(new_group) - 1
+    first_rows = np.flatnonzero(new_group)
+    return codes, first_rows[codes]
+
+
+def grouped_rolling_mean(values, starts, window):
+    """
+    Trailing rolling mean of values over `window` rows, restarted at each group.
+    NaN values are skipped; rows whose window has no valid value get NaN.
+    """
+    n = len(values)
+    valid = ~np.isnan(values)
+    csum = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+    ccount = np.concatenate(([0], np.cumsum(valid)))
+    idx = np.arange(n)
+    lo = np.maximum(idx - window + 1, starts)
+    sums = csum[idx + 1] - csum[lo]
+    counts = ccount[idx + 1] - ccount[lo]
+    out = np.full(n, np.nan)
+    np.divide(sums, counts, out=out, where=counts > 0)
+    return out
+
+
+def grouped_mean_std(values, codes, n_groups):
+    """Per-group mean, population std and count of the non-NaN values."""
+    valid = ~np.isnan(values)
+    v = np.where(valid, values, 0.0)
+    counts = np.bincount(codes, weights=valid, minlength=n_groups)
+    sums = np.bincount(codes, weights=v, minlength=n_groups)
+    sq_sums = np.bincount(codes, weights=v * v, minlength=n_groups)
+    mean = np.full(n_groups, np.nan)
+    np.divide(sums, counts, out=mean, where=counts > 0)
+    var = np.full(n_groups, np.nan)
+    np.divide(sq_sums, counts, out=var, where=counts > 0)
+    var = np.maximum(var - mean * mean, 0.0)
+    return mean, np.sqrt(var), counts
+
+
+def grouped_leave_one_out_mean_std(values, codes, n_groups):
+    """
+    Per-row mean and population std of the other non-NaN values of the row's group
+    (NaN rows get their whole group's), and the per-group count of non-NaN values.
+    Leaving the row out keeps a single extreme week from inflating the std it is
+    measured against: with n weeks, an in-sample z-score can never exceed sqrt(n - 1).
+    """
+    mean, _std, counts = grouped_mean_std(values, codes, n_groups)
+    valid = ~np.isnan(values)
+    # Centered on the group mean, so nearly equal values do not cancel catastrophically
+    centered = np.where(valid, values - mean[codes], 0.0)
+    sums = np.bincount(codes, weights=centered, minlength=n_groups)[codes] - centered
+    sq_sums = np.bincount(codes, weights=centered * centered, minlength=n_groups)[codes] - centered * centered
+    others = counts[codes] - valid
+    offset = np.full(len(values), np.nan)
+    np.divide(sums, others, out=offset, where=others > 0)
+    var = np.full(len(values), np.nan)
+    np.divide(sq_sums, others, out=var, where=others > 0)
+    var = np.maximum(var - offset * offset, 0.0)
+    return mean[codes] + offset, np.sqrt(var), counts
+
+
+def fuel_efficiency_outliers(car_ids, gas, distance, window=4, z_threshold=3.0, min_weeks=4):
+    """
+    Analyze gas-per-km for every car-week at once.
+
+    Inputs are equal-length arrays sorted by (car_id, week). Returns a dict of
+    arrays aligned with the inputs:
+    - gas_per_km: gas / distance (NaN when distance is 0)
+    - rolling_gas_per_km: trailing mean over `window` weeks of the same car
+    - baseline_gas_per_km, baseline_std: mean/std of the car's other weeks
+    - z_score: (gas_per_km - baseline) / std; ±inf when the other weeks are all
+      equal and this one differs
+    - flagged: |z_score| >= z_threshold for cars with at least min_weeks valid weeks
+    """
+    car_ids = np.asarray(car_ids, dtype=np.int64)
+    gas = np.asarray(gas, dtype=np.float64)
+    distance = np.asarray(distance, dtype=np.float64)
+
+    gas_per_km = np.full(len(gas), np.nan)
+    np.divide(gas, distance, out=gas_per_km, where=distance > 0)
+
+    codes, starts = group_bounds(car_ids)
+    n_groups = int(codes[-1]) + 1 if len(codes) else 0
+    rolling = grouped_rolling_mean(gas_per_km, starts, window)
+    row_mean, row_std, counts = grouped_leave_one_out_mean_std(gas_per_km, codes, n_groups)
+
+    z = np.full(len(gas), np.nan)
+    with np.errstate(invalid='ignore'):
+        diff = gas_per_km - row_mean
+        # Differences and spreads within rounding noise of the baseline count as none
+        same = np.abs(diff) <= 1e-9 * np.abs(row_mean)
+        spread = row_std > 1e-9 * np.abs(row_mean)
+        np.divide(diff, row_std, out=z, where=spread & ~same)
+        z[same] = 0.0
+        steady = ~spread & ~same & ~np.isnan(diff)
+        z[steady] = np.copysign(np.inf, diff[steady])
+        flagged = (np.abs(z) >= z_threshold) & (counts[codes] >= min_weeks)
+
+    return {
+        'gas_per_km': gas_per_km,
+        'rolling_gas_per_km': rolling,
+        'baseline_gas_per_km': row_mean,
+        'baseline_std': row_std,
+        'z_score': z,
+        'flagged': flagged,
+    }
+
+
+# z-values for the supported two-sided prediction interval levels
+INTERVAL_Z = {80: 1.2816, 90: 1.6449, 95: 1.96}
+
+WEEKS_PER_YEAR = 52.1775
+
+
+def trend_seasonal_design(t, harmonics):
+    """
+    Design matrix for y = a + b*t + sum_k (c_k sin(2πkt/52) + d_k cos(2πkt/52)).
+    t is in weeks; the trend column is scaled to years to keep coefficients comparable.
+    """
+    t = np.asarray(t, dtype=np.float64)
+    cols = [np.ones_like(t), t / WEEKS_PER_YEAR]
+    for k in range(1, harmonics + 1):
+        angle = 2.0 * np.pi * k * t / WEEKS_PER_YEAR
+        cols.append(np.sin(angle))
+        cols.append(np.cos(angle))
+    return np.column_stack(cols)
+
+
+def fit_trend_seasonal(Y, W, horizon, level=95, harmonics=2, ridge=1.0):
+    """
+    Fit one trend + seasonal model per row of Y in a single batch of matrix operations.
+
+    - Y: (series, weeks) observations on a shared weekly grid
+    - W: (series, weeks) 1.0 where the observation counts, 0.0 before a series starts
+    - horizon: number of weeks to project past the end of the grid
+    A small ridge penalty on the seasonal terms keeps series shorter than a year stable.
+
+    Returns (forecast, lower, upper), each of shape (series, horizon).
+    """
+    Y = np.asarray(Y, dtype=np.float64)
+    W = np.asarray(W, dtype=np.float64)
+    n_weeks = Y.shape[1]
+    X = trend_seasonal_design(np.arange(n_weeks), harmonics)
+    Xf = trend_seasonal_design(np.arange(n_weeks, n_weeks + horizon), harmonics)
+    p = X.shape[1]
+
+    penalty = np.eye(p) * ridge
+    penalty[0, 0] = 0.0
+    # Tiny trend penalty so a series with a single observed week is still solvable (flat projection)
+    penalty[1, 1] = 1e-6
+    XtWX = np.einsum('bt,tp,tq->bpq', W, X, X) + penalty
+    # Keep the system solvable for series with no observations at all (they project 0)
+    n_obs = W.sum(axis=1)
+    XtWX[n_obs == 0, 0, 0] = 1.0
+    XtWy = np.einsum('bt,tp,bt->bp', W, X, Y)
+    inv = np.linalg.inv(XtWX)
+    beta = np.einsum('bpq,bq->bp', inv, XtWy)
+
+    fitted = beta @ X.T
+    dof = np.maximum(n_obs - p, 1.0)
+    sigma = np.sqrt((W * (Y - fitted) ** 2).sum(axis=1) / dof)
+
+    forecast = beta @ Xf.T
+    leverage = np.einsum('hp,bpq,hq->bh', Xf, inv, Xf)
+    half_width = INTERVAL_Z[level] * sigma[:, None] * np.sqrt(1.0 + leverage)
+    return forecast, forecast - half_width, forecast + half_width
+
+
+def _car_day_key(car_ids, days):
+    """Sortable int64 key of (car, day ordinal) pairs."""
+    return (np.asarray(car_ids, dtype=np.int64) << 32) | np.asarray(days, dtype=np.int64)
+
+
+def odometer_readings(week_car, week_day, odo_start, odo_end, car, day, rate_days=56):
+    """
+    Odometer reading of every (car[i], day[i]) pair, looked up in the weekly
+    readings of the whole fleet at once.
+
+    Week arrays are sorted by (car, week start); days are date ordinals. A day
+    inside a recorded week is interpolated between the week's start and end
+    readings, a day after it (no later week yet) gets its end reading, and a
+    day before the car's first week gets the first start reading.
+    Returns a dict of arrays aligned with car/day:
+    - reading: odometer at the day (NaN when the car has no weekly readings)
+    - current: end reading of the car's latest week
+    - current_day: day ordinal of that week's last day
+    - km_per_day: the car's average over its last `rate_days` days of readings
+    """
+    week_car = np.asarray(week_car, dtype=np.int64)
+    week_day = np.asarray(week_day, dtype=np.int64)
+    odo_start = np.asarray(odo_start, dtype=np.float64)
+    odo_end = np.asarray(odo_end, dtype=np.float64)
+    car = np.asarray(car, dtype=np.int64)
+    day = np.asarray(day, dtype=np.int64)
+    n = len(week_car)
+    nan = np.full(len(car), np.nan)
+    if n == 0:
+        return {'reading': nan, 'current': nan.copy(), 'current_day': nan.copy(), 'km_per_day': nan.copy()}
+
+    week_key = _car_day_key(week_car, week_day)
+    first = np.searchsorted(week_car, car, side='left')
+    last = np.searchsorted(week_car, car, side='right') - 1
+    has_weeks = last >= first
+    first_c = np.minimum(first, n - 1)
+    last_c = np.clip(last, 0, n - 1)
+
+    # Latest week of the same car starting on or before the day
+    at = np.searchsorted(week_key, _car_day_key(car, day), side='right') - 1
+    in_history = has_weeks & (at >= first)
+    at_c = np.clip(at, 0, n - 1)
+    fraction = np.clip(day - week_day[at_c], 0, 7) / 7.0
+    within = odo_start[at_c] + np.maximum(odo_end[at_c] - odo_start[at_c], 0.0) * fraction
+    reading = np.where(in_history, within, odo_start[first_c])
+
+    current_day = week_day[last_c] + 6
+    # Rate over the weeks starting within rate_days of the latest week's end
+    since = np.searchsorted(week_key, _car_day_key(car, current_day - rate_days), side='left')
+    since = np.clip(np.maximum(since, first), 0, n - 1)
+    span = current_day + 1 - week_day[since]
+    km_per_day = np.maximum(odo_end[last_c] - odo_start[since], 0.0) / np.maximum(span, 1)
+
+    return {
+        'reading': np.where(has_weeks, reading, np.nan),
+        'current': np.where(has_weeks, odo_end[last_c], np.nan),
+        'current_day': np.where(has_weeks, current_day, np.nan),
+        'km_per_day': np.where(has_weeks, km_per_day, np.nan),
+    }
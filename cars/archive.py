@@ -0,0 +1,361 @@
+"""
+Columnar cold storage for closed years of DailyEntry rows.
+
+`manage.py archive_daily` moves a (year, car) partition out of the database
+into one .npy file per column under ARCHIVE_ROOT/daily/<year>/car_<id>/ and
+records it as an ArchivedPartition row. Report code reads archived ranges
+through the helpers below, which memory-map the column files and slice them
+without copying, so results match what the live table would have returned.
+
+Money columns are stored as int64 cents and dates as int32 days since
+1970-01-01, which keeps sums exact.
+
+Every memory-mapped column holds a file descriptor, so each process keeps the
+columns of recently read partitions open up to ARCHIVE_MAX_OPEN_FILES and
+drops the least recently used partitions beyond that.
+
+To the delta-sync feed (cars/sync.py) archiving is a delete and restoring a
+re-insert: archived rows get a SyncTombstone, and restored rows an updated_at
+of the restore, so synced clients drop and later re-fetch them.
+"""
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .models import SYNC_MODEL_NAMES, ArchivedPartition, DailyEntry, EXPENSE_FIELDS, SyncTombstone
+
+MONEY_FIELDS = ('freight', 'default_freight') + EXPENSE_FIELDS + ('daily_expense_total',)
+DATE_FIELDS = ('inspection_date', 'week_start')
+TEXT_FIELDS = ('day_name', 'driver_name', 'area')
+DATETIME_FIELDS = ('created_at', 'updated_at')
+COLUMNS = ('id',) + DATE_FIELDS + TEXT_FIELDS + MONEY_FIELDS + DATETIME_FIELDS
+
+EPOCH = date(1970, 1, 1)
+EPOCH_DT = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def archive_root():
+    return Path(settings.ARCHIVE_ROOT) / 'daily'
+
+
+def partition_dir(year, car_id):
+    return archive_root() / str(year) / f'car_{car_id}'
+
+
+def to_days(d):
+    return (d - EPOCH).days
+
+
+def from_days(n):
+    return EPOCH + timedelta(days=int(n))
+
+
+def cents_to_decimal(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+# Writing
+
+def write_partition(rows, path):
+    """
+    Write rows (dicts with every name in COLUMNS, sorted by inspection_date) as
+    one .npy file per column. Files go to a temporary directory that is renamed
+    into place, so readers never see a half-written partition.
+    """
+    tmp = path.with_name(path.name + '.tmp')
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    arrays = {
+        'id': np.array([r['id'] for r in rows], dtype=np.int64),
+    }
+    for field in DATE_FIELDS:
+        arrays[field] = np.array([to_days(r[field]) for r in rows], dtype=np.int32)
+    for field in TEXT_FIELDS:
+        arrays[field] = np.array([r[field] or '' for r in rows], dtype=np.str_)
+    for field in MONEY_FIELDS:
+        arrays[field] = np.array([int((r[field] or 0) * 100) for r in rows], dtype=np.int64)
+    for field in DATETIME_FIELDS:
+        arrays[field] = np.array(
+            [(r[field] - EPOCH_DT) // timedelta(microseconds=1) if r[field] else 0 for r in rows], dtype=np.int64
+        )
+    for name, arr in arrays.items():
+        np.save(tmp / f'{name}.npy', arr)
+    if path.exists():
+        shutil.rmtree(path)
+    tmp.rename(path)
+
+
+def remove_partition_files(path):
+    # Other processes may still have the files memory-mapped (which blocks deletion on Windows);
+    # leftover files are harmless because readers only open partitions listed in the database.
+    shutil.rmtree(path, ignore_errors=True)
+
+
+# Reading
+
+class OpenPartition:
+    """The memory-mapped columns of one partition, each opened on first use."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.columns = {}
+
+    def column(self, name):
+        arr = self.columns.get(name)
+        if arr is None:
+            arr = self.columns[name] = np.load(self.path / f'{name}.npy', mmap_mode='r')
+        return arr
+
+    def close(self):
+        # A map's file descriptor is closed once the last slice of it is freed
+        self.columns = {}
+
+
+_open_partitions = OrderedDict()
+_open_lock = threading.Lock()
+
+
+def _open_partition(part):
+    """OpenPartition of an ArchivedPartition row. Keyed by the archive run, so a re-archived year is reopened."""
+    path = partition_dir(part.year, part.car_id)
+    key = (str(path), part.pk, part.archived_at)
+    with _open_lock:
+        opened = _open_partitions.pop(key, None)
+        if opened is None:
+            opened = OpenPartition(path)
+        _open_partitions[key] = opened
+        _evict_partitions(keep=opened)
+    return opened
+
+
+def _evict_partitions(keep=None):
+    limit = getattr(settings, 'ARCHIVE_MAX_OPEN_FILES', 256)
+    open_files = sum(len(p.columns) for p in _open_partitions.values())
+    for key in list(_open_partitions):
+        if open_files <= limit - len(COLUMNS):
+            break
+        if _open_partitions[key] is not keep:
+            open_files -= len(_open_partitions[key].columns)
+            _open_partitions.pop(key).close()
+
+
+def close_partitions():
+    """Drop every open partition of this process."""
+    with _open_lock:
+        while _open_partitions:
+            _open_partitions.popitem()[1].close()
+
+
+def has_partitions():
+    """
+    False when nothing was ever archived under ARCHIVE_ROOT, which skips the
+    ArchivedPartition queries of report requests. Partition files are written
+    before their row is created, so without the directory there are no rows.
+    """
+    return archive_root().is_dir()
+
+
+def _partitions(car_ids, date_from, date_to):
+    if not has_partitions():
+        return []
+    qs = ArchivedPartition.objects.all()
+    if car_ids is not None:
+        qs = qs.filter(car_id__in=list(car_ids))
+    if date_from:
+        qs = qs.filter(year__gte=date_from.year)
+    if date_to:
+        qs = qs.filter(year__lte=date_to.year)
+    return list(qs.order_by('car_id', 'year'))
+
+
+def iter_archived(columns, car_ids=None, date_from=None, date_to=None, week_from=None, week_to=None):
+    """
+    Yield (car_id, {column: array}) for archived rows with inspection_date in
+    [date_from, date_to] and week_start in [week_from, week_to] (bounds optional).
+    Arrays are zero-copy slices of the memory-mapped column files.
+    """
+    # A week's entries fall between week_start and week_start + 6 days
+    span_from = max(filter(None, [date_from, week_from]), default=None)
+    span_to = min(filter(None, [date_to, week_to and week_to + timedelta(days=6)]), default=None)
+    for part in _partitions(car_ids, span_from, span_to):
+        opened = _open_partition(part)
+        dates = opened.column('inspection_date')
+        lo, hi = 0, len(dates)
+        if date_from:
+            lo = max(lo, int(np.searchsorted(dates, to_days(date_from), 'left')))
+        if date_to:
+            hi = min(hi, int(np.searchsorted(dates, to_days(date_to), 'right')))
+        # week_start is non-decreasing because rows are sorted by inspection_date
+        weeks = opened.column('week_start')
+        if week_from:
+            lo = max(lo, int(np.searchsorted(weeks, to_days(week_from), 'left')))
+        if week_to:
+            hi = min(hi, int(np.searchsorted(weeks, to_days(week_to), 'right')))
+        if lo >= hi:
+            continue
+        yield part.car_id, {c: opened.column(c)[lo:hi] for c in columns}
+
+
+def archived_totals(car_id, fields, date_from=None, date_to=None, week_start=None):
+    """Sum archived money fields for one car, like QuerySet.aggregate(Sum(...)); None when no rows match."""
+    totals = {f: None for f in fields}
+    for _car, cols in iter_archived(fields, [car_id], date_from, date_to, week_start, week_start):
+        for f in fields:
+            totals[f] = (totals[f] or Decimal('0.00')) + cents_to_decimal(cols[f].sum())
+    return totals
+
+
+def archived_week_totals(fields, car_ids=None, week_from=None, week_to=None):
+    """Sum archived money fields grouped by (car_id, week_start) -> {field: Decimal}."""
+    out = {}
+    for car_id, cols in iter_archived(('week_start',) + tuple(fields), car_ids, week_from=week_from, week_to=week_to):
+        weeks, starts = np.unique(cols['week_start'], return_index=True)
+        sums = {f: np.add.reduceat(np.asarray(cols[f]), starts) for f in fields}
+        for i, w in enumerate(weeks):
+            row = out.setdefault((car_id, from_days(w)), {f: Decimal('0.00') for f in fields})
+            for f in fields:
+                row[f] += cents_to_decimal(sums[f][i])
+    return out
+
+
+def archived_week_month_totals(fields, car_ids=None, date_from=None, week_to=None):
+    """
+    Sum archived money fields grouped by (car_id, week_start, year, month of inspection_date)
+    for rows with inspection_date >= date_from and week_start <= week_to -> {field: Decimal}.
+    """
+    out = {}
+    columns = ('inspection_date', 'week_start') + tuple(fields)
+    for car_id, cols in iter_archived(columns, car_ids, date_from=date_from, week_to=week_to):
+        months = np.asarray(cols['inspection_date']).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        keys, inverse = np.unique(
+            np.stack([np.asarray(cols['week_start'], dtype=np.int64), months], axis=1), axis=0, return_inverse=True,
+        )
+        inverse = inverse.ravel()
+        for f in fields:
+            sums = np.zeros(len(keys), dtype=np.int64)
+            np.add.at(sums, inverse, np.asarray(cols[f]))
+            for i, (week, month) in enumerate(keys):
+                key = (car_id, from_days(week), 1970 + int(month) // 12, int(month) % 12 + 1)
+                row = out.setdefault(key, {g: Decimal('0.00') for g in fields})
+                row[f] += cents_to_decimal(sums[i])
+    return out
+
+
+def _to_entries(car_id, cols):
+    entries = []
+    for i in range(len(cols['id'])):
+        values = {'id': int(cols['id'][i]), 'car_id': car_id}
+        for f in DATE_FIELDS:
+            values[f] = from_days(cols[f][i])
+        for f in TEXT_FIELDS:
+            values[f] = str(cols[f][i])
+        for f in MONEY_FIELDS:
+            values[f] = cents_to_decimal(cols[f][i])
+        for f in DATETIME_FIELDS:
+            values[f] = EPOCH_DT + timedelta(microseconds=int(cols[f][i]))
+        entries.append(DailyEntry(**values))
+    return entries
+
+
+def archived_entries(car_id, week_start, week_to=None):
+    """Unsaved DailyEntry instances for an archived car-week (or weeks up to week_to), ordered by inspection_date."""
+    entries = []
+    for _car, cols in iter_archived(COLUMNS, [car_id], week_from=week_start, week_to=week_to or week_start):
+        entries.extend(_to_entries(car_id, cols))
+    return entries
+
+
+def is_archived(car_id, year):
+    return has_partitions() and ArchivedPartition.objects.filter(car_id=car_id, year=year).exists()
+
+
+def merge_totals(live, archived):
+    """Add archived sums into a live aggregate dict in place (None + None stays None)."""
+    for key, value in archived.items():
+        if value is not None:
+            live[key] = Decimal(str(live.get(key) or 0)) + value
+    return live
+
+
+# Moving partitions in and out of the database
+
+def archive_partition(car_id, year):
+    """
+    Move one car's daily entries for `year` into column files, verify the files
+    against the database sums, then delete the rows. Returns the number of rows archived.
+    """
+    from django.db import transaction
+    from django.db.models import Sum
+    from django.utils import timezone
+    from .cache import bump_data_version
+
+    qs = DailyEntry.objects.filter(car_id=car_id, inspection_date__year=year)
+    rows = list(qs.order_by('inspection_date', 'id').values(*COLUMNS))
+    if not rows:
+        return 0
+    path = partition_dir(year, car_id)
+    write_partition(rows, path)
+
+    expected = qs.aggregate(**{f: Sum(f) for f in MONEY_FIELDS})
+    totals = {f: int(np.load(path / f'{f}.npy', mmap_mode='r').sum()) for f in MONEY_FIELDS}
+    mismatched = [f for f in MONEY_FIELDS if int((expected[f] or 0) * 100) != totals[f]]
+    if mismatched:
+        remove_partition_files(path)
+        raise ValueError(f'Archive verification failed for car {car_id} year {year}: {", ".join(mismatched)}')
+
+    try:
+        with transaction.atomic():
+            ArchivedPartition.objects.create(car_id=car_id, year=year, rows=len(rows), totals=totals)
+            # Raw delete: no per-row signals or collector, the partition row above replaces them
+            deleted = qs.order_by()._raw_delete(qs.db)
+            if deleted != len(rows):
+                raise ValueError(f'Rows for car {car_id} year {year} changed while archiving, nothing was archived')
+            # The raw delete skips the post_delete signal that writes tombstones for the sync feed
+            now = timezone.now()
+            SyncTombstone.objects.bulk_create([
+                SyncTombstone(model=SYNC_MODEL_NAMES['DailyEntry'], object_id=row['id'], car_id=car_id, deleted_at=now)
+                for row in rows
+            ], batch_size=1000)
+    except Exception:
+        remove_partition_files(path)
+        raise
+    bump_data_version(car_id)
+    return len(rows)
+
+
+def restore_partition(partition):
+    """Load an archived partition back into the database and drop its files. Returns the row count."""
+    from django.db import transaction
+    from django.utils import timezone
+    from .cache import bump_data_version
+
+    entries = []
+    year_start, year_end = date(partition.year, 1, 1), date(partition.year, 12, 31)
+    for car_id, cols in iter_archived(COLUMNS, [partition.car_id], year_start, year_end):
+        entries.extend(_to_entries(car_id, cols))
+    close_partitions()
+    created_at = [entry.created_at for entry in entries]
+    with transaction.atomic():
+        # bulk_create stamps both auto_now fields with the current time; created_at is put
+        # back so the sync feed sends the rows as updates of the original rows.
+        DailyEntry.objects.bulk_create(entries, batch_size=1000)
+        for entry, created in zip(entries, created_at):
+            entry.created_at = created
+        DailyEntry.objects.bulk_update(entries, ['created_at'], batch_size=1000)
+        # Files are removed on commit by the ArchivedPartition post_delete signal
+        partition.delete()
+        # Last statement, so updated_at is within SYNC_SETTLE_SECONDS of the commit however
+        # long the inserts took: a sync running meanwhile must not get a token past the rows.
+        # The year is read-only while archived, so these are exactly the restored rows.
+        DailyEntry.objects.filter(
+            car_id=partition.car_id, inspection_date__range=(year_start, year_end),
+        ).update(updated_at=timezone.now())
+    bump_data_version(partition.car_id)
+    return len(entries)
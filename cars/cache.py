@@ -0,0 +1,109 @@
+"""
+Data-versioned caching for derived reports.
+
+Every write to a car's data bumps that car's version and the fleet version
+(see the signal handlers at the bottom of models.py). Cache keys embed the
+current version, so cached reports never need explicit invalidation: after a
+write the old keys are simply never read again and expire on their own.
+
+Writes that bypass model signals (bulk_create, bulk_update, queryset.update)
+must call bump_data_version() themselves.
+
+Reports over a set of cars (car groups) use members_versioned_key(), which
+embeds the version of every member, so they are invalidated by a write to any
+member (or a change of membership) and not by writes to other cars.
+
+Versions and reports live in the 'reports' cache, which must be shared by all
+worker processes and by management commands (they bump versions and warm
+reports). On a per-process backend (locmem, dummy) a bump would only reach the
+process that made it, so reports are then not cached at all (see
+report_cache_enabled and the cars.W001 system check).
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.connection import ConnectionProxy
+
+REPORT_CACHE_ALIAS = 'reports'
+FLEET_VERSION_KEY = 'cars:version:fleet'
+REPORT_CACHE_TIMEOUT = getattr(settings, 'REPORT_CACHE_TIMEOUT', 300)
+PER_PROCESS_BACKENDS = ('locmem', 'dummy')
+
+cache = ConnectionProxy(caches, REPORT_CACHE_ALIAS)
+
+
+def report_cache_enabled():
+    """True when the reports cache is shared between processes and REPORT_CACHE_TIMEOUT is positive."""
+    backend = settings.CACHES.get(REPORT_CACHE_ALIAS, {}).get('BACKEND', '').lower()
+    return REPORT_CACHE_TIMEOUT > 0 and not any(name in backend for name in PER_PROCESS_BACKENDS)
+
+
+def _new_version():
+    return uuid.uuid4().hex
+
+
+def _version_key(car_id=None):
+    if car_id is None:
+        return FLEET_VERSION_KEY
+    return f'cars:version:car:{car_id}'
+
+
+def get_data_version(car_id=None):
+    """Return the current data version for a car, or for the whole fleet if car_id is None."""
+    key = _version_key(car_id)
+    version = cache.get(key)
+    if version is None:
+        # A random token, so keys cached before a cache restart are not reused
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_data_version(car_id=None):
+    """Invalidate cached reports for a car (and always for the fleet)."""
+    keys = [FLEET_VERSION_KEY]
+    if car_id is not None:
+        keys.append(_version_key(car_id))
+
+    def bump():
+        # A fresh random token rather than incr(), which file and database backends do
+        # as get + set: two concurrent bumps could otherwise leave one version behind
+        cache.set_many({key: _new_version() for key in keys}, None)
+
+    bump()
+    # Again once the write commits: a report built between the first bump and the
+    # commit read the old rows and must not stay cached under the new version
+    transaction.on_commit(bump)
+
+
+def versioned_key(prefix, *parts, car_id=None):
+    """Build a cache key that changes whenever the car's (or the fleet's) data changes."""
+    version = get_data_version(car_id)
+    scope = 'fleet' if car_id is None else f'car{car_id}'
+    return ':'.join(['cars', prefix, scope, str(version), *map(str, parts)])
+
+
+def members_versioned_key(prefix, car_ids, *parts):
+    """Build a cache key that changes whenever the data of any of car_ids, or the set itself, changes."""
+    car_ids = sorted(set(car_ids))
+    keys = [_version_key(car_id) for car_id in car_ids]
+    versions = cache.get_many(keys)
+    for car_id, key in zip(car_ids, keys):
+        if key not in versions:
+            versions[key] = get_data_version(car_id)
+    digest = hashlib.sha1(','.join(f'{car_id}:{versions[key]}' for car_id, key in zip(car_ids, keys)).encode()).hexdigest()
+    return ':'.join(['cars', prefix, 'members', digest, *map(str, parts)])
+
+
+def cached_report(key, build, timeout=None):
+    """Return the value cached under `key`, or build() it and cache it for REPORT_CACHE_TIMEOUT."""
+    if not report_cache_enabled():
+        return build()
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, REPORT_CACHE_TIMEOUT if timeout is None else timeout)
+    return value
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from .cache import PER_PROCESS_BACKENDS, REPORT_CACHE_ALIAS
+
+
+@register()
+def check_report_cache(app_configs, **kwargs):
+    """Report caching needs a cache that all worker processes and management commands share."""
+    backend = settings.CACHES.get(REPORT_CACHE_ALIAS, {}).get('BACKEND', '')
+    if any(name in backend.lower() for name in PER_PROCESS_BACKENDS):
+        return [Warning(
+            f"The '{REPORT_CACHE_ALIAS}' cache uses {backend}, which each process keeps for itself, "
+            "so report caching is off.",
+            hint='Set REPORT_CACHE_BACKEND to a shared cache (file-based or Redis) to cache reports.',
+            id='cars.W001',
+        )]
+    return []
@@ -0,0 +1,57 @@
+"""
+Deleting a car with years of history.
+
+Car.delete() makes Django's collector load every related row into memory and
+send a post_delete signal per row, inside one long transaction. delete_car()
+instead removes the dependent rows by primary-key chunks with raw DELETEs
+(each chunk its own short transaction) and deletes the car itself last, when
+only a handful of related rows can be left for the collector.
+
+Skipped per-row signals are replaced by their aggregate effect: one cache
+version bump for the car (and the fleet), and the car's own sync tombstone,
+which tells offline clients to drop all of its rows.
+"""
+from django.db import transaction
+
+from .cache import bump_data_version
+from .events import publish_invalidate
+from .models import ArchivedPartition, Car, DailyEntry, Job, MaintenanceEntry, WeeklySummary
+
+DELETE_CHUNK_SIZE = 5000
+
+
+def _delete_in_chunks(queryset, chunk_size):
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by().values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            deleted += queryset.model.objects.filter(id__in=ids)._raw_delete(queryset.db)
+
+
+def delete_car(car_id, chunk_size=DELETE_CHUNK_SIZE):
+    """
+    Delete a car and everything that belongs to it without loading the rows.
+    Returns {model name: rows deleted}, or None if the car does not exist.
+    """
+    if not Car.objects.filter(pk=car_id).exists():
+        return None
+    counts = {}
+    for model in (MaintenanceEntry, DailyEntry, WeeklySummary):
+        counts[model.__name__] = _delete_in_chunks(model.objects.filter(car_id=car_id), chunk_size)
+    counts['Job'] = _delete_in_chunks(Job.objects.filter(car_id=car_id).exclude(status=Job.RUNNING), chunk_size)
+    # A running job keeps its row, detached from the car, so its worker can still record the outcome
+    Job.objects.filter(car_id=car_id, status=Job.RUNNING).update(car=None)
+    bump_data_version(car_id)
+    publish_invalidate(car_id)
+
+    with transaction.atomic():
+        # Few rows; deleted through the ORM so their column files are removed on commit
+        counts['ArchivedPartition'] = ArchivedPartition.objects.filter(car_id=car_id).delete()[0]
+        # Rows written while the chunks ran (if any) go through the regular cascade here
+        car = Car.objects.filter(pk=car_id).first()
+        if car is not None:
+            car.delete()
+    counts['Car'] = int(car is not None)
+    return counts
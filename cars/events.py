@@ -0,0 +1,316 @@
+"""
+Live change events for dashboards (GET /api/events/, server-sent events).
+
+Every write of a DailyEntry, WeeklySummary or MaintenanceEntry publishes a
+compact delta (the row, or its id when deleted) once its transaction commits;
+see the signal handlers at the bottom of models.py. Writes that bypass model
+signals (imports, bulk recomputes, car deletion) publish an `invalidate`
+event for the car instead, telling clients to refetch its reports.
+
+Events go through the broadcaster named by EVENT_BROADCASTER:
+- InProcessBroadcaster (default) hands events to the subscribers of this
+  process. It reaches every client when one process serves the API and the
+  stream, e.g. `uvicorn project.asgi:application`.
+- PostgresBroadcaster relays events through PostgreSQL LISTEN/NOTIFY, so the
+  writes of every worker process (and of run_jobs) reach every stream.
+Another broker only needs to override publish() and feed received events to
+deliver(); subscriptions stay in-process.
+
+With an in-process broadcaster and several server processes (the gunicorn
+profile records its worker count through set_server_processes) a stream
+would silently miss the writes of the other processes, so /api/events/
+answers 503 instead. Under WSGI every open stream holds a worker thread, so
+streams there end after EVENT_WSGI_STREAM_MAX_SECONDS and the client
+reconnects.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per client before it is told to resync instead
+SUBSCRIPTION_BUFFER = 1000
+
+# Server processes serving the API, set by the gunicorn profile's post_worker_init hook
+server_processes = 1
+
+
+def set_server_processes(count):
+    global server_processes
+    server_processes = count
+
+
+class Subscription:
+    """
+    Events for one stream, optionally limited to one car. Filled from any thread;
+    read with get() from a thread or with aget() from the event loop that subscribed.
+    When the client falls SUBSCRIPTION_BUFFER events behind, the buffer is dropped
+    and the next read reports an overflow, so a stalled client cannot grow memory.
+    """
+    def __init__(self, broadcaster, car_id=None):
+        self.broadcaster = broadcaster
+        self.car_id = car_id
+        self._events = deque()
+        self._overflowed = False
+        self._cond = threading.Condition()
+        try:
+            self._loop = asyncio.get_running_loop()
+            self._ready = asyncio.Event()
+        except RuntimeError:
+            self._loop = self._ready = None
+
+    def matches(self, event):
+        return self.car_id is None or event.get('car_id') in (None, self.car_id)
+
+    def put(self, event):
+        with self._cond:
+            if len(self._events) >= SUBSCRIPTION_BUFFER:
+                self._events.clear()
+                self._overflowed = True
+            else:
+                self._events.append(event)
+            self._cond.notify()
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._ready.set)
+            except RuntimeError:
+                pass  # the stream's loop is closed; it is being unsubscribed
+
+    def _drain(self):
+        events, overflowed = list(self._events), self._overflowed
+        self._events.clear()
+        self._overflowed = False
+        return events, overflowed
+
+    def get(self, timeout):
+        """(events, overflowed) once something arrived, or ([], False) after timeout seconds."""
+        with self._cond:
+            if not self._events and not self._overflowed:
+                self._cond.wait(timeout)
+            return self._drain()
+
+    async def aget(self, timeout):
+        """Like get(), without blocking the event loop."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._ready.clear()
+        with self._cond:
+            return self._drain()
+
+    def close(self):
+        self.broadcaster.unsubscribe(self)
+
+
+class InProcessBroadcaster:
+    """Fans published events out to the subscriptions of this process."""
+    # Whether writes made in other processes reach this process's subscriptions
+    cross_process = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+
+    def subscribe(self, car_id=None):
+        subscription = Subscription(self, car_id)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscriptions)
+
+    def publish(self, event):
+        self.deliver(event)
+
+    def deliver(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.matches(event):
+                subscription.put(event)
+
+
+class PostgresBroadcaster(InProcessBroadcaster):
+    """
+    Publishes with NOTIFY on the default database; each process runs one thread
+    that LISTENs on its own connection and delivers to its subscriptions.
+    Requires PostgreSQL (DATABASE_URL).
+    """
+    cross_process = True
+    CHANNEL = 'cars_events'
+    # NOTIFY payloads are limited to 8000 bytes
+    MAX_PAYLOAD = 7900
+    RECONNECT_SECONDS = 2
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def publish(self, event):
+        from django.db import connection
+        payload = encode(event)
+        if len(payload.encode()) > self.MAX_PAYLOAD:
+            payload = encode(invalidate_event(event.get('car_id')))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.CHANNEL, payload])
+
+    def subscribe(self, car_id=None):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='cars-events-listener', daemon=True)
+                self._listener.start()
+        return super().subscribe(car_id)
+
+    def _listen(self):
+        import psycopg
+        from django.db import connections
+
+        params = connections['default'].get_connection_params()
+        while True:
+            try:
+                with psycopg.connect(**params, autocommit=True) as conn:
+                    conn.execute(f'LISTEN {self.CHANNEL}')
+                    for notify in conn.notifies():
+                        self.deliver(json.loads(notify.payload))
+            except Exception:
+                logger.exception('Event listener lost its database connection, reconnecting')
+            # Events may have been missed while disconnected
+            self.deliver(resync_event())
+            time.sleep(self.RECONNECT_SECONDS)
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster():
+    global _broadcaster
+    if _broadcaster is None:
+        with _broadcaster_lock:
+            if _broadcaster is None:
+                _broadcaster = import_string(getattr(settings, 'EVENT_BROADCASTER', 'cars.events.InProcessBroadcaster'))()
+    return _broadcaster
+
+
+def streams_supported():
+    """False when streams would miss writes: an in-process broadcaster in one of several server processes."""
+    return get_broadcaster().cross_process or server_processes <= 1
+
+
+def encode(event):
+    return json.dumps(event, cls=DjangoJSONEncoder, separators=(',', ':'))
+
+
+def publish(event):
+    """Publish an event once the current transaction commits (immediately outside one)."""
+    def send():
+        try:
+            get_broadcaster().publish(event)
+        except Exception:
+            # Live updates are best effort; the write itself has succeeded
+            logger.exception('Publishing %s event failed', event.get('type'))
+    transaction.on_commit(send)
+
+
+def row_event(event_type, instance, op):
+    """Compact delta of a written or deleted row: the row's fields (money as strings), or only its id."""
+    from .models import week_start_from_date
+
+    week_start = getattr(instance, 'week_start', None)
+    if week_start is None and getattr(instance, 'date', None):
+        week_start = week_start_from_date(instance.date)
+    event = {'type': event_type, 'op': op, 'id': instance.pk, 'car_id': instance.car_id, 'week_start': week_start}
+    if op != 'delete':
+        event['data'] = {
+            f.attname: getattr(instance, f.attname)
+            for f in instance._meta.concrete_fields if f.attname not in ('created_at', 'updated_at')
+        }
+    return event
+
+
+def invalidate_event(car_id):
+    return {'type': 'invalidate', 'car_id': car_id}
+
+
+def resync_event():
+    return {'type': 'resync'}
+
+
+def publish_invalidate(car_id):
+    """For writes that bypass model signals: tell the car's subscribers to refetch."""
+    publish(invalidate_event(car_id))
+
+
+class EventStream:
+    """
+    Server-sent events of one client: iterate it from a WSGI worker thread, or
+    asynchronously under ASGI, where an open stream costs no thread. A comment
+    line is sent every EVENT_KEEPALIVE_SECONDS without events so proxies keep
+    the connection open. After EVENT_STREAM_MAX_SECONDS (EVENT_WSGI_STREAM_MAX_SECONDS
+    when iterated from a WSGI thread) the stream ends and the browser's EventSource
+    reconnects.
+    """
+    RETRY_MS = 3000
+
+    def __init__(self, car_id=None, resumed=False):
+        self.car_id = car_id
+        # Events are not kept between connections; a reconnecting client must refetch
+        self.resumed = resumed
+        self.keepalive = getattr(settings, 'EVENT_KEEPALIVE_SECONDS', 15)
+        self.max_seconds = getattr(settings, 'EVENT_STREAM_MAX_SECONDS', 3600)
+        # A WSGI stream holds a worker thread for as long as it is open
+        self.wsgi_max_seconds = min(self.max_seconds, getattr(settings, 'EVENT_WSGI_STREAM_MAX_SECONDS', 60))
+        self.sent = 0
+
+    def _frame(self, event):
+        self.sent += 1
+        return f"id: {self.sent}\nevent: {event['type']}\ndata: {encode(event)}\n\n"
+
+    def _opening(self):
+        frame = f'retry: {self.RETRY_MS}\n: connected\n\n'
+        if self.resumed:
+            frame += self._frame(resync_event())
+        return frame
+
+    def _frames(self, events, overflowed):
+        if overflowed:
+            events = [resync_event()] + events
+        if not events:
+            return ': keepalive\n\n'
+        return ''.join(self._frame(event) for event in events)
+
+    def __iter__(self):
+        subscription = get_broadcaster().subscribe(self.car_id)
+        try:
+            yield self._opening()
+            deadline = time.monotonic() + self.wsgi_max_seconds
+            while time.monotonic() < deadline:
+                yield self._frames(*subscription.get(min(self.keepalive, max(0, deadline - time.monotonic()))))
+        finally:
+            subscription.close()
+
+    async def __aiter__(self):
+        subscription = get_broadcaster().subscribe(self.car_id)
+        try:
+            yield self._opening()
+            deadline = time.monotonic() + self.max_seconds
+            while time.monotonic() < deadline:
+                yield self._frames(*await subscription.aget(self.keepalive))
+        finally:
+            subscription.close()
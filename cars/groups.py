@@ -0,0 +1,78 @@
+"""
+Weekly and monthly rollups of car groups (depots).
+
+A group's week or month is computed for all member cars at once with the
+grouped queries of cars/reports.py (one GROUP BY over daily entries, one query
+over weekly summaries), then summed. Results are cached under keys that embed
+the data version of every member car (cache.members_versioned_key), so a write
+to a member's data, or a membership change, invalidates the group's rollups
+while writes to other cars do not. The keys also embed the group's updated_at,
+since the rollups carry the group's name.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from .cache import cached_report, members_versioned_key
+from .reports import DAILY_TOTAL_FIELDS, NET_TOTAL_FIELDS, combine_periods, gas_per_km, month_bounds, monthly_reports, weekly_reports
+
+# Money fields of a week row summed into the group total
+WEEK_MONEY_FIELDS = tuple(field for _total, field in NET_TOTAL_FIELDS)
+
+
+def member_ids(group):
+    return sorted(group.cars.values_list('id', flat=True))
+
+
+def cached_group_weekly(group, week_start):
+    from .serializers import GroupWeeklySerializer
+    car_ids = member_ids(group)
+    key = members_versioned_key('group_weekly', car_ids, group.id, group.updated_at.isoformat(), week_start)
+    return cached_report(key, lambda: GroupWeeklySerializer(group_weekly(group, car_ids, week_start)).data)
+
+
+def cached_group_monthly(group, year, month):
+    from .serializers import GroupMonthlySerializer
+    car_ids = member_ids(group)
+    key = members_versioned_key('group_monthly', car_ids, group.id, group.updated_at.isoformat(), year, month)
+    return cached_report(key, lambda: GroupMonthlySerializer(group_monthly(group, car_ids, year, month)).data)
+
+
+def group_weekly(group, car_ids, week_start):
+    """Week totals of the group plus the week row of every member with a weekly summary."""
+    rows = list(weekly_reports(car_ids, week_start).values())
+    for row in rows:
+        row['gas_total'] = row['daily_totals']['gas']
+    distance = sum(r['distance'] for r in rows)
+    gas = sum((r['gas_total'] for r in rows), Decimal('0'))
+    totals = {
+        'distance': distance,
+        'gas_total': gas,
+        'gas_per_km': gas_per_km(gas, distance),
+        'daily_totals': {f: sum((r['daily_totals'][f] for r in rows), Decimal('0')) for f in DAILY_TOTAL_FIELDS},
+    }
+    for field in WEEK_MONEY_FIELDS:
+        totals[field] = sum((Decimal(str(r[field] or 0)) for r in rows), Decimal('0'))
+    return {
+        'group_id': group.id,
+        'name': group.name,
+        'week_start': week_start,
+        'week_end': week_start + timedelta(days=6),
+        'car_count': len(car_ids),
+        'totals': totals,
+        'cars': rows,
+    }
+
+
+def group_monthly(group, car_ids, year, month):
+    """Month totals of the group plus the month totals of every member."""
+    start, end = month_bounds(year, month)
+    cars = [months[0] for months in monthly_reports(car_ids, year, [month]).values()]
+    return {
+        'group_id': group.id,
+        'name': group.name,
+        'year': year,
+        'month': month,
+        'car_count': len(car_ids),
+        'totals': combine_periods(cars, start, end),
+        'cars': cars,
+    }
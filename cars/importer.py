@@ -0,0 +1,247 @@
+"""
+Streaming bulk import of daily entries from CSV or XLSX files.
+
+Rows use the same columns as DailyEntrySerializer (car_id, inspection_date,
+day_name, driver_name, area and the money columns). The file is read as a
+stream and handled in chunks: each chunk is validated with cached car and
+archive lookups and written with one bulk_create. Because bulk_create skips
+model save() and signals, a single reconciliation pass at the end updates the
+weekly summaries and maintenance entries of every affected week.
+"""
+import codecs
+import csv
+import io
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_data_version
+from .events import publish_invalidate
+from .models import ArchivedPartition, Car, DailyEntry, MaintenanceEntry, WeeklySummary
+from .parts import parts_for_descriptions
+from .recompute import recompute_weekly_summaries
+from .serializers import DailyEntryImportSerializer
+
+TEXT_COLUMNS = ('day_name', 'driver_name', 'area')
+CSV_ENCODING = 'utf-8-sig'  # UTF-8, with or without the BOM Excel writes
+
+
+def check_csv_encoding(fileobj, block_size=1 << 20):
+    """
+    Raise ValueError unless the rest of fileobj decodes as UTF-8, then rewind to
+    where it was. Checked before any row is imported, so a file saved in another
+    encoding (e.g. Windows-1256) is rejected as a whole instead of halfway through.
+    """
+    start = fileobj.tell()
+    decoder = codecs.getincrementaldecoder(CSV_ENCODING)()
+    line = 1
+    for block in iter(lambda: fileobj.read(block_size), b''):
+        try:
+            decoder.decode(block)
+        except UnicodeDecodeError as exc:
+            line += block[:max(exc.start, 0)].count(b'\n')
+            raise ValueError(
+                f'The CSV file is not UTF-8 encoded (invalid bytes on line {line}). '
+                'Save it as "CSV UTF-8" and upload it again.'
+            )
+        line += block.count(b'\n')
+    try:
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        raise ValueError('The CSV file is not UTF-8 encoded (it ends inside a character). Save it as "CSV UTF-8" and upload it again.')
+    fileobj.seek(start)
+
+
+def iter_file_rows(fileobj, filename):
+    """
+    Yield (row_number, dict) for each data row of a CSV or XLSX file without
+    loading the whole file. fileobj must be opened in binary mode; CSV files
+    must be UTF-8 (ValueError otherwise).
+    """
+    if filename.lower().endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError('XLSX import requires the openpyxl package')
+        sheet = load_workbook(fileobj, read_only=True, data_only=True).active
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else '' for h in next(rows, [])]
+        for number, values in enumerate(rows, start=2):
+            if values and any(v not in (None, '') for v in values):
+                yield number, dict(zip(header, values))
+    elif filename.lower().endswith('.csv'):
+        check_csv_encoding(fileobj)
+        text = io.TextIOWrapper(fileobj, encoding=CSV_ENCODING, newline='')
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        raise ValueError('Unsupported file type, expected .csv or .xlsx')
+
+
+def _clean(row):
+    """Drop empty cells so serializer defaults apply; dates from XLSX cells become date objects."""
+    cleaned = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        key = key.strip()
+        if value is None or (isinstance(value, str) and not value.strip() and key not in TEXT_COLUMNS):
+            continue
+        if hasattr(value, 'date') and key == 'inspection_date':
+            value = value.date()
+        cleaned[key] = value.strip() if isinstance(value, str) else value
+    return cleaned
+
+
+class DailyEntryImporter:
+    """
+    Import daily entries chunk by chunk.
+    - on_progress(stats) is called after every chunk
+    - errors are collected as (row_number, row, messages); existing (car_id, inspection_date)
+      pairs and duplicates inside the file are reported as errors instead of being inserted
+    """
+
+    def __init__(self, chunk_size=1000, on_progress=None):
+        self.chunk_size = chunk_size
+        self.on_progress = on_progress
+        self.stats = {'rows': 0, 'created': 0, 'errors': 0}
+        self.errors = []
+        self.known_cars = set()
+        self.archived = set(ArchivedPartition.objects.values_list('car_id', 'year'))
+        self.seen = set()
+        self.affected_weeks = defaultdict(set)
+        self.maintenance_rows = []
+
+    def run(self, rows):
+        chunk = []
+        for number, row in rows:
+            chunk.append((number, row))
+            if len(chunk) >= self.chunk_size:
+                self._process_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._process_chunk(chunk)
+        self.reconcile()
+        return self.stats
+
+    def _load_cars(self, chunk):
+        wanted = set()
+        for _number, row in chunk:
+            try:
+                wanted.add(int(row.get('car_id')))
+            except (TypeError, ValueError):
+                pass
+        missing = wanted - self.known_cars
+        if missing:
+            self.known_cars |= set(Car.objects.filter(id__in=missing).values_list('id', flat=True))
+
+    def _process_chunk(self, chunk):
+        self._load_cars(chunk)
+        context = {'car_ids': self.known_cars, 'archived': self.archived}
+        valid = []
+        for number, row in chunk:
+            self.stats['rows'] += 1
+            serializer = DailyEntryImportSerializer(data=_clean(row), context=context)
+            if not serializer.is_valid():
+                self._error(number, row, serializer.errors)
+                continue
+            attrs = serializer.validated_data
+            key = (attrs['car_id'], attrs['inspection_date'])
+            if key in self.seen:
+                self._error(number, row, {'inspection_date': ['Duplicate car_id/inspection_date in this file.']})
+                continue
+            self.seen.add(key)
+            valid.append((number, row, attrs))
+
+        if valid:
+            existing = set(
+                DailyEntry.objects.filter(
+                    car_id__in={a['car_id'] for _, _, a in valid},
+                    inspection_date__in={a['inspection_date'] for _, _, a in valid},
+                ).values_list('car_id', 'inspection_date')
+            )
+            entries = []
+            for number, row, attrs in valid:
+                if (attrs['car_id'], attrs['inspection_date']) in existing:
+                    self._error(number, row, {'inspection_date': ['A daily entry already exists for this car and date.']})
+                    continue
+                entry = DailyEntry(**attrs)
+                entry.daily_expense_total = entry.compute_expense_total()
+                entries.append(entry)
+                self.affected_weeks[entry.car_id].add(entry.week_start)
+                if entry.maintenance > Decimal('0.00'):
+                    self.maintenance_rows.append((entry.car_id, entry.inspection_date, entry.week_start, entry.maintenance))
+            with transaction.atomic():
+                DailyEntry.objects.bulk_create(entries, batch_size=self.chunk_size)
+            self.stats['created'] += len(entries)
+
+        if self.on_progress:
+            self.on_progress(self.stats)
+
+    def _error(self, number, row, errors):
+        self.stats['errors'] += 1
+        messages = []
+        for field, field_errors in errors.items():
+            for message in field_errors:
+                messages.append(f'{field}: {message}')
+        self.errors.append((number, row, messages))
+
+    def reconcile(self):
+        """Bring weekly summaries and maintenance entries in line with the imported rows."""
+        for car_id, weeks in self.affected_weeks.items():
+            recompute_weekly_summaries([car_id], min(weeks), max(weeks))
+        self._sync_maintenance()
+        for car_id in self.affected_weeks:
+            bump_data_version(car_id)
+            publish_invalidate(car_id)
+
+    def _sync_maintenance(self):
+        """Same effect as the DailyEntry post_save maintenance sync, with bulk queries per slice of rows."""
+        now = timezone.now()
+        for i in range(0, len(self.maintenance_rows), self.chunk_size):
+            rows = self.maintenance_rows[i:i + self.chunk_size]
+            car_ids = {r[0] for r in rows}
+            descriptions = {
+                (car_id, ws): desc
+                for car_id, ws, desc in WeeklySummary.objects.filter(
+                    car_id__in=car_ids, week_start__in={r[2] for r in rows}
+                ).values_list('car_id', 'week_start', 'description')
+            }
+            existing = {
+                (m.car_id, m.date): m
+                for m in MaintenanceEntry.objects.filter(car_id__in=car_ids, date__in={r[1] for r in rows})
+            }
+            parts = parts_for_descriptions(set(descriptions.values()) | {''})
+            to_create, to_update = [], []
+            for car_id, day, week_start, price in rows:
+                description = descriptions.get((car_id, week_start)) or ''
+                entry = existing.get((car_id, day))
+                if entry is None:
+                    to_create.append(MaintenanceEntry(
+                        car_id=car_id, date=day, price=price, spare_part_type=description, spare_part=parts[description],
+                    ))
+                else:
+                    entry.price = price
+                    entry.spare_part_type = description
+                    if not entry.spare_part_explicit:
+                        entry.spare_part = parts[description]
+                    entry.updated_at = now
+                    to_update.append(entry)
+            with transaction.atomic():
+                MaintenanceEntry.objects.bulk_create(to_create)
+                MaintenanceEntry.objects.bulk_update(to_update, ['price', 'spare_part_type', 'spare_part', 'updated_at'])
+
+    def write_error_file(self, fileobj):
+        """Write collected errors as CSV: row number, messages, then the original columns."""
+        columns = []
+        for _number, row, _messages in self.errors:
+            for key in row:
+                if key is not None and key not in columns:
+                    columns.append(key)
+        writer = csv.writer(fileobj)
+        writer.writerow(['row', 'errors'] + columns)
+        for number, row, messages in self.errors:
+            writer.writerow([number, '; '.join(messages)] + [row.get(c, '') for c in columns])
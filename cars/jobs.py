@@ -0,0 +1,246 @@
+"""
+Small database-backed job queue.
+
+enqueue() stores a Job row (deduplicated per job_type/car/week_start while
+pending) and `manage.py run_jobs` executes them from a thread pool, with
+retries and backoff. No external broker is needed.
+
+When settings.ASYNC_JOBS is False (the default) enqueue() runs the handler
+inline instead, so deployments without a running worker behave as before.
+"""
+import logging
+import traceback
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# job_type -> handler(car_id, week_start, **payload)
+JOB_HANDLERS = {}
+
+# Seconds to wait before retry n is 2**n * RETRY_BACKOFF
+RETRY_BACKOFF = 10
+
+
+def job_handler(job_type):
+    """Register a function as the handler for a job type."""
+    def decorator(func):
+        JOB_HANDLERS[job_type] = func
+        return func
+    return decorator
+
+
+def dedupe_key(job_type, car_id=None, week_start=None):
+    return f"{job_type}:{car_id or '-'}:{week_start or '-'}"
+
+
+def enqueue(job_type, car_id=None, week_start=None, payload=None, max_attempts=3, dedupe=None):
+    """
+    Queue a job, or return the already pending job with the same (job_type, car, week_start),
+    or with the same `dedupe` key when one is given.
+    Runs the handler immediately and returns None when ASYNC_JOBS is off.
+    """
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f'Unknown job type: {job_type}')
+    payload = payload or {}
+    if not getattr(settings, 'ASYNC_JOBS', False):
+        JOB_HANDLERS[job_type](car_id, week_start, **payload)
+        return None
+
+    key = dedupe or dedupe_key(job_type, car_id, week_start)
+    for _ in range(3):
+        existing = Job.objects.filter(dedupe_key=key, status=Job.PENDING).first()
+        if existing:
+            return existing
+        try:
+            with transaction.atomic():
+                return Job.objects.create(
+                    job_type=job_type, car_id=car_id, week_start=week_start,
+                    payload=payload, dedupe_key=key, max_attempts=max_attempts,
+                )
+        except IntegrityError:
+            # Another writer queued the same job between our check and insert
+            continue
+    return Job.objects.filter(dedupe_key=key, status=Job.PENDING).first()
+
+
+def enqueue_recompute(car_id, date_from, date_to):
+    """
+    Queue a recompute of one car's weeks in [date_from, date_to]. A pending
+    recompute for the same car is widened to cover the range instead of being
+    queued twice. Returns the job (None when run inline).
+    """
+    job = enqueue('recompute_weekly', car_id=car_id, payload={
+        'date_from': date_from.isoformat(), 'date_to': date_to.isoformat(),
+    })
+    if job is not None and job.payload.get('date_from'):
+        lo = min(job.payload['date_from'], date_from.isoformat())
+        hi = max(job.payload['date_to'], date_to.isoformat())
+        if (lo, hi) != (job.payload['date_from'], job.payload['date_to']):
+            job.payload = {'date_from': lo, 'date_to': hi}
+            # Only while still pending; a job that already started is followed by a new one
+            if not Job.objects.filter(pk=job.pk, status=Job.PENDING).update(payload=job.payload, updated_at=timezone.now()):
+                job = enqueue('recompute_weekly', car_id=car_id, payload=job.payload)
+    return job
+
+
+def claim_next_job():
+    """Atomically move the oldest runnable pending job to running and return it (or None)."""
+    now = timezone.now()
+    candidates = Job.objects.filter(status=Job.PENDING, run_after__lte=now).order_by('id').values_list('id', flat=True)[:10]
+    for job_id in candidates:
+        claimed = Job.objects.filter(id=job_id, status=Job.PENDING).update(
+            status=Job.RUNNING, started_at=now, attempts=F('attempts') + 1, updated_at=now,
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def _requeue(job, error):
+    """Put a job back to pending for a retry, unless an equivalent job is already pending."""
+    job.status = Job.PENDING
+    job.run_after = timezone.now() + timedelta(seconds=RETRY_BACKOFF * 2 ** job.attempts)
+    job.last_error = error
+    try:
+        with transaction.atomic():
+            job.save(update_fields=['status', 'run_after', 'last_error', 'updated_at'])
+    except IntegrityError:
+        # A newer pending job for the same key will redo the work
+        job.status = Job.FAILED
+        job.finished_at = timezone.now()
+        job.last_error = error + '\nRetry superseded by a newer pending job.'
+        job.save(update_fields=['status', 'finished_at', 'last_error', 'updated_at'])
+
+
+def run_job(job):
+    """Execute a claimed job and record its outcome (success, retry or failure)."""
+    handler = JOB_HANDLERS.get(job.job_type)
+    try:
+        if handler is None:
+            raise ValueError(f'Unknown job type: {job.job_type}')
+        handler(job.car_id, job.week_start, **job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Job %s (%s) failed on attempt %s', job.id, job.job_type, job.attempts)
+        if handler is not None and job.attempts < job.max_attempts:
+            _requeue(job, error)
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+            job.last_error = error
+            job.save(update_fields=['status', 'finished_at', 'last_error', 'updated_at'])
+        return False
+    job.status = Job.SUCCEEDED
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'finished_at', 'updated_at'])
+    return True
+
+
+def requeue_stale_jobs(stale_after):
+    """Return jobs left running by a crashed worker (started more than stale_after seconds ago) to the queue."""
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    stale = Job.objects.filter(status=Job.RUNNING, started_at__lt=cutoff)
+    count = 0
+    for job in stale:
+        if job.attempts < job.max_attempts:
+            _requeue(job, 'Worker stopped while the job was running.')
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+            job.last_error = 'Worker stopped while the job was running.'
+            job.save(update_fields=['status', 'finished_at', 'last_error', 'updated_at'])
+        count += 1
+    return count
+
+
+def run_pending_jobs(limit=None):
+    """Run runnable jobs in this thread until the queue is empty (or limit jobs ran). Returns the count."""
+    count = 0
+    while limit is None or count < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+
+def _as_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
+
+
+# Job handlers
+
+@job_handler('sync_maintenance_descriptions')
+def sync_maintenance_descriptions(car_id, week_start, **payload):
+    """Copy a week's WeeklySummary description (and its catalog part) to the maintenance entries of that week."""
+    from .cache import bump_data_version
+    from .events import publish_invalidate
+    from .models import DailyEntry, MaintenanceEntry, WeeklySummary
+    from .parts import part_for_description
+
+    week_start = _as_date(week_start)
+    description = (
+        WeeklySummary.objects.filter(car_id=car_id, week_start=week_start)
+        .values_list('description', flat=True).first()
+    )
+    if description is None:
+        return
+    dates = DailyEntry.objects.filter(
+        car_id=car_id, week_start=week_start, maintenance__gt=0
+    ).values_list('inspection_date', flat=True)
+    stale = MaintenanceEntry.objects.filter(car_id=car_id, date__in=dates).exclude(spare_part_type=description)
+    now = timezone.now()
+    # Entries without an explicitly chosen part follow the description's catalog part
+    updated = stale.filter(spare_part_explicit=False).update(
+        spare_part_type=description, spare_part=part_for_description(description), updated_at=now
+    )
+    updated += stale.filter(spare_part_explicit=True).update(spare_part_type=description, updated_at=now)
+    if updated:
+        bump_data_version(car_id)
+        publish_invalidate(car_id)
+
+
+@job_handler('recompute_weekly')
+def recompute_weekly(car_id, week_start, date_from=None, date_to=None, **payload):
+    """Recompute stored weekly net fields for one car-week, a car, or a date range of the fleet."""
+    from .recompute import recompute_week, recompute_weekly_summaries
+
+    if car_id and week_start:
+        recompute_week(car_id, _as_date(week_start))
+        return
+    if week_start:
+        date_from = date_to = week_start
+    recompute_weekly_summaries(
+        [car_id] if car_id else None, _as_date(date_from), _as_date(date_to),
+    )
+
+
+@job_handler('delete_car')
+def delete_car_job(car_id, week_start, target_car_id=None, **payload):
+    """Delete a car and all its data in chunks (the job is not linked to the car, so it survives the delete)."""
+    from .deletion import delete_car
+    delete_car(target_car_id)
+
+
+@job_handler('warm_reports')
+def warm_reports_job(car_id, week_start, workers=2, force=False, **payload):
+    """Precompute the current and previous weekly/monthly details into the report cache."""
+    from .warmup import warm_report_cache
+    warm_report_cache([car_id] if car_id else None, workers=workers, force=force)
+
+
+@job_handler('compute_service_due')
+def compute_service_due_job(car_id, week_start, **payload):
+    """Recompute the fleet's maintenance due snapshot (cars/service_due.py)."""
+    from .service_due import refresh_service_due
+    refresh_service_due()
@@ -0,0 +1,320 @@
+"""
+HTTP load test of a running server with a realistic traffic mix (`manage.py load_test`).
+
+Virtual users, each with one keep-alive connection, repeatedly pick a scenario
+from the mix by weight:
+- daily_burst: a driver posts a burst of daily entries for one car and day
+- weekly_report / monthly_report: a dashboard reads a car's weekly or monthly detail
+- maintenance_update: a maintenance entry is corrected by date
+Every request is timed and recorded under its route, so throughput, latency
+percentiles and error rates are reported per route.
+
+The run uses its own cars ("LOADTEST <run>"), created and seeded through the API
+before the run (weekly summaries, and weeks of daily history with maintenance
+through the import endpoint) and deleted afterwards. Nothing is read from the
+database directly, so the target can be any server, on SQLite or PostgreSQL.
+Results are saved as JSON and can be compared with an earlier run.
+"""
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from urllib.parse import urlencode, urlsplit
+
+from .models import week_start_from_date
+
+SCENARIOS = ('daily_burst', 'weekly_report', 'monthly_report', 'maintenance_update')
+DEFAULT_MIX = 'daily_burst=3,weekly_report=4,monthly_report=2,maintenance_update=1'
+RESULTS_VERSION = 1
+# Weekday (Mon=0) of the history days that carry a maintenance cost
+MAINTENANCE_WEEKDAY = 0
+
+
+def parse_mix(text):
+    """'name=weight,...' -> {scenario: weight}; raises ValueError for unknown names or bad weights."""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name!r}, expected one of {', '.join(SCENARIOS)}")
+        try:
+            mix[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise ValueError(f'Invalid weight for {name}: {weight!r}')
+        if mix[name] < 0:
+            raise ValueError(f'Weight of {name} must not be negative')
+    if not any(mix.values()):
+        raise ValueError('The mix needs at least one scenario with a positive weight')
+    return mix
+
+
+class HttpClient:
+    """
+    One keep-alive connection to the server. Like browsers, a request on a reused
+    connection that the server closed meanwhile (e.g. a recycled worker) is retried once.
+    """
+    def __init__(self, url, timeout=30):
+        parts = urlsplit(url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.prefix = parts.path.rstrip('/')
+        self.conn = connection_class(parts.hostname, parts.port, timeout=timeout)
+        self.reused = False
+
+    def request(self, method, path, body=None, content_type='application/json'):
+        """Returns (status or None on a connection error, milliseconds, response body)."""
+        headers = {}
+        if body is not None:
+            if content_type == 'application/json':
+                body = json.dumps(body)
+            headers['Content-Type'] = content_type
+        start = time.perf_counter()
+        status, data = None, b''
+        for _attempt in (1, 2):
+            try:
+                self.conn.request(method, self.prefix + path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                status = response.status
+                self.reused = not response.will_close
+                break
+            except (OSError, http.client.HTTPException):
+                self.conn.close()
+                retry, self.reused = self.reused, False
+                if not retry:
+                    break
+        return status, (time.perf_counter() - start) * 1000, data
+
+    def json(self, method, path, body=None, expect=(200, 201)):
+        """Setup request: the decoded JSON response; RuntimeError on any other status."""
+        status, _ms, data = self.request(method, path, body)
+        if status not in expect:
+            raise RuntimeError(f'{method} {path} returned {status}: {data[:300].decode(errors="replace")}')
+        return json.loads(data) if data else None
+
+    def close(self):
+        self.conn.close()
+
+
+class Recorder:
+    """Latencies and status codes per route, filled from all virtual users."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = {}
+
+    def add(self, route, status, ms):
+        with self._lock:
+            entry = self.routes.setdefault(route, {'latencies': [], 'statuses': {}})
+            entry['latencies'].append(ms)
+            key = str(status) if status else 'connection_error'
+            entry['statuses'][key] = entry['statuses'].get(key, 0) + 1
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def route_stats(latencies, statuses, elapsed):
+    latencies = sorted(latencies)
+    errors = sum(n for status, n in statuses.items() if not status.startswith('2'))
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'errors': errors,
+        'error_rate': round(errors / len(latencies), 4) if latencies else 0.0,
+        'mean_ms': round(statistics.fmean(latencies), 2) if latencies else 0.0,
+        **{f'p{p}_ms': round(percentile(latencies, p), 2) for p in (50, 90, 95, 99)},
+        'max_ms': round(latencies[-1], 2) if latencies else 0.0,
+        'statuses': dict(sorted(statuses.items())),
+    }
+
+
+class LoadTest:
+    """Seeds the run's cars through the API, drives the virtual users and summarizes the result."""
+
+    def __init__(self, url, mix, concurrency=16, duration=30, burst=5, cars=5, history_weeks=8,
+                 think_ms=0, seed=None, today=None):
+        self.url = url
+        self.mix = mix
+        self.concurrency = concurrency
+        self.duration = duration
+        self.burst = burst
+        self.car_count = cars
+        self.history_weeks = history_weeks
+        self.think_ms = think_ms
+        self.seed = seed
+        self.today = today or date.today()
+        self.run_id = uuid.uuid4().hex[:8]
+        self.car_ids = []
+        self.recorder = Recorder()
+        # Daily writes land in the last 14 days; history and
+        # maintenance entries lie before them, so writes never delete those
+        self.write_days = [self.today - timedelta(days=i) for i in range(14)]
+        self.history_start = week_start_from_date(self.write_days[-1]) - timedelta(weeks=history_weeks)
+        self.history_days = [
+            self.history_start + timedelta(days=i)
+            for i in range((week_start_from_date(self.write_days[-1]) - self.history_start).days)
+        ]
+        self.maintenance_days = [d for d in self.history_days if d.weekday() == MAINTENANCE_WEEKDAY]
+
+    # Fixture
+
+    def setup(self):
+        client = HttpClient(self.url)
+        try:
+            for i in range(self.car_count):
+                car = client.json('POST', '/api/cars/', {
+                    'car_model': f'LOADTEST {self.run_id} #{i + 1}',
+                    'license_start': (self.today - timedelta(days=365)).isoformat(),
+                    'license_end': (self.today + timedelta(days=365)).isoformat(),
+                })
+                self.car_ids.append(car['id'])
+            weeks = sorted({week_start_from_date(d) for d in self.history_days + self.write_days})
+            for car_id in self.car_ids:
+                for n, week_start in enumerate(weeks):
+                    client.json('POST', '/api/weekly/', {
+                        'car_id': car_id, 'week_ref_date': week_start.isoformat(),
+                        'odometer_start': 1000 * n, 'odometer_end': 1000 * (n + 1),
+                        'driver_salary': 700, 'custody': 100, 'description': 'Oil filter',
+                    })
+            if self.history_days:
+                self._import_history(client)
+        finally:
+            client.close()
+
+    def _import_history(self, client):
+        """One entry per car and history day through the import endpoint (one request)."""
+        rnd = random.Random(self.seed)
+        lines = ['car_id,inspection_date,driver_name,freight,default_freight,gas,oil,maintenance']
+        for car_id in self.car_ids:
+            for day in self.history_days:
+                maintenance = 150 if day in self.maintenance_days else 0
+                lines.append(
+                    f'{car_id},{day.isoformat()},loadtest,{rnd.randint(500, 1500)},{rnd.randint(300, 900)},'
+                    f'{rnd.randint(50, 250)},{rnd.randint(0, 40)},{maintenance}'
+                )
+        boundary = f'loadtest{self.run_id}'
+        body = (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="loadtest.csv"\r\n'
+            f'Content-Type: text/csv\r\n\r\n' + '\n'.join(lines) + f'\r\n--{boundary}--\r\n'
+        ).encode()
+        status, _ms, data = client.request(
+            'POST', '/api/daily-entries/import/', body, content_type=f'multipart/form-data; boundary={boundary}',
+        )
+        if status not in (200, 201):
+            raise RuntimeError(f'Importing the history returned {status}: {data[:300].decode(errors="replace")}')
+
+    def teardown(self):
+        client = HttpClient(self.url)
+        try:
+            for car_id in self.car_ids:
+                client.request('DELETE', f'/api/cars/{car_id}/')
+        finally:
+            client.close()
+
+    # Scenarios: each records its requests under their route
+
+    def _record(self, client, route, method, path, body=None):
+        status, ms, _data = client.request(method, path, body)
+        self.recorder.add(route, status, ms)
+
+    def daily_burst(self, client, rnd):
+        car_id, day = rnd.choice(self.car_ids), rnd.choice(self.write_days)
+        for _ in range(self.burst):
+            self._record(client, 'POST /api/daily-entries/', 'POST', '/api/daily-entries/', {
+                'car_id': car_id, 'inspection_date': day.isoformat(), 'day_name': day.strftime('%A'), 'driver_name': 'loadtest',
+                'freight': rnd.randint(500, 1500), 'default_freight': rnd.randint(300, 900),
+                'gas': rnd.randint(50, 250), 'oil': rnd.randint(0, 40), 'washing': rnd.choice((0, 20)),
+            })
+
+    def weekly_report(self, client, rnd):
+        day = rnd.choice(self.write_days + self.history_days)
+        query = urlencode({'car_id': rnd.choice(self.car_ids), 'date': day.isoformat()})
+        self._record(client, 'GET /api/weekly/detail/', 'GET', f'/api/weekly/detail/?{query}')
+
+    def monthly_report(self, client, rnd):
+        day = rnd.choice(self.write_days + self.history_days)
+        query = urlencode({'car_id': rnd.choice(self.car_ids), 'year': day.year, 'month': day.month})
+        self._record(client, 'GET /api/monthly/detail/', 'GET', f'/api/monthly/detail/?{query}')
+
+    def maintenance_update(self, client, rnd):
+        if not self.maintenance_days:
+            return
+        self._record(client, 'PATCH /api/maintenance/by-date/', 'PATCH', '/api/maintenance/by-date/', {
+            'car_id': rnd.choice(self.car_ids), 'date': rnd.choice(self.maintenance_days).isoformat(),
+            'price': rnd.randint(100, 400), 'oil_filter': 1,
+        })
+
+    # Run
+
+    def _virtual_user(self, number, deadline):
+        rnd = random.Random(None if self.seed is None else self.seed * 1000 + number)
+        names = [name for name, weight in self.mix.items() if weight > 0]
+        weights = [self.mix[name] for name in names]
+        client = HttpClient(self.url)
+        try:
+            while time.perf_counter() < deadline:
+                getattr(self, rnd.choices(names, weights)[0])(client, rnd)
+                if self.think_ms:
+                    time.sleep(rnd.expovariate(1000 / self.think_ms))
+        finally:
+            client.close()
+
+    def run(self):
+        """Drive the virtual users for `duration` seconds; returns the result dict."""
+        start = time.perf_counter()
+        deadline = start + self.duration
+        users = [
+            threading.Thread(target=self._virtual_user, args=(n, deadline), name=f'loadtest-{n}', daemon=True)
+            for n in range(self.concurrency)
+        ]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        return self.summarize(time.perf_counter() - start)
+
+    def summarize(self, elapsed):
+        routes = {
+            route: route_stats(entry['latencies'], entry['statuses'], elapsed)
+            for route, entry in sorted(self.recorder.routes.items())
+        }
+        latencies, statuses = [], {}
+        for entry in self.recorder.routes.values():
+            latencies += entry['latencies']
+            for status, n in entry['statuses'].items():
+                statuses[status] = statuses.get(status, 0) + n
+        return {
+            'version': RESULTS_VERSION,
+            'url': self.url,
+            'elapsed_s': round(elapsed, 2),
+            'options': {
+                'mix': self.mix, 'concurrency': self.concurrency, 'duration': self.duration, 'burst': self.burst,
+                'cars': self.car_count, 'history_weeks': self.history_weeks, 'think_ms': self.think_ms,
+            },
+            'totals': route_stats(latencies, statuses, elapsed),
+            'routes': routes,
+        }
+
+
+def compare(old, new):
+    """Rows of (route, old stats or None, new stats or None, {metric: relative change}) for two results."""
+    rows = []
+    for route in ['TOTAL'] + sorted(set(old['routes']) | set(new['routes'])):
+        a = old['totals'] if route == 'TOTAL' else old['routes'].get(route)
+        b = new['totals'] if route == 'TOTAL' else new['routes'].get(route)
+        change = {}
+        if a and b:
+            for metric in ('rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+                change[metric] = (b[metric] - a[metric]) / a[metric] if a[metric] else None
+        rows.append((route, a, b, change))
+    return rows
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import ExtractYear
+from django.utils import timezone
+
+from cars.archive import archive_partition, restore_partition
+from cars.models import ArchivedPartition, DailyEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Move closed years of daily entries out of the database into columnar .npy files "
+        "(one directory per year and car), or restore them with --restore. Reports read "
+        "archived years transparently."
+    )
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--older-than', type=int, help='Archive every year more than N years before the current year')
+        target.add_argument('--year', type=int, help='Archive a single year')
+        target.add_argument('--restore', type=int, metavar='YEAR', help='Load an archived year back into the database')
+        parser.add_argument('--car', type=int, action='append', dest='cars', help='Limit to a car id (repeatable)')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the partitions that would be archived')
+
+    def handle(self, *args, **options):
+        cars = options['cars']
+        if options['restore'] is not None:
+            parts = ArchivedPartition.objects.filter(year=options['restore'])
+            if cars:
+                parts = parts.filter(car_id__in=cars)
+            total = 0
+            for part in parts:
+                count = restore_partition(part)
+                total += count
+                self.stdout.write(f'Restored car {part.car_id} year {part.year}: {count} rows')
+            self.stdout.write(self.style.SUCCESS(f'Restored {total} daily entries.'))
+            return
+
+        qs = DailyEntry.objects.all()
+        if cars:
+            qs = qs.filter(car_id__in=cars)
+        if options['year'] is not None:
+            qs = qs.filter(inspection_date__year=options['year'])
+        else:
+            if options['older_than'] < 1:
+                raise CommandError('--older-than must be at least 1')
+            cutoff = timezone.localdate().year - options['older_than']
+            qs = qs.filter(inspection_date__lt=f'{cutoff}-01-01')
+        partitions = sorted(
+            qs.order_by().annotate(year=ExtractYear('inspection_date')).values_list('year', 'car_id').distinct()
+        )
+        if not partitions:
+            self.stdout.write('Nothing to archive.')
+            return
+
+        total = 0
+        for i, (year, car_id) in enumerate(partitions, 1):
+            if options['dry_run']:
+                self.stdout.write(f'[{i}/{len(partitions)}] would archive car {car_id} year {year}')
+                continue
+            if ArchivedPartition.objects.filter(car_id=car_id, year=year).exists():
+                raise CommandError(
+                    f'Car {car_id} year {year} is already archived but has live rows; restore it first with --restore {year}'
+                )
+            try:
+                count = archive_partition(car_id, year)
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            total += count
+            self.stdout.write(f'[{i}/{len(partitions)}] archived car {car_id} year {year}: {count} rows')
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Archived {total} daily entries in {len(partitions)} partitions.'))
@@ -0,0 +1,95 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from cars import views
+from cars.middleware import brotli, compress
+from cars.models import DailyEntry
+from cars.renderers import FastJSONRenderer, orjson
+
+
+def best_time(func, repeat):
+    """Best wall time of `repeat` runs, in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark JSON rendering (DRF JSONRenderer vs the orjson FastJSONRenderer) and "
+        "gzip/Brotli compression on real report payloads: the weekly detail, monthly detail "
+        "and maintenance month of the busiest car-month (or --car/--month)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--car', type=int, help='Car id (default: car with the most entries in one month)')
+        parser.add_argument('--month', help='YYYY-MM (default: that car\'s busiest month)')
+        parser.add_argument('--repeat', type=int, default=50, help='Runs per measurement, best is reported (default 50)')
+
+    def handle(self, *args, **options):
+        qs = DailyEntry.objects.all()
+        if options['car']:
+            qs = qs.filter(car_id=options['car'])
+        if options['month']:
+            try:
+                year, month = (int(p) for p in options['month'].split('-'))
+            except ValueError:
+                raise CommandError('--month must be YYYY-MM')
+            qs = qs.filter(inspection_date__year=year, inspection_date__month=month)
+        busiest = (
+            qs.annotate(month=TruncMonth('inspection_date')).order_by()
+            .values('car_id', 'month').annotate(n=Count('id')).order_by('-n').first()
+        )
+        if busiest is None:
+            raise CommandError('No daily entries to build payloads from.')
+        car_id, month = busiest['car_id'], busiest['month']
+        week_date = qs.filter(car_id=car_id, inspection_date__year=month.year, inspection_date__month=month.month) \
+            .order_by('inspection_date').values_list('inspection_date', flat=True).first()
+
+        factory = APIRequestFactory()
+        month_params = {'car_id': car_id, 'year': month.year, 'month': month.month}
+        payloads = {
+            'weekly detail': (views.get_weekly_detail, {'car_id': car_id, 'date': week_date.isoformat()}),
+            'monthly detail': (views.get_monthly_detail, month_params),
+            'maintenance month': (views.get_maintenance_month, month_params),
+        }
+        self.stdout.write(f'Payloads for car {car_id}, {month:%Y-%m}; best of {options["repeat"]} runs')
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed: FastJSONRenderer uses the stdlib encoder'))
+        if brotli is None:
+            self.stdout.write(self.style.WARNING('brotli is not installed: Brotli is skipped'))
+
+        stock, fast = JSONRenderer(), FastJSONRenderer()
+        repeat = options['repeat']
+        for name, (view, params) in payloads.items():
+            response = view(factory.get('/', params))
+            if response.status_code != 200:
+                self.stdout.write(f'{name}: skipped ({response.status_code} {response.data})')
+                continue
+            data = response.data
+            body = stock.render(data)
+            if fast.render(data) != body:
+                self.stdout.write(self.style.WARNING(f'{name}: FastJSONRenderer output differs from JSONRenderer'))
+            stock_ms = best_time(lambda: stock.render(data), repeat)
+            fast_ms = best_time(lambda: fast.render(data), repeat)
+            self.stdout.write(f'\n{name}: {len(body):,} bytes')
+            self.stdout.write(
+                f'  render    JSONRenderer {stock_ms:8.3f} ms   FastJSONRenderer {fast_ms:8.3f} ms'
+                f'   ({stock_ms / fast_ms:.1f}x)'
+            )
+            for encoding in ('gzip', 'br'):
+                if encoding == 'br' and brotli is None:
+                    continue
+                size = len(compress(body, encoding))
+                ms = best_time(lambda: compress(body, encoding), repeat)
+                self.stdout.write(
+                    f'  {encoding:<5}     {size:10,} bytes ({100 * (1 - size / len(body)):.0f}% saved) in {ms:8.3f} ms'
+                )
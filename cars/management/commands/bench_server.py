@@ -0,0 +1,148 @@
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from cars.models import DailyEntry
+
+
+def request_paths():
+    """A car list plus the weekly, monthly and yearly report of the car with the most entries."""
+    busiest = DailyEntry.objects.order_by().values('car_id').annotate(n=Count('id')).order_by('-n').first()
+    if busiest is None:
+        raise CommandError('No daily entries to build report requests from.')
+    car_id = busiest['car_id']
+    day = DailyEntry.objects.filter(car_id=car_id).order_by('-inspection_date').values_list('inspection_date', flat=True).first()
+    return [
+        '/api/cars/',
+        '/api/weekly/detail/?' + urlencode({'car_id': car_id, 'date': day.isoformat()}),
+        '/api/monthly/detail/?' + urlencode({'car_id': car_id, 'year': day.year, 'month': day.month}),
+        '/api/yearly/detail/?' + urlencode({'car_id': car_id, 'year': day.year}),
+    ]
+
+
+class Client(threading.local):
+    """
+    One keep-alive connection per thread. Like browsers, a request on a reused
+    connection that the server closed meanwhile (e.g. a recycled worker) is retried once.
+    """
+    def __init__(self, port):
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        self.reused = False
+
+    def get(self, path):
+        start = time.perf_counter()
+        for attempt in (1, 2):
+            try:
+                self.conn.request('GET', path)
+                response = self.conn.getresponse()
+                response.read()
+                status = response.status
+                self.reused = not response.will_close
+                break
+            except (OSError, http.client.HTTPException):
+                self.conn.close()
+                status, retry, self.reused = None, self.reused, False
+                if not retry:
+                    break
+        return status, (time.perf_counter() - start) * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Start gunicorn with its default settings and with gunicorn.conf.py, and compare "
+        "startup time (until the first response), the latency of the first API and first "
+        "report request, and throughput under concurrent report traffic. Throttling is "
+        "disabled for the runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per throughput run (default 2000)')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients (default 16)')
+        parser.add_argument('--port', type=int, default=8765, help='Port to bind the servers to (default 8765)')
+        parser.add_argument('--config', default=str(settings.BASE_DIR / 'gunicorn.conf.py'), help='Tuned profile')
+
+    def handle(self, *args, **options):
+        paths = request_paths()
+        profiles = [
+            ('default', os.devnull),  # gunicorn's built-in defaults: 1 sync worker
+            ('gunicorn.conf.py', options['config']),
+        ]
+        results = [self.run_profile(name, config, paths, options) for name, config in profiles]
+
+        self.stdout.write(
+            f"{'profile':<18}{'startup ms':>12}{'1st request ms':>16}{'1st report ms':>15}"
+            f"{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}"
+        )
+        for r in results:
+            self.stdout.write(
+                f"{r['name']:<18}{r['startup_ms']:>12.0f}{r['first_request_ms']:>16.1f}{r['first_report_ms']:>15.1f}"
+                f"{r['rps']:>10.1f}"
+                f"{r['p50']:>9.1f}{r['p95']:>9.1f}{r['errors']:>8}"
+            )
+
+    def run_profile(self, name, config, paths, options):
+        port = options['port']
+        env = dict(os.environ, THROTTLE_ENABLED='False', DEBUG='False', ALLOWED_HOSTS='127.0.0.1')
+        cmd = [sys.executable, '-m', 'gunicorn', 'project.wsgi:application', '-c', config, '--bind', f'127.0.0.1:{port}']
+        log = tempfile.TemporaryFile()
+        start = time.perf_counter()
+        server = subprocess.Popen(cmd, cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=log)
+        try:
+            client = Client(port)
+            while True:
+                if server.poll() is not None:
+                    log.seek(0)
+                    tail = log.read().decode(errors='replace')[-2000:]
+                    raise CommandError(f'gunicorn ({name}) exited with code {server.returncode}:\n{tail}')
+                status, first_request_ms = client.get(paths[0])
+                if status == 200:
+                    break
+                if time.perf_counter() - start > 60:
+                    raise CommandError(f'gunicorn ({name}) did not answer within 60 seconds')
+                time.sleep(0.02)
+            startup_ms = (time.perf_counter() - start) * 1000
+            first_report_ms = client.get(paths[-1])[1]
+
+            latencies, errors = [], 0
+            lock = threading.Lock()
+            clients = Client(port)
+
+            def hit(i):
+                nonlocal errors
+                status, ms = clients.get(paths[i % len(paths)])
+                with lock:
+                    latencies.append(ms)
+                    if status != 200:
+                        errors += 1
+
+            run_start = time.perf_counter()
+            with ThreadPoolExecutor(options['concurrency']) as pool:
+                list(pool.map(hit, range(options['requests'])))
+            elapsed = time.perf_counter() - run_start
+        finally:
+            server.terminate()
+            server.wait(30)
+            log.close()
+
+        latencies.sort()
+        return {
+            'name': name,
+            'startup_ms': startup_ms,
+            'first_request_ms': first_request_ms,
+            'first_report_ms': first_report_ms,
+            'rps': len(latencies) / elapsed,
+            'p50': statistics.median(latencies),
+            'p95': latencies[int(len(latencies) * 0.95) - 1],
+            'errors': errors,
+        }
@@ -0,0 +1,40 @@
+from collections import Counter
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.jobs import enqueue
+from cars.service_due import refresh_service_due
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute which cars are due or overdue for an oil change or filter from the "
+        "maintenance entries and odometer history of the whole fleet, and store the "
+        "snapshot served by /api/maintenance/due/. Run it nightly from cron, or queue it "
+        "for run_jobs with --queue."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Compute as of this date instead of today (YYYY-MM-DD)')
+        parser.add_argument('--queue', action='store_true', help='Queue a compute_service_due job for run_jobs instead of running now')
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError(f"Invalid date {options['date']!r}, expected YYYY-MM-DD")
+
+        if options['queue']:
+            if today:
+                raise CommandError('--queue does not support --date')
+            job = enqueue('compute_service_due')
+            self.stdout.write(f'Queued job {job.id}.' if job else 'ASYNC_JOBS is off, computed inline.')
+            return
+
+        rows = refresh_service_due(today)
+        counts = Counter(row.status for row in rows)
+        summary = ', '.join(f'{counts[s]} {s}' for s in ('overdue', 'due', 'ok', 'unknown'))
+        self.stdout.write(self.style.SUCCESS(f'Stored {len(rows)} service status row(s): {summary}.'))
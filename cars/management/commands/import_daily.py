@@ -0,0 +1,43 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.importer import DailyEntryImporter, iter_file_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Import daily entries from a CSV or XLSX file (same columns as the daily entry API). "
+        "The file is streamed and inserted in chunks with bulk_create, then weekly summaries "
+        "and maintenance entries of the affected weeks are reconciled in one pass. Rejected "
+        "rows are written to an error CSV."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='Path to a .csv or .xlsx file')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows per validation/insert chunk (default 1000)')
+        parser.add_argument('--errors', help='Error report path (default <file>.errors.csv)')
+
+    def handle(self, *args, **options):
+        path = Path(options['file'])
+        if not path.exists():
+            raise CommandError(f'File not found: {path}')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        errors_path = Path(options['errors'] or f'{path}.errors.csv')
+
+        def progress(stats):
+            self.stdout.write(f"Processed {stats['rows']} rows: {stats['created']} created, {stats['errors']} rejected")
+
+        importer = DailyEntryImporter(chunk_size=options['chunk_size'], on_progress=progress)
+        with path.open('rb') as fileobj:
+            try:
+                stats = importer.run(iter_file_rows(fileobj, path.name))
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+        if importer.errors:
+            with errors_path.open('w', newline='', encoding='utf-8') as out:
+                importer.write_error_file(out)
+            self.stdout.write(self.style.WARNING(f"{stats['errors']} rows rejected, see {errors_path}"))
+        self.stdout.write(self.style.SUCCESS(f"Imported {stats['created']} of {stats['rows']} rows."))
@@ -0,0 +1,172 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from cars.loadtest import DEFAULT_MIX, RESULTS_VERSION, HttpClient, LoadTest, compare, parse_mix
+
+SERVERS = {
+    'gunicorn': ['-m', 'gunicorn', 'project.wsgi:application', '-c', 'gunicorn.conf.py'],
+    'uvicorn': ['-m', 'uvicorn', 'project.asgi:application', '--no-access-log'],
+}
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                             capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test a running server with a mix of daily-entry write bursts, weekly and monthly "
+        "report reads and maintenance updates. Reports throughput, latency percentiles and error "
+        "rates per route and saves them as JSON, to compare with an earlier run (--compare). "
+        "The run creates its own cars through the API and deletes them afterwards. Start the "
+        "server with THROTTLE_ENABLED=False, or let the command start one with --start."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Server to test (default http://127.0.0.1:8000)')
+        parser.add_argument('--start', choices=sorted(SERVERS), help='Start this server on --port for the run, throttling off')
+        parser.add_argument('--port', type=int, default=8765, help='Port for --start (default 8765)')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds of load (default 30)')
+        parser.add_argument('--concurrency', type=int, default=16, help='Virtual users (default 16)')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Scenario weights (default {DEFAULT_MIX})')
+        parser.add_argument('--burst', type=int, default=5, help='Daily entries posted per write burst (default 5)')
+        parser.add_argument('--cars', type=int, default=5, help='Cars created for the run (default 5)')
+        parser.add_argument('--history-weeks', type=int, default=8, help='Weeks of daily history seeded per car (default 8)')
+        parser.add_argument('--think-ms', type=float, default=0, help='Mean pause between scenarios per user (default 0)')
+        parser.add_argument('--seed', type=int, help='Random seed, for repeatable request sequences')
+        parser.add_argument('--output', help='Results file (default loadtest_results/<timestamp>.json)')
+        parser.add_argument('--no-save', action='store_true', help='Do not save the results')
+        parser.add_argument('--compare', help='Earlier results file to compare with')
+        parser.add_argument('--keep', action='store_true', help='Keep the cars created for the run')
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        for name in ('duration', 'concurrency', 'burst', 'cars'):
+            if options[name] <= 0:
+                raise CommandError(f'--{name} must be positive')
+        baseline = None
+        if options['compare']:
+            try:
+                baseline = json.loads(Path(options['compare']).read_text())
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read {options['compare']}: {exc}")
+            if baseline.get('version') != RESULTS_VERSION:
+                raise CommandError(f"{options['compare']} is not a load_test results file of this version")
+
+        server = log = None
+        url = options['url']
+        if options['start']:
+            url = f"http://127.0.0.1:{options['port']}"
+            server, log = self.start_server(options['start'], options['port'])
+        test = LoadTest(
+            url, mix, concurrency=options['concurrency'], duration=options['duration'], burst=options['burst'],
+            cars=options['cars'], history_weeks=options['history_weeks'], think_ms=options['think_ms'], seed=options['seed'],
+        )
+        try:
+            self.stdout.write(f'Seeding {options["cars"]} car(s) with {options["history_weeks"]} week(s) of history on {url}')
+            try:
+                test.setup()
+            except (RuntimeError, OSError) as exc:
+                raise CommandError(f'Setup failed: {exc}')
+            self.stdout.write(
+                f"Running {options['concurrency']} virtual user(s) for {options['duration']:g}s, mix "
+                + ', '.join(f'{name}={weight:g}' for name, weight in mix.items())
+            )
+            result = test.run()
+        finally:
+            if not options['keep']:
+                test.teardown()
+            if server is not None:
+                server.terminate()
+                server.wait(30)
+                log.close()
+
+        result.update({
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'server': options['start'] or 'external',
+            'database': connection.vendor if options['start'] else 'unknown',
+        })
+        self.print_result(result)
+        if result['totals']['statuses'].get('429'):
+            self.stderr.write(self.style.WARNING(
+                'The server throttled requests (429). Run it with THROTTLE_ENABLED=False to measure capacity.'
+            ))
+        if baseline:
+            self.print_comparison(baseline, result)
+        if not options['no_save']:
+            path = Path(options['output'] or settings.BASE_DIR / 'loadtest_results' / f"{datetime.now():%Y%m%d-%H%M%S}.json")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(result, indent=2))
+            self.stdout.write(self.style.SUCCESS(f'Saved results to {path}'))
+
+    def start_server(self, name, port):
+        env = dict(os.environ, THROTTLE_ENABLED='False', DEBUG='False', ALLOWED_HOSTS='127.0.0.1')
+        cmd = [sys.executable] + SERVERS[name] + (
+            ['--bind', f'127.0.0.1:{port}'] if name == 'gunicorn' else ['--host', '127.0.0.1', '--port', str(port)]
+        )
+        log = tempfile.TemporaryFile()
+        server = subprocess.Popen(cmd, cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=log)
+        client = HttpClient(f'http://127.0.0.1:{port}')
+        start = time.perf_counter()
+        while True:
+            if server.poll() is not None:
+                log.seek(0)
+                tail = log.read().decode(errors='replace')[-2000:]
+                log.close()
+                raise CommandError(f'{name} exited with code {server.returncode}:\n{tail}')
+            if client.request('GET', '/api/cars/')[0] == 200:
+                client.close()
+                return server, log
+            if time.perf_counter() - start > 60:
+                server.terminate()
+                log.close()
+                raise CommandError(f'{name} did not answer within 60 seconds')
+            time.sleep(0.05)
+
+    def print_result(self, result):
+        self.stdout.write(
+            f"\n{'route':<34}{'requests':>9}{'req/s':>9}{'errors':>8}{'err %':>7}"
+            f"{'p50 ms':>9}{'p90 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+        )
+        for route, stats in list(result['routes'].items()) + [('TOTAL', result['totals'])]:
+            self.stdout.write(
+                f"{route:<34}{stats['requests']:>9}{stats['rps']:>9.1f}{stats['errors']:>8}{stats['error_rate'] * 100:>7.1f}"
+                f"{stats['p50_ms']:>9.1f}{stats['p90_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}"
+            )
+
+    def print_comparison(self, old, new):
+        def pct(value):
+            return '' if value is None else f'{value * 100:+.0f}%'
+
+        self.stdout.write(
+            f"\nCompared with {old.get('started_at', '?')} ({old.get('git_commit') or 'unknown commit'}):\n"
+            f"{'route':<34}{'req/s':>24}{'p95 ms':>25}{'err %':>16}"
+        )
+        for route, a, b, change in compare(old, new):
+            if a is None or b is None:
+                self.stdout.write(f"{route:<34}{'only in ' + ('new' if a is None else 'old') + ' run':>22}")
+                continue
+            self.stdout.write(
+                f"{route:<34}{a['rps']:>9.1f} → {b['rps']:<7.1f}{pct(change['rps']):>5}"
+                f"{a['p95_ms']:>10.1f} → {b['p95_ms']:<7.1f}{pct(change['p95_ms']):>5}"
+                f"{a['error_rate'] * 100:>7.1f} → {b['error_rate'] * 100:<6.1f}"
+            )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete delta-sync tombstones older than the retention window "
+        "(SYNC_TOMBSTONE_RETENTION_DAYS). Clients holding older sync tokens get 410 and run a full sync."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Retention in days (default SYNC_TOMBSTONE_RETENTION_DAYS)')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days is not None and days < 1:
+            raise CommandError('--days must be at least 1')
+        deleted = prune_tombstones(days)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} tombstones.'))
@@ -0,0 +1,74 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from cars.models import WeeklySummary
+from cars.workers import init_worker, recompute_partition
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Invalid date {value!r}, expected YYYY-MM-DD')
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute stored WeeklySummary net fields from daily entries. Cars are split into "
+        "partitions (one grouped query each) that run across a process pool; only rows whose "
+        "values changed are written, with bulk_update."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--car', type=int, action='append', dest='cars', help='Car id to recompute (repeatable; default all cars)')
+        parser.add_argument('--from', dest='date_from', help='First week_start to include (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Last week_start to include (YYYY-MM-DD)')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes (default 1 = run in this process)')
+        parser.add_argument('--partition-size', type=int, default=50, help='Cars per partition (default 50)')
+
+    def handle(self, *args, **options):
+        date_from = parse_date(options['date_from']) if options['date_from'] else None
+        date_to = parse_date(options['date_to']) if options['date_to'] else None
+        workers = options['workers']
+        size = options['partition_size']
+        if workers < 1 or size < 1:
+            raise CommandError('--workers and --partition-size must be at least 1')
+
+        car_qs = WeeklySummary.objects.order_by().values_list('car_id', flat=True).distinct()
+        if options['cars']:
+            car_qs = car_qs.filter(car_id__in=options['cars'])
+        car_ids = sorted(car_qs)
+        partitions = [car_ids[i:i + size] for i in range(0, len(car_ids), size)]
+        if not partitions:
+            self.stdout.write('No weekly summaries to recompute.')
+            return
+
+        total_checked = total_changed = 0
+        done = 0
+
+        def report(part, checked, changed):
+            nonlocal total_checked, total_changed, done
+            done += 1
+            total_checked += checked
+            total_changed += changed
+            self.stdout.write(
+                f'[{done}/{len(partitions)}] cars {part[0]}-{part[-1]}: checked {checked}, updated {changed}'
+            )
+
+        if workers == 1:
+            for part in partitions:
+                report(*recompute_partition(part, date_from, date_to))
+        else:
+            # Child processes must open their own database connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+                futures = [pool.submit(recompute_partition, part, date_from, date_to) for part in partitions]
+                for future in as_completed(futures):
+                    report(*future.result())
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {total_checked} weekly summaries across {len(car_ids)} cars, updated {total_changed}.'
+        ))
@@ -0,0 +1,68 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from cars.jobs import claim_next_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs (cars.Job) from a pool of worker threads. "
+        "Use --once to drain the queue and exit, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Worker threads (default 2)')
+        parser.add_argument('--once', action='store_true', help='Exit when no runnable job is left')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to sleep when the queue is empty (default 2)')
+        parser.add_argument('--stale-after', type=int, default=600, help='Requeue jobs left running longer than this many seconds (default 600)')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1:
+            raise CommandError('--workers must be at least 1')
+        once = options['once']
+        poll_interval = options['poll_interval']
+
+        stale = requeue_stale_jobs(options['stale_after'])
+        if stale:
+            self.stdout.write(f'Requeued {stale} stale running job(s).')
+
+        stop = threading.Event()
+        lock = threading.Lock()
+        counts = {'succeeded': 0, 'failed': 0}
+
+        def work():
+            try:
+                while not stop.is_set():
+                    close_old_connections()
+                    job = claim_next_job()
+                    if job is None:
+                        if once:
+                            return
+                        stop.wait(poll_interval)
+                        continue
+                    ok = run_job(job)
+                    with lock:
+                        counts['succeeded' if ok else 'failed'] += 1
+                    self.stdout.write(f"Job {job.id} {job.job_type}: {'ok' if ok else 'error'}")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work, name=f'job-worker-{i}', daemon=True) for i in range(workers)]
+        for t in threads:
+            t.start()
+        try:
+            while any(t.is_alive() for t in threads):
+                time.sleep(0.2)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping workers after their current job...')
+            stop.set()
+            for t in threads:
+                t.join()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {counts['succeeded']} job(s) successfully, {counts['failed']} with errors."
+        ))
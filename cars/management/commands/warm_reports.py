@@ -0,0 +1,57 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.jobs import enqueue
+from cars.warmup import report_periods, shared_cache, warm_report_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute the weekly and monthly details of the current and previous week/month "
+        "for every car into the report cache, several cars in parallel. Entries already "
+        "cached for the current data version are skipped. Run it from cron (e.g. every few "
+        "minutes, and right after the week starts) or queue it for run_jobs with --queue."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--car', type=int, action='append', dest='cars', help='Car id to warm (repeatable; default all cars)')
+        parser.add_argument('--date', help='Reference date instead of today (YYYY-MM-DD)')
+        parser.add_argument('--workers', type=int, default=4, help='Cars computed in parallel (default 4)')
+        parser.add_argument('--force', action='store_true', help='Recompute entries that are already cached')
+        parser.add_argument('--queue', action='store_true', help='Queue a warm_reports job for run_jobs instead of running now')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+        ref_date = None
+        if options['date']:
+            try:
+                ref_date = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError(f"Invalid date {options['date']!r}, expected YYYY-MM-DD")
+        if not shared_cache():
+            raise CommandError(
+                'Report caching is off: REPORT_CACHE_BACKEND is a per-process cache (or '
+                'REPORT_CACHE_TIMEOUT is 0), so warmed entries would never reach the web server. '
+                'Configure a shared reports cache (see .env.example).'
+            )
+
+        if options['queue']:
+            if options['date'] or (options['cars'] and len(options['cars']) > 1):
+                raise CommandError('--queue supports at most one --car and no --date')
+            car_id = options['cars'][0] if options['cars'] else None
+            job = enqueue('warm_reports', car_id=car_id, payload={'workers': options['workers'], 'force': options['force']})
+            self.stdout.write(f'Queued job {job.id}.' if job else 'ASYNC_JOBS is off, warmed inline.')
+            return
+
+        weeks, months = report_periods(ref_date)
+        self.stdout.write(
+            f"Warming weeks {', '.join(w.isoformat() for w in weeks)} and months "
+            f"{', '.join(f'{y}-{m:02d}' for y, m in months)} with {options['workers']} worker(s)"
+        )
+        computed, skipped = warm_report_cache(
+            options['cars'], ref_date, workers=options['workers'], force=options['force'],
+            on_car=lambda car_id, c, s: self.stdout.write(f'car {car_id}: computed {c}, already cached {s}'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Computed {computed} report(s), {skipped} already cached.'))
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.2 on 2026-10-19 04:57
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F
+
+
+EXPENSE_FIELDS = (
+    'gas', 'oil', 'card', 'fines', 'tips', 'maintenance', 'spare_parts',
+    'tires', 'balance', 'washing', 'without', 'driver_expenses',
+)
+
+
+def backfill_daily_expense_total(apps, schema_editor):
+    """Fill the new column for existing rows with a single UPDATE."""
+    DailyEntry = apps.get_model('cars', 'DailyEntry')
+    total = F(EXPENSE_FIELDS[0])
+    for field in EXPENSE_FIELDS[1:]:
+        total = total + F(field)
+    DailyEntry.objects.update(daily_expense_total=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0007_dailyentry_driver_expenses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyentry',
+            name='daily_expense_total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, help_text='Sum of all daily expense columns', max_digits=14),
+        ),
+        migrations.RunPython(backfill_daily_expense_total, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='dailyentry',
+            index=models.Index(fields=['daily_expense_total'], name='cars_dailye_daily_e_a54b3b_idx'),
+        ),
+    ]
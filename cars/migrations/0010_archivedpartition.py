@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-19 05:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0009_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('rows', models.PositiveIntegerField()),
+                ('totals', models.JSONField(default=dict, help_text='Per-column sums in cents, used to verify the files')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('car', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_partitions', to='cars.car')),
+            ],
+            options={
+                'ordering': ['year', 'car_id'],
+                'unique_together': {('car', 'year')},
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.2 on 2026-10-19 05:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0010_archivedpartition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(help_text='Sync type, e.g. daily_entry', max_length=32)),
+                ('object_id', models.BigIntegerField()),
+                ('car_id', models.BigIntegerField(help_text='Owning car (the car itself for cars); no FK so it outlives the car')),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['deleted_at', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['updated_at', 'id'], name='cars_car_updated_26f7c2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyentry',
+            index=models.Index(fields=['updated_at', 'id'], name='cars_dailye_updated_cbe43e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenanceentry',
+            index=models.Index(fields=['updated_at', 'id'], name='cars_mainte_updated_6963b8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weeklysummary',
+            index=models.Index(fields=['updated_at', 'id'], name='cars_weekly_updated_471187_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['deleted_at', 'id'], name='cars_syncto_deleted_4b0ef5_idx'),
+        ),
+    ]
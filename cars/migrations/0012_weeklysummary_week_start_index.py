@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-19 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0011_sync_change_feed'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='weeklysummary',
+            index=models.Index(fields=['week_start'], name='cars_weekly_week_st_a535eb_idx'),
+        ),
+    ]
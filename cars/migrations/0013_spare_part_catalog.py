@@ -0,0 +1,41 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0012_weeklysummary_week_start_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SparePart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('key', models.CharField(help_text='Normalized name matched against descriptions', max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['name', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='maintenanceentry',
+            name='spare_part_explicit',
+            field=models.BooleanField(default=False, help_text='spare_part was set explicitly instead of matched from spare_part_type'),
+        ),
+        migrations.AddField(
+            model_name='maintenanceentry',
+            name='spare_part',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='maintenance_entries', to='cars.sparepart'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenanceentry',
+            index=models.Index(fields=['spare_part', 'car', 'date'], name='cars_mainte_spare_p_92419c_idx'),
+        ),
+    ]
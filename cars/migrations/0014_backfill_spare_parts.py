@@ -0,0 +1,56 @@
+import re
+from collections import defaultdict
+
+from django.db import migrations
+
+# Same normalization as cars/parts.py clean_name() / part_key()
+SPACE = re.compile(r'\s+')
+EDGES = re.compile(r'^[\W_]+|[\W_]+$')
+BATCH_SIZE = 2000
+
+
+def clean_name(text):
+    return EDGES.sub('', SPACE.sub(' ', text or '')).strip()[:255]
+
+
+def backfill_spare_parts(apps, schema_editor):
+    """Build the catalog from the existing descriptions and link the maintenance entries to it, in id batches."""
+    SparePart = apps.get_model('cars', 'SparePart')
+    MaintenanceEntry = apps.get_model('cars', 'MaintenanceEntry')
+
+    names = {}
+    for text in MaintenanceEntry.objects.exclude(spare_part_type='').values_list('spare_part_type', flat=True).distinct():
+        name = clean_name(text)
+        if name:
+            names.setdefault(name.casefold(), name)
+    existing = set(SparePart.objects.values_list('key', flat=True))
+    SparePart.objects.bulk_create([SparePart(key=k, name=n) for k, n in names.items() if k not in existing], batch_size=BATCH_SIZE)
+    part_ids = dict(SparePart.objects.values_list('key', 'id'))
+
+    last_id = 0
+    while True:
+        rows = list(
+            MaintenanceEntry.objects.filter(id__gt=last_id, spare_part_explicit=False)
+            .order_by('id').values_list('id', 'spare_part_type')[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        by_part = defaultdict(list)
+        for entry_id, text in rows:
+            part_id = part_ids.get(clean_name(text).casefold())
+            if part_id:
+                by_part[part_id].append(entry_id)
+        for part_id, entry_ids in by_part.items():
+            MaintenanceEntry.objects.filter(id__in=entry_ids).update(spare_part_id=part_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0013_spare_part_catalog'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_spare_parts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0014_backfill_spare_parts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceDue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('service', models.CharField(help_text='MaintenanceEntry money field: oil_change, oil_filter, air_filter, gas_filter', max_length=16)),
+                ('last_service_date', models.DateField(blank=True, help_text='Empty when never recorded; counted from the first odometer week', null=True)),
+                ('odometer_at_service', models.PositiveIntegerField(blank=True, null=True)),
+                ('current_odometer', models.PositiveIntegerField(blank=True, null=True)),
+                ('km_since', models.IntegerField(blank=True, null=True)),
+                ('days_since', models.IntegerField(blank=True, null=True)),
+                ('km_remaining', models.IntegerField(blank=True, null=True)),
+                ('days_remaining', models.IntegerField(blank=True, null=True)),
+                ('due_date', models.DateField(blank=True, help_text="Expected date the first interval runs out, at the car's recent km/day", null=True)),
+                ('due_ratio', models.FloatField(blank=True, help_text='Largest share of the km or day interval used up', null=True)),
+                ('status', models.CharField(choices=[('ok', 'OK'), ('due', 'Due'), ('overdue', 'Overdue'), ('unknown', 'Unknown')], max_length=16)),
+                ('computed_at', models.DateTimeField()),
+                ('car', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='service_due', to='cars.car')),
+            ],
+            options={
+                'ordering': ['car_id', 'service'],
+                'indexes': [models.Index(fields=['status', 'due_ratio'], name='cars_servic_status_17a8d8_idx')],
+                'unique_together': {('car', 'service')},
+            },
+        ),
+    ]
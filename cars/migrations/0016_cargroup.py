@@ -0,0 +1,26 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0015_servicedue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('cars', models.ManyToManyField(blank=True, related_name='groups', to='cars.car')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+    ]
@@ -7,9 +7,14 @@ class Car(models.Model):
     car_model = models.CharField(max_length=255, help_text="Car model and brand")
     license_start = models.DateField(help_text="License start date")
     license_end = models.DateField(help_text="License expiration date")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['id']
+        indexes = [
+            models.Index(fields=['updated_at', 'id']),
+        ]
         verbose_name = 'Car'
         verbose_name_plural = 'Cars'
     
@@ -17,6 +22,27 @@ class Car(models.Model):
         return f"{self.car_model} (License: {self.license_start} to {self.license_end})"
 
 
+class CarGroup(models.Model):
+    """A depot (or any set of cars) reported together; a car may belong to several groups."""
+    name = models.CharField(max_length=255, unique=True)
+    cars = models.ManyToManyField(Car, related_name='groups', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+# Daily expense columns that make up DailyEntry.daily_expense_total
+EXPENSE_FIELDS = (
+    'gas', 'oil', 'card', 'fines', 'tips', 'maintenance', 'spare_parts',
+    'tires', 'balance', 'washing', 'without', 'driver_expenses',
+)
+
+
 class DailyEntry(models.Model):
     """Daily operational data for a car."""
     car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='daily_entries')
@@ -41,6 +67,8 @@ class DailyEntry(models.Model):
     # New generic daily expense
     without = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), help_text="Additional unspecified expense to include in totals")
     driver_expenses = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), help_text="Expenses related to the driver")
+    # Stored sum of EXPENSE_FIELDS, kept in sync by save()
+    daily_expense_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), editable=False, help_text="Sum of all daily expense columns")
 
     week_start = models.DateField(help_text="Saturday date for the week this entry belongs to")
 
@@ -51,15 +79,26 @@ class DailyEntry(models.Model):
         indexes = [
             models.Index(fields=["car", "week_start"]),
             models.Index(fields=["inspection_date"]),
+            models.Index(fields=["daily_expense_total"]),
+            models.Index(fields=["updated_at", "id"]),
         ]
         ordering = ["-inspection_date", "car_id"]
 
+    def compute_expense_total(self):
+        """Return the sum of all expense columns on this entry."""
+        return sum((Decimal(str(getattr(self, f) or 0)) for f in EXPENSE_FIELDS), Decimal('0.00'))
+
     def save(self, *args, **kwargs):
         # Ensure week_start is set based on inspection_date (week Sat-Fri)
         if not self.week_start and self.inspection_date:
             self.week_start = week_start_from_date(self.inspection_date)
         if not self.day_name and self.inspection_date:
             self.day_name = self.inspection_date.strftime('%A')
+        self.daily_expense_total = self.compute_expense_total()
+        # Keep the stored total in sync on partial saves of expense columns
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(EXPENSE_FIELDS):
+            kwargs['update_fields'] = set(update_fields) | {'daily_expense_total'}
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -117,27 +156,11 @@ def sync_maintenance_entry(sender, instance, created, **kwargs):
 def update_maintenance_descriptions(sender, instance, created, **kwargs):
     """
     When WeeklySummary is created or updated, update all MaintenanceEntry records
-    for that week with the description.
+    for that week with the description. Runs through the job queue (cars/jobs.py),
+    so with ASYNC_JOBS enabled the request does not wait for it.
     """
-    # Get all DailyEntry records for this car/week that have maintenance > 0
-    daily_entries = DailyEntry.objects.filter(
-        car=instance.car,
-        week_start=instance.week_start,
-        maintenance__gt=Decimal('0.00')
-    )
-    
-    # Update the spare_part_type for each corresponding MaintenanceEntry
-    for daily_entry in daily_entries:
-        try:
-            maintenance_entry = MaintenanceEntry.objects.get(
-                car=daily_entry.car,
-                date=daily_entry.inspection_date
-            )
-            maintenance_entry.spare_part_type = instance.description or ''
-            maintenance_entry.save()
-        except MaintenanceEntry.DoesNotExist:
-            # Shouldn't happen, but skip if no MaintenanceEntry exists
-            pass
+    from .jobs import enqueue
+    enqueue('sync_maintenance_descriptions', car_id=instance.car_id, week_start=instance.week_start)
 
 
 class WeeklySummary(models.Model):
@@ -167,50 +190,43 @@ class WeeklySummary(models.Model):
         unique_together = ("car", "week_start")
         indexes = [
             models.Index(fields=["car", "week_start"]),
+            models.Index(fields=["updated_at", "id"]),
+            models.Index(fields=["week_start"]),
         ]
         ordering = ["-week_start", "car_id"]
 
     def save(self, *args, **kwargs):
-        from django.db.models import Sum
+        from django.db import transaction
+        from .recompute import lock_weeks
         # Compute or fix week_end to be Friday of the same week as week_start
         if self.week_start and (not self.week_end or self.week_end == self.week_start or self.week_end < self.week_start):
             self.week_end = self.week_start + timedelta(days=6)
+        # Aggregate and write under the week's lock, so a concurrent recompute of
+        # this week cannot overwrite the result with an older aggregate
+        with transaction.atomic():
+            lock_weeks([(self.car_id, self.week_start)])
+            self._save_with_nets(*args, **kwargs)
+
+    def _save_with_nets(self, *args, **kwargs):
+        from django.db.models import Sum
         # Aggregate daily totals for the week
         qs = DailyEntry.objects.filter(car=self.car, week_start=self.week_start)
         totals = qs.aggregate(
-            freight=Sum('freight'), default_freight=Sum('default_freight'), gas=Sum('gas'), oil=Sum('oil'), card=Sum('card'),
-            fines=Sum('fines'), tips=Sum('tips'), maintenance=Sum('maintenance'),
-            spare_parts=Sum('spare_parts'), tires=Sum('tires'), balance=Sum('balance'),
-            washing=Sum('washing'), without=Sum('without'), driver_expenses=Sum('driver_expenses')
+            freight=Sum('freight'), default_freight=Sum('default_freight'), expenses=Sum('daily_expense_total')
         )
-        def d(x):
-            return totals.get(x) or Decimal('0.00')
-        expenses = (
-            d('gas') + d('oil') + d('card') + d('fines') + d('tips') +
-            d('maintenance') + d('spare_parts') + d('tires') + d('balance') + d('washing') + d('without') + d('driver_expenses')
+        # Include entries of this week that were moved to the columnar archive
+        from .archive import archived_totals, merge_totals
+        archived = archived_totals(self.car_id, ('freight', 'default_freight', 'daily_expense_total'), week_start=self.week_start)
+        merge_totals(totals, {
+            'freight': archived['freight'], 'default_freight': archived['default_freight'], 'expenses': archived['daily_expense_total'],
+        })
+        nets = compute_weekly_nets(
+            freight=totals['freight'], default_freight=totals['default_freight'], daily_expenses=totals['expenses'],
+            driver_salary=self.driver_salary, custody=self.custody, perished=self.perished,
         )
-        # Include driver salary in weekly expenses
-        driver_salary = self.driver_salary or Decimal('0.00')
-        expenses = expenses + driver_salary
-        total_freight = d('freight')
-        default_total_freight = d('default_freight')
-        custody_val = self.custody or Decimal('0.00')
-        perished_val = self.perished or Decimal('0.00')
-        
-        self.net_expenses = expenses
-        self.net_revenue = total_freight + custody_val - expenses
-        # default_net_revenue uses default_freight totals instead of freight
-        self.default_net_revenue = default_total_freight + custody_val - expenses
-        
-        # Daily expenses only (without driver_salary)
-        daily_expenses_only = expenses - driver_salary
-        
-        # net_driver = (freight + custody) - daily_expenses_only (NO driver_salary)
-        self.net_driver = total_freight + custody_val - daily_expenses_only
-        
-        # net_car = (freight + default_freight) - (daily_expenses_only + driver_salary + perished)
-        self.net_car = total_freight + default_total_freight - (daily_expenses_only + driver_salary + perished_val)
-        
+        for field, value in nets.items():
+            setattr(self, field, value)
+
         super().save(*args, **kwargs)
 
 
@@ -225,6 +241,56 @@ def week_start_from_date(d):
     return d - timedelta(days=delta)
 
 
+def compute_weekly_nets(freight, default_freight, daily_expenses, driver_salary, custody, perished):
+    """
+    Return the weekly net fields from summed daily values and the weekly inputs.
+    - net_expenses = daily expenses + driver_salary
+    - net_revenue = (freight + custody) - net_expenses
+    - default_net_revenue = (default_freight + custody) - net_expenses
+    - net_driver = (freight + custody) - daily expenses (NO driver_salary)
+    - net_car = (freight + default_freight) - (daily expenses + driver_salary + perished)
+    """
+    def dec(v):
+        return Decimal(str(v or 0))
+    freight = dec(freight)
+    default_freight = dec(default_freight)
+    daily_expenses = dec(daily_expenses)
+    driver_salary = dec(driver_salary)
+    custody = dec(custody)
+    perished = dec(perished)
+    net_expenses = daily_expenses + driver_salary
+    return {
+        'net_expenses': net_expenses,
+        'net_revenue': freight + custody - net_expenses,
+        'default_net_revenue': default_freight + custody - net_expenses,
+        'net_driver': freight + custody - daily_expenses,
+        'net_car': freight + default_freight - (daily_expenses + driver_salary + perished),
+    }
+
+
+class SparePart(models.Model):
+    """
+    Spare part catalog. Maintenance entries link to a part chosen explicitly or
+    matched from their spare_part_type text by its normalized key (cars/parts.py).
+    """
+    name = models.CharField(max_length=255)
+    key = models.CharField(max_length=255, unique=True, help_text="Normalized name matched against descriptions")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name', 'id']
+
+    def save(self, *args, **kwargs):
+        from .parts import part_key
+        self.key = part_key(self.name)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
+
+
 class MaintenanceEntry(models.Model):
     """Vehicle maintenance record (year-round), monetary fields per entry."""
     car = models.ForeignKey('cars.Car', on_delete=models.CASCADE, related_name='maintenance_entries')
@@ -237,6 +303,14 @@ class MaintenanceEntry(models.Model):
     price = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
 
     spare_part_type = models.CharField(max_length=255, blank=True, default='')
+    # Indexed together with car and date below
+    spare_part = models.ForeignKey(
+        'cars.SparePart', null=True, blank=True, on_delete=models.SET_NULL,
+        related_name='maintenance_entries', db_index=False,
+    )
+    spare_part_explicit = models.BooleanField(
+        default=False, help_text="spare_part was set explicitly instead of matched from spare_part_type"
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -245,7 +319,227 @@ class MaintenanceEntry(models.Model):
         ordering = ['date', 'id']
         indexes = [
             models.Index(fields=['car', 'date']),
+            models.Index(fields=['updated_at', 'id']),
+            models.Index(fields=['spare_part', 'car', 'date']),
         ]
 
+    def save(self, *args, **kwargs):
+        # Unless chosen explicitly, the catalog part follows the free-text description
+        if not self.spare_part_explicit:
+            from .parts import part_for_description
+            self.spare_part = part_for_description(self.spare_part_type)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'spare_part_type' in update_fields:
+                kwargs['update_fields'] = set(update_fields) | {'spare_part'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"MaintenanceEntry car={self.car_id} date={self.date}"
+
+
+class ServiceDue(models.Model):
+    """
+    Precomputed service status of a car for one service type (oil change or a
+    filter), refreshed nightly by `manage.py compute_service_due` (see cars/service_due.py).
+    """
+    OK = 'ok'
+    DUE = 'due'
+    OVERDUE = 'overdue'
+    UNKNOWN = 'unknown'
+    STATUS_CHOICES = [
+        (OK, 'OK'),
+        (DUE, 'Due'),
+        (OVERDUE, 'Overdue'),
+        (UNKNOWN, 'Unknown'),
+    ]
+
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='service_due')
+    service = models.CharField(max_length=16, help_text="MaintenanceEntry money field: oil_change, oil_filter, air_filter, gas_filter")
+    last_service_date = models.DateField(null=True, blank=True, help_text="Empty when never recorded; counted from the first odometer week")
+    odometer_at_service = models.PositiveIntegerField(null=True, blank=True)
+    current_odometer = models.PositiveIntegerField(null=True, blank=True)
+    km_since = models.IntegerField(null=True, blank=True)
+    days_since = models.IntegerField(null=True, blank=True)
+    km_remaining = models.IntegerField(null=True, blank=True)
+    days_remaining = models.IntegerField(null=True, blank=True)
+    due_date = models.DateField(null=True, blank=True, help_text="Expected date the first interval runs out, at the car's recent km/day")
+    due_ratio = models.FloatField(null=True, blank=True, help_text="Largest share of the km or day interval used up")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("car", "service")
+        ordering = ["car_id", "service"]
+        indexes = [
+            models.Index(fields=["status", "due_ratio"]),
+        ]
+
+    def __str__(self):
+        return f"ServiceDue car={self.car_id} service={self.service} status={self.status}"
+
+
+class Job(models.Model):
+    """
+    Background job queued in the database and executed by `manage.py run_jobs`.
+    At most one pending job exists per (job_type, car, week_start); see cars/jobs.py.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    job_type = models.CharField(max_length=64)
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='jobs', null=True, blank=True)
+    week_start = models.DateField(null=True, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    dedupe_key = models.CharField(max_length=128, help_text="job_type:car:week_start, unique among pending jobs")
+
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    last_error = models.TextField(blank=True, default='')
+    run_after = models.DateTimeField(default=timezone.now, help_text="Not picked up before this time (retry backoff)")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['dedupe_key'], condition=models.Q(status='pending'), name='unique_pending_job'),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id} {self.job_type} car={self.car_id} week={self.week_start} [{self.status}]"
+
+
+class ArchivedPartition(models.Model):
+    """
+    A (year, car) slice of DailyEntry rows moved out of the database into
+    columnar files by `manage.py archive_daily` (see cars/archive.py).
+    """
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='archived_partitions')
+    year = models.PositiveSmallIntegerField()
+    rows = models.PositiveIntegerField()
+    totals = models.JSONField(default=dict, help_text="Per-column sums in cents, used to verify the files")
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("car", "year")
+        ordering = ["year", "car_id"]
+
+    def __str__(self):
+        return f"ArchivedPartition car={self.car_id} year={self.year} rows={self.rows}"
+
+
+class SyncTombstone(models.Model):
+    """
+    Record of a deleted Car, DailyEntry, WeeklySummary or MaintenanceEntry,
+    served by the delta-sync feed (see cars/sync.py) so offline clients can drop it.
+    """
+    model = models.CharField(max_length=32, help_text="Sync type, e.g. daily_entry")
+    object_id = models.BigIntegerField()
+    car_id = models.BigIntegerField(help_text="Owning car (the car itself for cars); no FK so it outlives the car")
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['deleted_at', 'id']
+        indexes = [
+            models.Index(fields=['deleted_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"SyncTombstone {self.model} {self.object_id} at {self.deleted_at}"
+
+
+# Signals to invalidate data-versioned report caches (see cars/cache.py)
+from django.db.models.signals import post_delete
+
+
+@receiver(post_save, sender='cars.Car')
+@receiver(post_delete, sender='cars.Car')
+@receiver(post_save, sender='cars.DailyEntry')
+@receiver(post_delete, sender='cars.DailyEntry')
+@receiver(post_save, sender='cars.WeeklySummary')
+@receiver(post_delete, sender='cars.WeeklySummary')
+@receiver(post_save, sender='cars.MaintenanceEntry')
+@receiver(post_delete, sender='cars.MaintenanceEntry')
+def bump_report_cache_version(sender, instance, **kwargs):
+    """Bump the car's and the fleet's data version whenever car data is written."""
+    from .cache import bump_data_version
+    car_id = instance.pk if isinstance(instance, Car) else instance.car_id
+    bump_data_version(car_id)
+
+
+@receiver(post_save, sender='cars.DailyEntry')
+@receiver(post_delete, sender='cars.DailyEntry')
+def recompute_entry_week(sender, instance, origin=None, **kwargs):
+    """
+    Recompute the stored nets of the entry's week once the write commits, under the
+    week's lock (cars/recompute.py), so a WeeklySummary.save() that aggregated
+    concurrently without this entry is corrected. Runs through the job queue.
+    """
+    if isinstance(origin, Car) or getattr(origin, 'model', None) is Car:
+        return
+    from django.db import transaction
+    from .jobs import enqueue
+    car_id, week_start = instance.car_id, instance.week_start
+    transaction.on_commit(lambda: enqueue('recompute_weekly', car_id=car_id, week_start=week_start))
+
+
+@receiver(post_delete, sender='cars.ArchivedPartition')
+def remove_archived_partition_files(sender, instance, **kwargs):
+    """Delete the column files of a removed archive partition once the transaction commits."""
+    from django.db import transaction
+    from .archive import partition_dir, remove_partition_files
+    path = partition_dir(instance.year, instance.car_id)
+    transaction.on_commit(lambda: remove_partition_files(path))
+
+
+SYNC_MODEL_NAMES = {
+    'Car': 'car',
+    'DailyEntry': 'daily_entry',
+    'WeeklySummary': 'weekly_summary',
+    'MaintenanceEntry': 'maintenance_entry',
+}
+
+
+@receiver(post_save, sender='cars.DailyEntry')
+@receiver(post_delete, sender='cars.DailyEntry')
+@receiver(post_save, sender='cars.WeeklySummary')
+@receiver(post_delete, sender='cars.WeeklySummary')
+@receiver(post_save, sender='cars.MaintenanceEntry')
+@receiver(post_delete, sender='cars.MaintenanceEntry')
+def publish_change_event(sender, instance, created=None, **kwargs):
+    """Push a delta of the written row to live event streams once the write commits (cars/events.py)."""
+    from .events import publish, row_event
+    op = 'delete' if created is None else 'create' if created else 'update'
+    publish(row_event(SYNC_MODEL_NAMES[sender.__name__], instance, op))
+
+
+@receiver(post_delete, sender='cars.Car')
+@receiver(post_delete, sender='cars.DailyEntry')
+@receiver(post_delete, sender='cars.WeeklySummary')
+@receiver(post_delete, sender='cars.MaintenanceEntry')
+def record_sync_tombstone(sender, instance, origin=None, **kwargs):
+    """
+    Keep a tombstone for the delta-sync feed. Rows removed by deleting their car
+    get none: the car's own tombstone tells clients to drop everything it owns.
+    """
+    if not isinstance(instance, Car) and (
+        isinstance(origin, Car) or getattr(origin, 'model', None) is Car
+    ):
+        return
+    car_id = instance.pk if isinstance(instance, Car) else instance.car_id
+    SyncTombstone.objects.create(model=SYNC_MODEL_NAMES[sender.__name__], object_id=instance.pk, car_id=car_id)
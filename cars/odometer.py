@@ -0,0 +1,86 @@
+"""
+Odometer continuity checks.
+
+Weekly odometer readings are typed in by hand, so a week's distance
+(odometer_end - odometer_start) can be negative (a rollback), and a week may
+not start where the previous one ended (a gap, or an overlap when it starts
+below the previous end). The timeline compares every weekly summary with the
+car's previous one using LAG() over (car, week_start), for any number of cars
+in one query.
+
+corrected_distance() is the distance efficiency reports use with
+`distance=corrected`: the km since the previous week's end reading when the
+previous week is the immediately preceding one, so kilometres lost to a
+mistyped odometer_start are still counted.
+"""
+from datetime import timedelta
+
+from django.db.models import F, RowRange, Window
+from django.db.models.functions import FirstValue, Lag
+
+from .models import WeeklySummary
+
+ROLLBACK = 'rollback'   # odometer_end below odometer_start
+GAP = 'gap'             # week starts above the previous week's end
+OVERLAP = 'overlap'     # week starts below the previous week's end
+
+
+def timeline(car_ids=None, date_from=None, date_to=None):
+    """
+    Weekly odometer rows ordered by car and week, each with the previous recorded
+    week of the same car (which may lie before date_from), the gap to it, the
+    anomalies found and the corrected distance.
+    """
+    qs = WeeklySummary.objects.all()
+    if car_ids is not None:
+        qs = qs.filter(car_id__in=car_ids)
+    if date_to:
+        qs = qs.filter(week_start__lte=date_to)
+    per_car = {'partition_by': [F('car_id')], 'order_by': F('week_start').asc()}
+    qs = qs.annotate(
+        previous_week_start=Window(Lag('week_start'), **per_car),
+        previous_odometer_end=Window(Lag('odometer_end'), **per_car),
+    )
+    if date_from:
+        # Filtering on a window expression (the row's own week_start) is applied after
+        # LAG(), so the first week in range still sees its predecessor.
+        qs = qs.annotate(
+            row_week=Window(FirstValue('week_start'), frame=RowRange(start=0, end=0), **per_car),
+        ).filter(row_week__gte=date_from)
+    rows = qs.order_by('car_id', 'week_start').values(
+        'car_id', 'week_start', 'odometer_start', 'odometer_end', 'previous_week_start', 'previous_odometer_end',
+    )
+    return [_classify(row) for row in rows]
+
+
+def _classify(row):
+    start, end = row['odometer_start'] or 0, row['odometer_end'] or 0
+    previous_end = row['previous_odometer_end']
+    row['distance'] = end - start
+    row['gap'] = None if previous_end is None else start - previous_end
+    anomalies = []
+    if end < start:
+        anomalies.append(ROLLBACK)
+    if row['gap']:
+        anomalies.append(GAP if row['gap'] > 0 else OVERLAP)
+    row['anomalies'] = anomalies
+    row['corrected_distance'] = corrected_distance(row)
+    return row
+
+
+def corrected_distance(row):
+    """
+    Distance since the previous week's end reading when that week is the one right
+    before and the readings increase; otherwise the week's own distance floored at 0.
+    """
+    start, end = row['odometer_start'] or 0, row['odometer_end'] or 0
+    previous_end = row['previous_odometer_end']
+    consecutive = row['previous_week_start'] == row['week_start'] - timedelta(days=7)
+    if consecutive and previous_end is not None and end >= previous_end:
+        return end - previous_end
+    return max(0, end - start)
+
+
+def corrected_distances(car_ids=None, date_from=None, date_to=None):
+    """{(car_id, week_start): corrected distance} for the weeks starting in [date_from, date_to]."""
+    return {(r['car_id'], r['week_start']): r['corrected_distance'] for r in timeline(car_ids, date_from, date_to)}
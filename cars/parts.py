@@ -0,0 +1,91 @@
+"""
+Spare part catalog.
+
+MaintenanceEntry.spare_part_type is a free-text copy of the week's description.
+Each maintenance entry also links to a SparePart: either chosen explicitly
+(spare_part_id on the maintenance API, or the admin) or matched from that text
+by its normalized key, which adds the part to the catalog the first time it is
+seen. Part statistics then group the indexed (spare_part, car, date) columns
+instead of scanning the text with icontains.
+"""
+import re
+
+from django.db.models import Avg, Count, Max, Sum
+from django.db.models.functions import ExtractYear
+
+from .models import MaintenanceEntry, SparePart
+
+_SPACE = re.compile(r'\s+')
+# Punctuation and separators around the name ("- Oil filter.", "oil filter ;")
+_EDGES = re.compile(r'^[\W_]+|[\W_]+$')
+
+STATS_GROUPS = {
+    # group: (fields grouped on, ordering)
+    'car': (('spare_part_id', 'spare_part__name', 'car_id', 'car__car_model'), ('spare_part__name', 'car_id')),
+    'car_model': (('spare_part_id', 'spare_part__name', 'car__car_model', 'year'), ('spare_part__name', 'car__car_model', 'year')),
+}
+
+
+def clean_name(text):
+    """Display form of a description: single spaces, no surrounding punctuation."""
+    return _EDGES.sub('', _SPACE.sub(' ', text or '')).strip()[:255]
+
+
+def part_key(text):
+    """Catalog key of a description; descriptions differing only in case, spacing or punctuation match."""
+    return clean_name(text).casefold()
+
+
+def part_for_description(text):
+    """The catalog part for a description, created on first sight; None for an empty description."""
+    name = clean_name(text)
+    if not name:
+        return None
+    part, _created = SparePart.objects.get_or_create(key=name.casefold(), defaults={'name': name})
+    return part
+
+
+def parts_for_descriptions(texts):
+    """{description: part or None} for many descriptions, in a constant number of queries."""
+    names = {}
+    for text in texts:
+        name = clean_name(text)
+        if name:
+            names.setdefault(name.casefold(), name)
+    parts = {p.key: p for p in SparePart.objects.filter(key__in=names)}
+    missing = [SparePart(key=key, name=name) for key, name in names.items() if key not in parts]
+    if missing:
+        # bulk_create skips save(), the key is set above; conflicts come from concurrent writers
+        SparePart.objects.bulk_create(missing, ignore_conflicts=True)
+        parts = {p.key: p for p in SparePart.objects.filter(key__in=names)}
+    return {text: parts.get(part_key(text)) for text in texts}
+
+
+def part_stats(group='car', part_ids=None, car_ids=None, year=None):
+    """
+    Count, total and average price and last replacement date of each spare part,
+    per car (group='car') or per car model and year (group='car_model'), in one
+    grouped query over the (spare_part, car, date) index.
+    """
+    fields, ordering = STATS_GROUPS[group]
+    qs = MaintenanceEntry.objects.filter(spare_part__isnull=False)
+    if part_ids is not None:
+        qs = qs.filter(spare_part_id__in=part_ids)
+    if car_ids is not None:
+        qs = qs.filter(car_id__in=car_ids)
+    if year is not None:
+        qs = qs.filter(date__year=year)
+    if 'year' in fields:
+        qs = qs.annotate(year=ExtractYear('date'))
+    rows = qs.order_by().values(*fields).annotate(
+        count=Count('id'), total=Sum('price'), average=Avg('price'), last_replaced=Max('date'),
+    ).order_by(*ordering)
+    return [
+        {
+            'part_id': row.pop('spare_part_id'),
+            'part': row.pop('spare_part__name'),
+            'car_model': row.pop('car__car_model'),
+            **row,
+        }
+        for row in rows
+    ]
@@ -0,0 +1,109 @@
+"""
+On-demand profiling of API requests for staff users.
+
+Add `?_profile=1` (or the header `X-Profile: 1`) to any /api/ request while
+logged in as staff (e.g. through the admin) and the view runs under cProfile
+with every SQL statement captured. The response body is replaced by a JSON
+report: the call tree (top functions by cumulative time), each query with its
+duration and EXPLAIN plan, and the original status code. With `_profile=file`
+the normal response is returned and the report is saved under PROFILE_DIR
+(JSON plus a .prof file for pstats/snakeviz); its path is in the
+X-Profile-File header.
+
+Without the switch the middleware only does a dictionary lookup per request.
+"""
+import cProfile
+import io
+import json
+import pstats
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.http import JsonResponse
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+PROFILE_TOP_FUNCTIONS = 60
+
+
+def explain(connection, sql):
+    """EXPLAIN output for a captured SELECT, or None if it cannot be explained."""
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+                rows = cursor.fetchall()
+    except Exception as exc:
+        return f'EXPLAIN failed: {exc}'
+    return '\n'.join(' '.join(str(col) for col in row) for row in rows)
+
+
+def build_report(request, response, profiler, queries, elapsed):
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+    connection = connections['default']
+    explained = {}
+    report_queries = []
+    for q in queries:
+        sql = q['sql']
+        if sql not in explained:
+            explained[sql] = explain(connection, sql)
+        report_queries.append({'sql': sql, 'time_ms': round(float(q['time']) * 1000, 3), 'explain': explained[sql]})
+    return {
+        'path': request.get_full_path(),
+        'method': request.method,
+        'status': response.status_code,
+        'total_ms': round(elapsed * 1000, 3),
+        'query_count': len(report_queries),
+        'query_ms': round(sum(q['time_ms'] for q in report_queries), 3),
+        'queries': report_queries,
+        'profile': stream.getvalue(),
+    }
+
+
+def save_report(report, profiler):
+    directory = Path(getattr(settings, 'PROFILE_DIR', settings.BASE_DIR / 'profiles'))
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f"{timezone.now():%Y%m%d-%H%M%S-%f}-{report['path'].split('?')[0].strip('/').replace('/', '_')}"
+    profiler.dump_stats(str(directory / f'{name}.prof'))
+    path = directory / f'{name}.json'
+    path.write_text(json.dumps(report, indent=2, default=str), encoding='utf-8')
+    return path
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        mode = request.GET.get('_profile') or request.headers.get('X-Profile')
+        if not mode:
+            return None
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_staff or view_func.__module__ != 'cars.views':
+            return None
+
+        profiler = cProfile.Profile()
+        with CaptureQueriesContext(connections['default']) as ctx:
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                response = view_func(request, *view_args, **view_kwargs)
+                if hasattr(response, 'render') and callable(response.render):
+                    response = response.render()
+            finally:
+                profiler.disable()
+            elapsed = time.perf_counter() - start
+        report = build_report(request, response, profiler, ctx.captured_queries, elapsed)
+
+        if mode == 'file':
+            response['X-Profile-File'] = str(save_report(report, profiler))
+            return response
+        return JsonResponse(report)
@@ -0,0 +1,131 @@
+"""
+Fleet ranking by a net metric.
+
+Each car's total of a weekly net value (net_car, net_revenue, ...) over the
+weeks starting in [date_from, date_to] is ranked with RANK() and PERCENT_RANK()
+window functions, and only the top and bottom n cars are returned, all in one
+query (plus the archive's partition lookup). As in get_monthly_detail, weekly nets are recomputed from the week's
+daily entries rather than read from the stored WeeklySummary fields.
+
+When the range reaches archived years the archived week totals are merged and
+the ranking is done in Python instead, with the same results.
+"""
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, Window
+from django.db.models.functions import Coalesce, PercentRank, Rank
+
+from .archive import archived_week_totals
+from .models import DailyEntry, WeeklySummary, compute_weekly_nets
+
+RANKING_METRICS = ('net_car', 'net_revenue', 'default_net_revenue', 'net_driver', 'net_expenses')
+MONEY = DecimalField(max_digits=16, decimal_places=2)
+DAILY_FIELDS = ('freight', 'default_freight', 'daily_expense_total')
+
+
+def _week_daily_sum(field):
+    """Correlated SUM of one daily column over the outer weekly summary's car-week."""
+    daily = (
+        DailyEntry.objects.filter(car_id=OuterRef('car_id'), week_start=OuterRef('week_start'))
+        .order_by().values('car_id').annotate(total=Sum(field)).values('total')
+    )
+    return Coalesce(Subquery(daily, output_field=MONEY), Value(Decimal('0')), output_field=MONEY)
+
+
+def _metric_expression(metric):
+    """compute_weekly_nets() of one metric as an SQL expression over the annotated week."""
+    freight, default_freight, expenses = F('freight_sum'), F('default_freight_sum'), F('expense_sum')
+    salary, custody, perished = F('driver_salary'), F('custody'), F('perished')
+    return {
+        'net_expenses': expenses + salary,
+        'net_revenue': freight + custody - expenses - salary,
+        'default_net_revenue': default_freight + custody - expenses - salary,
+        'net_driver': freight + custody - expenses,
+        'net_car': freight + default_freight - expenses - salary - perished,
+    }[metric]
+
+
+def _weeks(date_from, date_to):
+    return WeeklySummary.objects.filter(week_start__range=(date_from, date_to)).annotate(
+        freight_sum=_week_daily_sum('freight'),
+        default_freight_sum=_week_daily_sum('default_freight'),
+        expense_sum=_week_daily_sum('daily_expense_total'),
+    )
+
+
+def _row(row):
+    return {
+        'car_id': row['car_id'],
+        'car_model': row['car_model'],
+        'value': row['value'],
+        'rank': row['rank'],
+        'percentile': round(float(row['percentile']), 4),
+    }
+
+
+def fleet_ranking(metric, date_from, date_to, n):
+    """
+    Rank cars by their `metric` total over the weeks starting in [date_from, date_to].
+    Returns (car_count, top, bottom): the best n cars by descending value and the
+    worst n by ascending value, each row with its rank (1 = best) and percentile (1.0 = best).
+    """
+    archived = archived_week_totals(DAILY_FIELDS, week_from=date_from, week_to=date_to)
+    if archived:
+        return _rank_in_python(metric, date_from, date_to, n, archived)
+
+    ranked = (
+        _weeks(date_from, date_to)
+        .order_by()
+        .values('car_id')
+        .annotate(car_model=F('car__car_model'), value=Sum(_metric_expression(metric), output_field=MONEY))
+        .annotate(
+            rank=Window(Rank(), order_by=F('value').desc()),
+            bottom_rank=Window(Rank(), order_by=F('value').asc()),
+            percentile=Window(PercentRank(), order_by=F('value').asc()),
+            car_count=Window(Count('car_id')),
+        )
+        .filter(Q(rank__lte=n) | Q(bottom_rank__lte=n))
+        .values('car_id', 'car_model', 'value', 'rank', 'bottom_rank', 'percentile', 'car_count')
+    )
+    rows = list(ranked)
+    car_count = rows[0]['car_count'] if rows else 0
+    return car_count, *_slice(rows, n)
+
+
+def _slice(rows, n):
+    top = sorted((r for r in rows if r['rank'] <= n), key=lambda r: (r['rank'], r['car_id']))[:n]
+    bottom = sorted((r for r in rows if r['bottom_rank'] <= n), key=lambda r: (r['bottom_rank'], r['car_id']))[:n]
+    return [_row(r) for r in top], [_row(r) for r in bottom]
+
+
+def _rank_in_python(metric, date_from, date_to, n, archived):
+    """Fallback when archived entries fall in the range: sum per car in Python, then rank."""
+    values = {}
+    models = {}
+    for wk in _weeks(date_from, date_to).values(
+        'car_id', 'car__car_model', 'week_start', 'driver_salary', 'custody', 'perished',
+        'freight_sum', 'default_freight_sum', 'expense_sum',
+    ):
+        extra = archived.get((wk['car_id'], wk['week_start']), {})
+        nets = compute_weekly_nets(
+            freight=wk['freight_sum'] + extra.get('freight', 0),
+            default_freight=wk['default_freight_sum'] + extra.get('default_freight', 0),
+            daily_expenses=wk['expense_sum'] + extra.get('daily_expense_total', 0),
+            driver_salary=wk['driver_salary'], custody=wk['custody'], perished=wk['perished'],
+        )
+        values[wk['car_id']] = values.get(wk['car_id'], Decimal('0')) + nets[metric]
+        models[wk['car_id']] = wk['car__car_model']
+
+    ordered = sorted(values.values())
+    count = len(ordered)
+    rows = []
+    for car_id, value in values.items():
+        below = bisect_left(ordered, value)
+        above = count - bisect_right(ordered, value)
+        rows.append({
+            'car_id': car_id, 'car_model': models[car_id], 'value': value,
+            'rank': above + 1, 'bottom_rank': below + 1,
+            'percentile': below / (count - 1) if count > 1 else 0.0,
+        })
+    return count, *_slice(rows, n)
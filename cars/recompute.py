@@ -0,0 +1,165 @@
+"""
+Bulk recomputation of the stored WeeklySummary net fields.
+
+WeeklySummary.save() recomputes a single week with its own aggregate query and
+fires post_save signals. The helpers here recompute many weeks at once: one
+grouped query over daily entries per batch of cars, and a bulk_update of only
+the summaries whose stored values drifted.
+
+Every recomputation of a week, including WeeklySummary.save(), aggregates and
+writes while holding that (car, week_start)'s lock (lock_weeks), and each
+committed daily entry write recomputes its week again (see the DailyEntry
+signals in models.py). Of two concurrent writers to one week, the one that gets
+the lock last aggregates after the other's entry committed, so the stored nets
+never keep a snapshot that missed an entry. Different weeks never wait on each
+other.
+"""
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .archive import archived_week_totals, merge_totals
+from .cache import bump_data_version
+from .events import publish, publish_invalidate, row_event
+from .models import DailyEntry, WeeklySummary, compute_weekly_nets
+
+NET_FIELDS = ('net_expenses', 'net_revenue', 'default_net_revenue', 'net_driver', 'net_car')
+
+# Drifted weeks corrected (and locked) per transaction by recompute_weekly_summaries
+LOCK_BATCH_SIZE = 100
+
+
+def lock_weeks(pairs):
+    """
+    Block until the current transaction holds the lock of every (car_id, week_start)
+    pair; locks are released when it commits or rolls back. Call inside atomic().
+    Pairs are locked in sorted order, so transactions locking overlapping weeks
+    cannot deadlock.
+    - PostgreSQL: one transaction-level advisory lock per pair.
+    - SQLite allows one writer at a time: a no-op write takes the database write
+      lock before the aggregate is read.
+    """
+    connection = transaction.get_connection()
+    pairs = sorted(set(pairs))
+    if not pairs:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for car_id, week_start in pairs:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [car_id, week_start.toordinal()])
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'UPDATE {WeeklySummary._meta.db_table} SET id = id WHERE 0')
+
+
+def week_totals(car_ids=None, date_from=None, date_to=None):
+    """Summed freight, default_freight and expenses per (car_id, week_start), archived entries included."""
+    daily = DailyEntry.objects.all()
+    if car_ids is not None:
+        daily = daily.filter(car_id__in=car_ids)
+    if date_from:
+        daily = daily.filter(week_start__gte=date_from)
+    if date_to:
+        daily = daily.filter(week_start__lte=date_to)
+    totals = {
+        (row['car_id'], row['week_start']): row
+        for row in daily.order_by().values('car_id', 'week_start').annotate(
+            freight=Sum('freight'), default_freight=Sum('default_freight'), expenses=Sum('daily_expense_total')
+        )
+    }
+
+    # Entries of archived years live in column files, not in the table
+    archived = archived_week_totals(
+        ('freight', 'default_freight', 'daily_expense_total'), car_ids,
+        week_from=date_from, week_to=date_to,
+    )
+    for key, sums in archived.items():
+        merge_totals(totals.setdefault(key, {}), {
+            'freight': sums['freight'], 'default_freight': sums['default_freight'], 'expenses': sums['daily_expense_total'],
+        })
+    return totals
+
+
+def _apply_nets(summary, row, now):
+    """Set the nets computed from a week_totals row; True if a stored value changed."""
+    nets = compute_weekly_nets(
+        freight=row.get('freight'), default_freight=row.get('default_freight'), daily_expenses=row.get('expenses'),
+        driver_salary=summary.driver_salary, custody=summary.custody, perished=summary.perished,
+    )
+    if all(getattr(summary, field) == value for field, value in nets.items()):
+        return False
+    for field, value in nets.items():
+        setattr(summary, field, value)
+    # bulk_update skips auto_now, keep updated_at meaningful for change feeds
+    summary.updated_at = now
+    return True
+
+
+def recompute_weeks(pairs, batch_size=500):
+    """
+    Recompute the weekly summaries of (car_id, week_start) pairs in one transaction
+    that holds their week locks, so the totals include every daily entry committed
+    before the locks were granted. Returns the changed summaries.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return []
+    car_ids = sorted({car_id for car_id, _week in pairs})
+    weeks = {week for _car, week in pairs}
+    with transaction.atomic():
+        lock_weeks(pairs)
+        # After the locks: a summary saved while we waited must not get a newer updated_at than ours
+        now = timezone.now()
+        # Read after locking: on PostgreSQL each statement sees what committed before it started
+        totals = week_totals(car_ids, min(weeks), max(weeks))
+        summaries = WeeklySummary.objects.filter(car_id__in=car_ids, week_start__in=weeks).order_by()
+        changed = [
+            s for s in summaries
+            if (s.car_id, s.week_start) in pairs and _apply_nets(s, totals.get((s.car_id, s.week_start), {}), now)
+        ]
+        if changed:
+            WeeklySummary.objects.bulk_update(changed, NET_FIELDS + ('updated_at',), batch_size=batch_size)
+    for car_id in {s.car_id for s in changed}:
+        bump_data_version(car_id)
+    return changed
+
+
+def recompute_week(car_id, week_start):
+    """Recompute one car-week under its lock (after a daily entry write); returns True if its nets changed."""
+    changed = recompute_weeks([(car_id, week_start)])
+    for summary in changed:
+        publish(row_event('weekly_summary', summary, 'update'))
+    return bool(changed)
+
+
+def recompute_weekly_summaries(car_ids=None, date_from=None, date_to=None, batch_size=500):
+    """
+    Recompute net fields for the weekly summaries of car_ids (all cars if None)
+    with week_start in [date_from, date_to].
+    Returns (checked, changed).
+    """
+    summaries = WeeklySummary.objects.all()
+    if car_ids is not None:
+        summaries = summaries.filter(car_id__in=car_ids)
+    if date_from:
+        summaries = summaries.filter(week_start__gte=date_from)
+    if date_to:
+        summaries = summaries.filter(week_start__lte=date_to)
+    totals = week_totals(car_ids, date_from, date_to)
+
+    checked = 0
+    drifted = []
+    now = timezone.now()
+    for summary in summaries.order_by().iterator(chunk_size=2000):
+        checked += 1
+        if _apply_nets(summary, totals.get((summary.car_id, summary.week_start), {}), now):
+            drifted.append((summary.car_id, summary.week_start))
+
+    # Daily entries may have been written since the totals were read: correct the
+    # drifted weeks under their locks, from totals read again while holding them
+    changed = []
+    for i in range(0, len(drifted), LOCK_BATCH_SIZE):
+        changed += recompute_weeks(drifted[i:i + LOCK_BATCH_SIZE], batch_size=batch_size)
+    for car_id in {s.car_id for s in changed}:
+        publish_invalidate(car_id)
+    return checked, len(changed)
+
@@ -0,0 +1,236 @@
+"""
+Yearly P&L reports.
+
+A year report is the 12 monthly details of get_monthly_detail plus year
+totals, built from one grouped query over daily entries and one query over
+weekly summaries for any number of cars, instead of 12 monthly requests per
+car (each with one aggregate per week).
+
+The monthly rules are kept: a month's daily totals cover the entries dated in
+that calendar month, while its weeks (and their net values) are the weekly
+summaries that start in the month, with nets recomputed from all entries of
+the week.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from .archive import archived_week_month_totals
+from .models import DailyEntry, EXPENSE_FIELDS, WeeklySummary, compute_weekly_nets
+
+# Keys of daily_totals, in the order of get_monthly_detail
+DAILY_TOTAL_FIELDS = ('freight', 'default_freight') + EXPENSE_FIELDS
+WEEK_SUM_FIELDS = ('freight', 'default_freight', 'daily_expense_total')
+
+# Summed per month and per year from the weekly rows
+NET_TOTAL_FIELDS = (
+    ('driver_salary_total', 'driver_salary'),
+    ('custody_total', 'custody'),
+    ('perished_total', 'perished'),
+    ('net_expenses_total', 'net_expenses'),
+    ('net_revenue_total', 'net_revenue'),
+    ('default_net_revenue_total', 'default_net_revenue'),
+    ('net_driver_total', 'net_driver'),
+    ('net_car_total', 'net_car'),
+)
+
+
+def month_bounds(year, month):
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end - timedelta(days=1)
+
+
+def gas_per_km(gas_total, distance_total):
+    if distance_total > 0:
+        return (gas_total / Decimal(distance_total)).quantize(Decimal('0.0001'))
+    return Decimal('0')
+
+
+def _daily_groups(car_ids, date_from, date_to):
+    """
+    {(car_id, week_start, year, month): {field: Decimal}} for every daily entry that is dated
+    in [date_from, date_to] or belongs to a week starting in it, from one GROUP BY plus the archive.
+    """
+    fields = DAILY_TOTAL_FIELDS + ('daily_expense_total',)
+    # Entries dated before date_from always have week_start < date_from, so these two bounds suffice
+    qs = (
+        DailyEntry.objects.filter(car_id__in=car_ids, inspection_date__gte=date_from, week_start__lte=date_to)
+        .annotate(y=ExtractYear('inspection_date'), m=ExtractMonth('inspection_date'))
+        .order_by()
+        .values('car_id', 'week_start', 'y', 'm')
+        .annotate(**{f: Sum(f) for f in fields})
+    )
+    groups = {(r['car_id'], r['week_start'], r['y'], r['m']): {f: r[f] for f in fields} for r in qs}
+    for key, sums in archived_week_month_totals(fields, car_ids, date_from=date_from, week_to=date_to).items():
+        row = groups.setdefault(key, {f: None for f in fields})
+        for f in fields:
+            row[f] = (row[f] or Decimal('0.00')) + sums[f]
+    return groups
+
+
+def _week_row(wk, sums):
+    nets = compute_weekly_nets(
+        freight=sums.get('freight'), default_freight=sums.get('default_freight'),
+        daily_expenses=sums.get('daily_expense_total'),
+        driver_salary=wk['driver_salary'], custody=wk['custody'], perished=wk['perished'],
+    )
+    return {
+        'week_start': wk['week_start'],
+        'week_end': wk['week_end'],
+        'odometer_start': wk['odometer_start'],
+        'odometer_end': wk['odometer_end'],
+        'distance': max(0, int((wk['odometer_end'] or 0) - (wk['odometer_start'] or 0))),
+        'driver_salary': wk['driver_salary'],
+        'custody': wk['custody'],
+        'perished': wk['perished'],
+        **nets,
+    }
+
+
+def _period(car_id, period_start, period_end, weeks, daily_totals):
+    """Totals of a month or a year from its week rows and calendar daily totals."""
+    payload = {
+        'car_id': car_id,
+        'period_start': period_start,
+        'period_end': period_end,
+        'odometer_start': int(weeks[0]['odometer_start'] or 0) if weeks else 0,
+        'odometer_end': int(weeks[-1]['odometer_end'] or 0) if weeks else 0,
+        'distance_total': sum(w['distance'] for w in weeks),
+        'gas_total': daily_totals['gas'],
+        'gas_per_km': Decimal('0'),
+        'daily_totals': daily_totals,
+    }
+    payload['gas_per_km'] = gas_per_km(payload['gas_total'], payload['distance_total'])
+    for total, field in NET_TOTAL_FIELDS:
+        payload[total] = sum((Decimal(str(w[field] or 0)) for w in weeks), Decimal('0'))
+    return payload
+
+
+def monthly_reports(car_ids, year, months=range(1, 13), corrected_distance=False):
+    """
+    Monthly details per car -> {car_id: [payload for MonthlyDetailSerializer per month]}
+    for consecutive `months` of `year`.
+    With corrected_distance, week distances come from the odometer continuity check.
+    """
+    car_ids = list(car_ids)
+    months = list(months)
+    period_start, period_end = month_bounds(year, months[0])[0], month_bounds(year, months[-1])[1]
+    groups = _daily_groups(car_ids, period_start, period_end)
+    corrected = None
+    if corrected_distance:
+        from .odometer import corrected_distances
+        corrected = corrected_distances(car_ids, period_start, period_end)
+
+    month_daily = defaultdict(lambda: {f: Decimal('0') for f in DAILY_TOTAL_FIELDS})
+    week_sums = defaultdict(dict)
+    for (car_id, week_start, y, m), sums in groups.items():
+        if y == year and months[0] <= m <= months[-1]:
+            totals = month_daily[(car_id, m)]
+            for f in DAILY_TOTAL_FIELDS:
+                totals[f] += Decimal(str(sums[f] or 0))
+        if week_start >= period_start:
+            acc = week_sums[(car_id, week_start)]
+            for f in WEEK_SUM_FIELDS:
+                if sums[f] is not None:
+                    acc[f] = acc.get(f, Decimal('0')) + sums[f]
+
+    weeks_by_month = defaultdict(list)
+    for wk in (
+        WeeklySummary.objects.filter(car_id__in=car_ids, week_start__gte=period_start, week_start__lte=period_end)
+        .order_by('car_id', 'week_start')
+        .values('car_id', 'week_start', 'week_end', 'odometer_start', 'odometer_end',
+                'driver_salary', 'custody', 'perished')
+    ):
+        row = _week_row(wk, week_sums.get((wk['car_id'], wk['week_start']), {}))
+        if corrected is not None:
+            row['distance'] = corrected.get((wk['car_id'], wk['week_start']), row['distance'])
+        weeks_by_month[(wk['car_id'], wk['week_start'].month)].append(row)
+
+    reports = {}
+    for car_id in car_ids:
+        reports[car_id] = []
+        for m in months:
+            start, end = month_bounds(year, m)
+            weeks = weeks_by_month.get((car_id, m), [])
+            month = _period(car_id, start, end, weeks, month_daily[(car_id, m)])
+            month.update({'year': year, 'month': m, 'weeks': weeks})
+            reports[car_id].append(month)
+    return reports
+
+
+def yearly_reports(car_ids, year, corrected_distance=False):
+    """
+    Year report per car -> {car_id: payload for YearlyDetailSerializer}.
+    With corrected_distance, week distances come from the odometer continuity check.
+    """
+    reports = {}
+    for car_id, months in monthly_reports(car_ids, year, corrected_distance=corrected_distance).items():
+        year_weeks = [w for month in months for w in month['weeks']]
+        year_daily = {f: sum((month['daily_totals'][f] for month in months), Decimal('0')) for f in DAILY_TOTAL_FIELDS}
+        report = _period(car_id, date(year, 1, 1), date(year, 12, 31), year_weeks, year_daily)
+        report.update({'year': year, 'months': months})
+        reports[car_id] = report
+    return reports
+
+
+def weekly_reports(car_ids, week_start):
+    """
+    One week of several cars -> {car_id: week row with daily_totals and gas_per_km}, from one
+    grouped query over daily entries and one over weekly summaries. Cars without a
+    weekly summary that week are left out.
+    """
+    car_ids = list(car_ids)
+    week_end = week_start + timedelta(days=6)
+    daily = defaultdict(lambda: {f: Decimal('0') for f in DAILY_TOTAL_FIELDS + ('daily_expense_total',)})
+    for (car_id, ws, _y, _m), sums in _daily_groups(car_ids, week_start, week_end).items():
+        if ws == week_start:
+            totals = daily[car_id]
+            for f, value in sums.items():
+                totals[f] += Decimal(str(value or 0))
+    reports = {}
+    for wk in (
+        WeeklySummary.objects.filter(car_id__in=car_ids, week_start=week_start)
+        .order_by('car_id')
+        .values('car_id', 'week_start', 'week_end', 'odometer_start', 'odometer_end',
+                'driver_salary', 'custody', 'perished')
+    ):
+        sums = daily[wk['car_id']]
+        row = _week_row(wk, sums)
+        row.update({
+            'car_id': wk['car_id'],
+            'gas_per_km': gas_per_km(sums['gas'], row['distance']),
+            'daily_totals': {f: sums[f] for f in DAILY_TOTAL_FIELDS},
+        })
+        reports[wk['car_id']] = row
+    return reports
+
+
+def combine_periods(rows, period_start, period_end):
+    """Money totals, distance and gas/km of several cars' month or year payloads."""
+    distance = sum(r['distance_total'] for r in rows)
+    gas = sum((r['gas_total'] for r in rows), Decimal('0'))
+    combined = {
+        'period_start': period_start,
+        'period_end': period_end,
+        'distance_total': distance,
+        'gas_total': gas,
+        'gas_per_km': gas_per_km(gas, distance),
+        'daily_totals': {f: sum((r['daily_totals'][f] for r in rows), Decimal('0')) for f in DAILY_TOTAL_FIELDS},
+    }
+    for total, _field in NET_TOTAL_FIELDS:
+        combined[total] = sum((r[total] for r in rows), Decimal('0'))
+    return combined
+
+
+def fleet_totals(reports, year):
+    """Fleet-wide monthly and yearly money totals from per-car yearly reports."""
+    months = []
+    for m in range(1, 13):
+        month = combine_periods([r['months'][m - 1] for r in reports], *month_bounds(year, m))
+        month['month'] = m
+        months.append(month)
+    return months, combine_periods(reports, date(year, 1, 1), date(year, 12, 31))
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Car, DailyEntry, WeeklySummary, week_start_from_date, MaintenanceEntry
+from .models import Car, CarGroup, DailyEntry, WeeklySummary, week_start_from_date, MaintenanceEntry, SparePart, ServiceDue, Job
 from decimal import Decimal
 from datetime import timedelta
 
@@ -11,6 +11,15 @@ class CarSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+class CarGroupSerializer(serializers.ModelSerializer):
+    car_ids = serializers.PrimaryKeyRelatedField(queryset=Car.objects.all(), source='cars', many=True, required=False)
+
+    class Meta:
+        model = CarGroup
+        fields = ['id', 'name', 'car_ids', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at']
+
+
 class DailyEntrySerializer(serializers.ModelSerializer):
     car_id = serializers.PrimaryKeyRelatedField(queryset=Car.objects.all(), source='car', write_only=True)
     # Make driver_name optional for create_daily_entry endpoint
@@ -21,11 +30,17 @@ class DailyEntrySerializer(serializers.ModelSerializer):
         fields = [
             'id', 'car_id', 'inspection_date', 'day_name', 'driver_name', 'area',
             'freight', 'default_freight', 'gas', 'oil', 'card', 'fines', 'tips', 'maintenance',
-            'spare_parts', 'tires', 'balance', 'washing', 'without', 'driver_expenses', 'week_start'
+            'spare_parts', 'tires', 'balance', 'washing', 'without', 'driver_expenses', 'daily_expense_total', 'week_start'
         ]
-        read_only_fields = ['id', 'week_start']
+        read_only_fields = ['id', 'daily_expense_total', 'week_start']
 
     def validate(self, attrs):
+        # Archived years are read-only (see cars/archive.py)
+        from .archive import is_archived
+        car = attrs.get('car') or getattr(self.instance, 'car', None)
+        entry_date = attrs.get('inspection_date') or getattr(self.instance, 'inspection_date', None)
+        if car and entry_date and is_archived(car.id, entry_date.year):
+            raise serializers.ValidationError({'inspection_date': f'Year {entry_date.year} is archived for this car and cannot be changed.'})
         # auto-compute week_start from inspection_date
         inspection_date = attrs.get('inspection_date')
         if inspection_date:
@@ -36,6 +51,36 @@ class DailyEntrySerializer(serializers.ModelSerializer):
         return attrs
 
 
+class DailyEntryImportSerializer(serializers.ModelSerializer):
+    """
+    Row validation for bulk imports. car_id and archived years are checked against
+    sets preloaded by the importer (context 'car_ids' and 'archived') instead of
+    one query per row.
+    """
+    car_id = serializers.IntegerField()
+    driver_name = serializers.CharField(required=False, allow_blank=True, default='')
+    day_name = serializers.CharField(required=False, allow_blank=True, default='')
+
+    class Meta:
+        model = DailyEntry
+        fields = [
+            'car_id', 'inspection_date', 'day_name', 'driver_name', 'area',
+            'freight', 'default_freight', 'gas', 'oil', 'card', 'fines', 'tips', 'maintenance',
+            'spare_parts', 'tires', 'balance', 'washing', 'without', 'driver_expenses'
+        ]
+
+    def validate(self, attrs):
+        if attrs['car_id'] not in self.context['car_ids']:
+            raise serializers.ValidationError({'car_id': f'Car {attrs["car_id"]} does not exist.'})
+        inspection_date = attrs['inspection_date']
+        if (attrs['car_id'], inspection_date.year) in self.context['archived']:
+            raise serializers.ValidationError({'inspection_date': f'Year {inspection_date.year} is archived for this car and cannot be changed.'})
+        attrs['week_start'] = week_start_from_date(inspection_date)
+        if not attrs.get('day_name'):
+            attrs['day_name'] = inspection_date.strftime('%A')
+        return attrs
+
+
 class WeeklyCreateSerializer(serializers.ModelSerializer):
     car_id = serializers.PrimaryKeyRelatedField(queryset=Car.objects.all(), source='car', write_only=True)
     week_ref_date = serializers.DateField(write_only=True, required=True, help_text="Any date inside the week (Saturday-Friday)")
@@ -81,6 +126,14 @@ class WeeklyDetailSerializer(serializers.Serializer):
     daily_entries = DailyEntrySerializer(many=True)
 
 
+class WeeklyRangeSerializer(serializers.Serializer):
+    """Consecutive weekly details of one car"""
+    car_id = serializers.IntegerField()
+    week_from = serializers.DateField()
+    week_to = serializers.DateField()
+    weeks = WeeklyDetailSerializer(many=True)
+
+
 class MonthlyDetailSerializer(serializers.Serializer):
     """Monthly summary for a car"""
     car_id = serializers.IntegerField()
@@ -108,13 +161,182 @@ class MonthlyDetailSerializer(serializers.Serializer):
     weeks = serializers.ListField(child=serializers.DictField())
 
 
+class YearlyDetailSerializer(MonthlyDetailSerializer):
+    """Yearly summary for a car: year totals plus the 12 monthly summaries"""
+    month = None
+    weeks = None
+    months = MonthlyDetailSerializer(many=True)
+
+
+class PeriodTotalsSerializer(serializers.Serializer):
+    """Fleet-wide money totals of a month or year (no odometers)"""
+    month = serializers.IntegerField(required=False)
+    period_start = serializers.DateField()
+    period_end = serializers.DateField()
+    distance_total = serializers.IntegerField()
+    gas_total = serializers.DecimalField(max_digits=16, decimal_places=2)
+    gas_per_km = serializers.DecimalField(max_digits=12, decimal_places=4)
+    driver_salary_total = serializers.DecimalField(max_digits=16, decimal_places=2)
+    custody_total = serializers.DecimalField(max_digits=16, decimal_places=2)
+    perished_total = serializers.DecimalField(max_digits=16, decimal_places=2)
+    net_expenses_total = serializers.DecimalField(max_digits=16, decimal_places=2)
+    net_revenue_total = serializers.DecimalField(max_digits=16, decimal_places=2)
+    default_net_revenue_total = serializers.DecimalField(max_digits=16, decimal_places=2)
+    net_driver_total = serializers.DecimalField(max_digits=16, decimal_places=2)
+    net_car_total = serializers.DecimalField(max_digits=16, decimal_places=2)
+    daily_totals = serializers.DictField()
+
+
+class FleetYearlySerializer(serializers.Serializer):
+    """Yearly summaries of every car plus fleet monthly and yearly totals"""
+    year = serializers.IntegerField()
+    months = PeriodTotalsSerializer(many=True)
+    totals = PeriodTotalsSerializer()
+    cars = YearlyDetailSerializer(many=True)
+
+
+class GroupWeekTotalsSerializer(serializers.Serializer):
+    """Money totals, distance and gas/km of one week"""
+    distance = serializers.IntegerField()
+    gas_total = serializers.DecimalField(max_digits=16, decimal_places=2)
+    gas_per_km = serializers.DecimalField(max_digits=12, decimal_places=4)
+    driver_salary = serializers.DecimalField(max_digits=16, decimal_places=2)
+    custody = serializers.DecimalField(max_digits=16, decimal_places=2)
+    perished = serializers.DecimalField(max_digits=16, decimal_places=2)
+    net_expenses = serializers.DecimalField(max_digits=16, decimal_places=2)
+    net_revenue = serializers.DecimalField(max_digits=16, decimal_places=2)
+    default_net_revenue = serializers.DecimalField(max_digits=16, decimal_places=2)
+    net_driver = serializers.DecimalField(max_digits=16, decimal_places=2)
+    net_car = serializers.DecimalField(max_digits=16, decimal_places=2)
+    daily_totals = serializers.DictField()
+
+
+class GroupWeekCarSerializer(GroupWeekTotalsSerializer):
+    """One member car's week"""
+    car_id = serializers.IntegerField()
+    odometer_start = serializers.IntegerField()
+    odometer_end = serializers.IntegerField()
+
+
+class GroupWeeklySerializer(serializers.Serializer):
+    """A car group's week: group totals plus the week of every member car"""
+    group_id = serializers.IntegerField()
+    name = serializers.CharField()
+    week_start = serializers.DateField()
+    week_end = serializers.DateField()
+    car_count = serializers.IntegerField()
+    totals = GroupWeekTotalsSerializer()
+    cars = GroupWeekCarSerializer(many=True)
+
+
+class GroupMonthCarSerializer(PeriodTotalsSerializer):
+    """One member car's month totals"""
+    car_id = serializers.IntegerField()
+
+
+class GroupMonthlySerializer(serializers.Serializer):
+    """A car group's month: group totals plus the month totals of every member car"""
+    group_id = serializers.IntegerField()
+    name = serializers.CharField()
+    year = serializers.IntegerField()
+    month = serializers.IntegerField()
+    car_count = serializers.IntegerField()
+    totals = PeriodTotalsSerializer()
+    cars = GroupMonthCarSerializer(many=True)
+
+
+class RankedCarSerializer(serializers.Serializer):
+    """One car's metric total with its fleet rank and percentile"""
+    car_id = serializers.IntegerField()
+    car_model = serializers.CharField()
+    value = serializers.DecimalField(max_digits=16, decimal_places=2)
+    rank = serializers.IntegerField()
+    percentile = serializers.FloatField()
+
+
+class FleetRankingSerializer(serializers.Serializer):
+    """Top and bottom cars of the fleet by a net metric"""
+    metric = serializers.CharField()
+    period_start = serializers.DateField()
+    period_end = serializers.DateField()
+    car_count = serializers.IntegerField()
+    top = RankedCarSerializer(many=True)
+    bottom = RankedCarSerializer(many=True)
+
+
 class MaintenanceEntrySerializer(serializers.ModelSerializer):
     car_id = serializers.PrimaryKeyRelatedField(queryset=Car.objects.all(), source='car', write_only=True)
+    spare_part_id = serializers.PrimaryKeyRelatedField(
+        queryset=SparePart.objects.all(), source='spare_part', required=False, allow_null=True
+    )
+    spare_part_name = serializers.CharField(source='spare_part.name', read_only=True, default=None)
 
     class Meta:
         model = MaintenanceEntry
         fields = [
             'id', 'car_id', 'date', 'air_filter', 'oil_filter', 'gas_filter',
-            'oil_change', 'price', 'spare_part_type'
+            'oil_change', 'price', 'spare_part_type', 'spare_part_id', 'spare_part_name'
         ]
         read_only_fields = ['id']
+
+    def validate(self, attrs):
+        # A part given explicitly sticks; null goes back to matching spare_part_type
+        if 'spare_part' in attrs:
+            attrs['spare_part_explicit'] = attrs['spare_part'] is not None
+        return attrs
+
+
+class SparePartSerializer(serializers.ModelSerializer):
+    entry_count = serializers.IntegerField(read_only=True, required=False)
+
+    class Meta:
+        model = SparePart
+        fields = ['id', 'name', 'entry_count']
+        read_only_fields = ['id']
+
+    def validate_name(self, value):
+        from .parts import clean_name, part_key
+        name = clean_name(value)
+        if not name:
+            raise serializers.ValidationError('Name must not be empty.')
+        if SparePart.objects.filter(key=part_key(name)).exclude(pk=getattr(self.instance, 'pk', None)).exists():
+            raise serializers.ValidationError('A spare part with this name already exists.')
+        return name
+
+
+class SparePartStatSerializer(serializers.Serializer):
+    """One spare part's replacements for a car, or for a car model in a year"""
+    part_id = serializers.IntegerField()
+    part = serializers.CharField()
+    car_id = serializers.IntegerField(required=False)
+    car_model = serializers.CharField()
+    year = serializers.IntegerField(required=False)
+    count = serializers.IntegerField()
+    total = serializers.DecimalField(max_digits=16, decimal_places=2)
+    average = serializers.DecimalField(max_digits=16, decimal_places=2)
+    last_replaced = serializers.DateField()
+
+
+class ServiceDueSerializer(serializers.ModelSerializer):
+    car_id = serializers.IntegerField(read_only=True)
+    car_model = serializers.CharField(source='car.car_model', read_only=True)
+
+    class Meta:
+        model = ServiceDue
+        fields = [
+            'car_id', 'car_model', 'service', 'status', 'last_service_date', 'odometer_at_service',
+            'current_odometer', 'km_since', 'days_since', 'km_remaining', 'days_remaining', 'due_date', 'due_ratio'
+        ]
+        read_only_fields = fields
+
+
+class JobSerializer(serializers.ModelSerializer):
+    car_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'job_type', 'car_id', 'week_start', 'payload', 'status', 'attempts', 'max_attempts',
+            'last_error', 'run_after', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
@@ -0,0 +1,116 @@
+"""
+Maintenance due predictions.
+
+A service (oil change, oil/air/gas filter) took place on the dates where that
+MaintenanceEntry column is above zero. The last date per car and service comes
+from one grouped query; the odometer at that date and the current reading are
+looked up in the weekly odometer history of the whole fleet at once
+(analytics.odometer_readings). Each service has a km and a day interval
+(SERVICE_INTERVALS), whichever runs out first. A service never recorded for a
+car is counted from the car's first odometer week.
+
+`manage.py compute_service_due`, run nightly, stores the result in ServiceDue,
+so the fleet's due list is a plain indexed read.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .analytics import odometer_readings
+from .models import Car, MaintenanceEntry, ServiceDue, WeeklySummary
+
+
+def _int(value):
+    return None if np.isnan(value) else int(round(value))
+
+
+def service_status(today=None, car_ids=None):
+    """Unsaved ServiceDue rows for every car (or car_ids) and service type, as of today."""
+    today = today or timezone.localdate()
+    intervals = settings.SERVICE_INTERVALS
+    services = list(intervals)
+
+    cars = Car.objects.order_by('id')
+    weeks = WeeklySummary.objects.order_by('car_id', 'week_start')
+    entries = MaintenanceEntry.objects.filter(date__lte=today)
+    if car_ids is not None:
+        cars, weeks, entries = cars.filter(id__in=car_ids), weeks.filter(car_id__in=car_ids), entries.filter(car_id__in=car_ids)
+    car_list = list(cars.values_list('id', flat=True))
+    last_service = {
+        row.pop('car_id'): row
+        for row in entries.order_by().values('car_id').annotate(
+            **{s: Max('date', filter=Q(**{f'{s}__gt': 0})) for s in services}
+        )
+    }
+    week_rows = list(weeks.values_list('car_id', 'week_start', 'odometer_start', 'odometer_end'))
+    week_car = np.array([r[0] for r in week_rows], dtype=np.int64)
+    week_day = np.array([r[1].toordinal() for r in week_rows], dtype=np.int64)
+    odo_start = np.array([r[2] for r in week_rows], dtype=np.float64)
+    odo_end = np.array([r[3] for r in week_rows], dtype=np.float64)
+    unique_cars, first_rows = np.unique(week_car, return_index=True)
+    first_week = dict(zip(unique_cars.tolist(), week_day[first_rows].tolist()))
+
+    # One row per (car, service): the last service date, or the first odometer week
+    pair_car, pair_service, pair_date = [], [], []
+    for car_id in car_list:
+        for service in services:
+            pair_car.append(car_id)
+            pair_service.append(service)
+            pair_date.append(last_service.get(car_id, {}).get(service))
+    today_ord = today.toordinal()
+    pair_day = np.array([
+        d.toordinal() if d else first_week.get(c, today_ord) for c, d in zip(pair_car, pair_date)
+    ], dtype=np.int64)
+    tracked = np.array([d is not None or c in first_week for c, d in zip(pair_car, pair_date)], dtype=bool)
+
+    readings = odometer_readings(week_car, week_day, odo_start, odo_end, pair_car, pair_day)
+    km_interval = np.array([intervals[s][0] for s in pair_service], dtype=np.float64)
+    day_interval = np.array([intervals[s][1] for s in pair_service], dtype=np.float64)
+    km_since = np.maximum(readings['current'] - readings['reading'], 0.0)
+    days_since = np.where(tracked, today_ord - pair_day, np.nan)
+    km_remaining = km_interval - km_since
+    days_remaining = day_interval - days_since
+    with np.errstate(invalid='ignore', divide='ignore'):
+        due_ratio = np.fmax(km_since / km_interval, days_since / day_interval)
+        # Days until the km interval runs out at the recent pace (never when the car stands still)
+        km_days = np.where(readings['km_per_day'] > 0, km_remaining / readings['km_per_day'], np.nan)
+    # Days from today until the first interval runs out; not before the last service
+    due_in = np.maximum(np.fmin(days_remaining, km_days), -days_since)
+
+    status = np.full(len(pair_car), ServiceDue.OK, dtype=object)
+    status[due_ratio >= settings.SERVICE_DUE_RATIO] = ServiceDue.DUE
+    status[due_ratio >= 1.0] = ServiceDue.OVERDUE
+    status[np.isnan(due_ratio)] = ServiceDue.UNKNOWN
+
+    now = timezone.now()
+    return [
+        ServiceDue(
+            car_id=pair_car[i],
+            service=pair_service[i],
+            last_service_date=pair_date[i],
+            odometer_at_service=_int(readings['reading'][i]) if pair_date[i] else None,
+            current_odometer=_int(readings['current'][i]),
+            km_since=_int(km_since[i]),
+            days_since=_int(days_since[i]),
+            km_remaining=_int(km_remaining[i]),
+            days_remaining=_int(days_remaining[i]),
+            due_date=None if np.isnan(due_in[i]) else today + timedelta(days=int(np.floor(due_in[i]))),
+            due_ratio=None if np.isnan(due_ratio[i]) else round(float(due_ratio[i]), 4),
+            status=status[i],
+            computed_at=now,
+        )
+        for i in range(len(pair_car))
+    ]
+
+
+def refresh_service_due(today=None):
+    """Recompute and replace the stored ServiceDue rows of the whole fleet; returns them."""
+    rows = service_status(today)
+    with transaction.atomic():
+        ServiceDue.objects.all().delete()
+        ServiceDue.objects.bulk_create(rows, batch_size=1000)
+    return rows
@@ -0,0 +1,160 @@
+"""
+Delta-sync change feed for offline clients.
+
+Every synced model has an indexed (updated_at, id) and deletes leave a
+SyncTombstone, so "what changed since" is a range scan per table. The feed
+orders all changes by (timestamp, type, id) and the client gets that position
+back as an opaque signed token:
+
+    GET /api/sync/                 full snapshot, first page
+    GET /api/sync/?since=<token>   everything after the position in the token
+
+Rows are only served once they are SYNC_SETTLE_SECONDS old, so a write whose
+transaction commits slightly after a later write is not skipped.
+"""
+import heapq
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Car, DailyEntry, MaintenanceEntry, SyncTombstone, WeeklySummary
+
+# Feed order of the sources: ties on the timestamp are broken by this index, then by id
+SYNC_SOURCES = (
+    ('car', Car),
+    ('daily_entry', DailyEntry),
+    ('weekly_summary', WeeklySummary),
+    ('maintenance_entry', MaintenanceEntry),
+)
+DELETE_KIND = len(SYNC_SOURCES)
+
+EPOCH_DT = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+TOKEN_SALT = 'cars.sync'
+
+
+class SyncTokenExpired(Exception):
+    """The token is older than the tombstone retention window; the client must do a full sync."""
+
+
+def to_micros(dt):
+    return (dt - EPOCH_DT) // timedelta(microseconds=1)
+
+
+def from_micros(n):
+    return EPOCH_DT + timedelta(microseconds=n)
+
+
+def make_token(ts, kind, obj_id, deletes_from):
+    return signing.dumps([ts, kind, obj_id, deletes_from], salt=TOKEN_SALT)
+
+
+def parse_token(token):
+    """Return (ts, kind, id, deletes_from); raises ValueError for tampered or malformed tokens."""
+    try:
+        ts, kind, obj_id, deletes_from = signing.loads(token, salt=TOKEN_SALT)
+        return int(ts), int(kind), int(obj_id), int(deletes_from)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise ValueError('Invalid sync token')
+
+
+def _after(field, ts, kind, obj_id, source_kind):
+    """Q for rows positioned after (ts, kind, obj_id) in feed order, for one source."""
+    after = Q(**{f'{field}__gt': from_micros(ts)})
+    if source_kind > kind:
+        after |= Q(**{field: from_micros(ts)})
+    elif source_kind == kind:
+        after |= Q(**{field: from_micros(ts), 'id__gt': obj_id})
+    return after
+
+
+def _plain(values):
+    """Money as strings, like the rest of the API."""
+    return {k: str(v) if isinstance(v, Decimal) else v for k, v in values.items()}
+
+
+def _changes(source_kind, name, model, cursor, until, limit, car_id):
+    ts, kind, obj_id, _deletes_from = cursor
+    qs = model.objects.filter(_after('updated_at', ts, kind, obj_id, source_kind), updated_at__lte=until)
+    if car_id is not None:
+        qs = qs.filter(**({'id': car_id} if model is Car else {'car_id': car_id}))
+    fields = [f.attname for f in model._meta.concrete_fields]
+    for row in qs.order_by('updated_at', 'id').values(*fields)[:limit]:
+        yield (to_micros(row['updated_at']), source_kind, row['id']), {
+            'type': name,
+            'op': 'create' if to_micros(row['created_at']) > ts else 'update',
+            'id': row['id'],
+            'car_id': row['id'] if model is Car else row['car_id'],
+            'updated_at': row['updated_at'],
+            'data': _plain(row),
+        }
+
+
+def _deletes(cursor, until, limit, car_id):
+    ts, kind, obj_id, deletes_from = cursor
+    qs = SyncTombstone.objects.filter(
+        _after('deleted_at', ts, kind, obj_id, DELETE_KIND),
+        deleted_at__gt=from_micros(deletes_from), deleted_at__lte=until,
+    )
+    if car_id is not None:
+        qs = qs.filter(car_id=car_id)
+    for t in qs.order_by('deleted_at', 'id')[:limit]:
+        yield (to_micros(t.deleted_at), DELETE_KIND, t.id), {
+            'type': t.model,
+            'op': 'delete',
+            'id': t.object_id,
+            'car_id': t.car_id,
+            'updated_at': t.deleted_at,
+        }
+
+
+def get_changes(since=None, limit=500, car_id=None):
+    """
+    One page of the change feed after the `since` token (from the start when None).
+    Returns {'changes': [...], 'next': token, 'has_more': bool}.
+    Raises ValueError for a bad token and SyncTokenExpired for one older than tombstone retention.
+    """
+    now = timezone.now()
+    until = now - timedelta(seconds=getattr(settings, 'SYNC_SETTLE_SECONDS', 2))
+    if since:
+        cursor = parse_token(since)
+        retention = now - timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 90))
+        if cursor[0] < to_micros(retention) and cursor[3] < to_micros(retention):
+            raise SyncTokenExpired()
+    else:
+        # A client without data needs no deletes from before its snapshot started
+        cursor = (0, 0, 0, to_micros(until))
+
+    # Each source returns at most limit + 1 rows in feed order; merging them and cutting
+    # at limit gives the page and tells whether more changes follow
+    streams = [
+        _changes(kind, name, model, cursor, until, limit + 1, car_id)
+        for kind, (name, model) in enumerate(SYNC_SOURCES)
+    ]
+    if since:
+        streams.append(_deletes(cursor, until, limit + 1, car_id))
+    merged = list(heapq.merge(*streams, key=lambda item: item[0]))
+    page, has_more = merged[:limit], len(merged) > limit
+
+    if has_more:
+        position = page[-1][0]
+    else:
+        # Everything up to `until` has been delivered
+        position = (to_micros(until), DELETE_KIND + 1, 0)
+    return {
+        'changes': [change for _position, change in page],
+        'next': make_token(*position, cursor[3]),
+        'has_more': has_more,
+    }
+
+
+def prune_tombstones(days=None):
+    """Delete tombstones older than the retention window. Returns the number deleted."""
+    if days is None:
+        days = getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 90)
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = SyncTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
@@ -1,3 +1,1259 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import LiveServerTestCase, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import archive, events, jobs, recompute, throttling, warmup
+from .archive import archive_partition, partition_dir, restore_partition
+from .cache import REPORT_CACHE_ALIAS, get_data_version, report_cache_enabled
+from .checks import check_report_cache
+from .events import EventStream, get_broadcaster
+from .loadtest import compare, parse_mix, percentile, route_stats
+from .middleware import CompressionMiddleware
+from .models import (
+    ArchivedPartition, Car, DailyEntry, Job, MaintenanceEntry, ServiceDue, SparePart, SyncTombstone, WeeklySummary,
+    compute_weekly_nets,
+)
+from .renderers import FastJSONRenderer
+from .service_due import refresh_service_due
+from .workers import init_worker
+
+
+def make_car(name='Test car'):
+    return Car.objects.create(car_model=name, license_start=date(2024, 1, 1), license_end=date(2030, 1, 1))
+
+
+def make_week(car, week_start, **fields):
+    fields.setdefault('odometer_start', 0)
+    fields.setdefault('odometer_end', 10)
+    return WeeklySummary.objects.create(car=car, week_start=week_start, **fields)
+
+
+def expected_nets(summary):
+    """Net fields of summary computed from a fresh aggregation of its daily entries."""
+    totals = DailyEntry.objects.filter(car=summary.car_id, week_start=summary.week_start).aggregate(
+        freight=Sum('freight'), default_freight=Sum('default_freight'), expenses=Sum('daily_expense_total'),
+    )
+    return compute_weekly_nets(
+        totals['freight'], totals['default_freight'], totals['expenses'],
+        summary.driver_salary, summary.custody, summary.perished,
+    )
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class APITestCase(TestCase):
+    """Throttling off and an empty report cache, so tests see fresh data."""
+
+    def setUp(self):
+        caches[REPORT_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.car = make_car()
+
+
+class DailyExpenseTotalTests(APITestCase):
+    def test_expense_total_feeds_weekly_and_monthly_nets(self):
+        response = self.client.post('/api/daily-entries/', {
+            'car_id': self.car.id, 'inspection_date': '2025-10-02', 'day_name': 'Thursday', 'freight': 1000,
+            'default_freight': 800, 'gas': 200, 'oil': 50, 'washing': 20, 'without': 30, 'driver_expenses': 5,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Decimal(response.data['daily_expense_total']), Decimal('305'))
+        response = self.client.post('/api/weekly/', {
+            'car_id': self.car.id, 'week_ref_date': '2025-10-02', 'odometer_start': 100, 'odometer_end': 200,
+            'driver_salary': 100, 'custody': 50, 'perished': 10,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Decimal(response.data['net_expenses']), Decimal('405'))
+        self.assertEqual(Decimal(response.data['net_car']), Decimal('1800') - (305 + 100 + 10))
+        self.assertEqual(WeeklySummary.objects.get().net_driver, Decimal('1050') - 305)
+
+        # The entry's week is recomputed when the write commits
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch('/api/daily-entries/by-date/', {
+                'car_id': self.car.id, 'inspection_date': '2025-10-02', 'gas': 300,
+            }, format='json')
+        self.assertEqual(Decimal(response.data['daily_expense_total']), Decimal('405'))
+        summary = WeeklySummary.objects.get()
+        self.assertEqual(summary.net_expenses, Decimal('505'))
+        monthly = self.client.get('/api/monthly/detail/', {'car_id': self.car.id, 'year': 2025, 'month': 9}).data
+        self.assertEqual(Decimal(monthly['net_expenses_total']), Decimal('505'))
+        weekly = self.client.get('/api/weekly/detail/', {'car_id': self.car.id, 'date': '2025-10-02'}).data
+        self.assertEqual(Decimal(weekly['net_revenue']), Decimal('1050') - 505)
+
+    def test_total_is_kept_up_to_date_on_save(self):
+        entry = DailyEntry.objects.create(car=self.car, inspection_date=date(2025, 10, 2), driver_name='d', gas=10, tips=5)
+        self.assertEqual(entry.daily_expense_total, Decimal('15'))
+        entry.fines = 20
+        entry.save()
+        entry.refresh_from_db()
+        self.assertEqual(entry.daily_expense_total, Decimal('35'))
+
+
+class FuelEfficiencyTests(APITestCase):
+    url = '/api/analytics/fuel-efficiency/'
+    first_week = date(2025, 1, 4)
+
+    def add_weeks(self, car, gas_by_week):
+        for i, gas in enumerate(gas_by_week):
+            week_start = self.first_week + timedelta(days=7 * i)
+            DailyEntry.objects.create(car=car, inspection_date=week_start, driver_name='d', gas=gas)
+            make_week(car, week_start, odometer_start=1000 * i, odometer_end=1000 * i + 500)
+
+    def test_flags_outlier_week(self):
+        self.add_weeks(self.car, [100, 104, 98, 101, 99, 400, 102, 97])
+        response = self.client.get(self.url, {'z': 3})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['weeks_analyzed'], 8)
+        self.assertEqual([week['week_start'] for week in response.data['flagged']], [self.first_week + timedelta(days=35)])
+        # In-sample statistics cap the z-score of one week among n at sqrt(n - 1) < 3
+        self.assertGreater(response.data['flagged'][0]['z_score'], 3)
+
+    def test_outlier_against_steady_history(self):
+        self.add_weeks(self.car, [100] * 5 + [400] + [100] * 2)
+        flagged = self.client.get(self.url).data['flagged']
+        self.assertEqual(len(flagged), 1)
+        self.assertIsNone(flagged[0]['z_score'])
+
+    def test_short_history_is_not_flagged(self):
+        self.add_weeks(self.car, [100, 400, 100])
+        self.assertEqual(self.client.get(self.url, {'z': 1}).data['flagged'], [])
+
+    def test_invalid_parameters(self):
+        for params in ({'window': 0}, {'z': 0}, {'z': -1}, {'z': 'nan'}, {'z': 'inf'}, {'min_weeks': 1}, {'from': 'x'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+
+
+class ForecastTests(APITestCase):
+    first_week = date(2024, 1, 6)
+
+    def setUp(self):
+        super().setUp()
+        for i in range(60):
+            week_start = self.first_week + timedelta(days=7 * i)
+            DailyEntry.objects.create(car=self.car, inspection_date=week_start, driver_name='d', freight=1000 + 10 * i, gas=100)
+            make_week(self.car, week_start, driver_salary=50)
+
+    def test_car_and_fleet_forecast_follow_trend(self):
+        params = {'horizon_weeks': 4, 'history_weeks': 60}
+        response = self.client.get('/api/analytics/forecast/', {'car_id': self.car.id, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['history_points'], 60)
+        forecast = response.data['forecast']
+        self.assertEqual(len(forecast), 4)
+        self.assertAlmostEqual(forecast[0]['freight'], 1600, delta=5)
+        self.assertAlmostEqual(forecast[0]['expenses'], 150, delta=1)
+        self.assertLessEqual(forecast[0]['freight_lower'], forecast[0]['freight'])
+        self.assertGreaterEqual(forecast[0]['freight_upper'], forecast[0]['freight'])
+        fleet = self.client.get('/api/analytics/forecast/fleet/', params).data
+        self.assertEqual(fleet['forecast'][0]['net_car'], forecast[0]['net_car'])
+
+    def test_new_entries_refresh_cached_forecast(self):
+        params = {'horizon_weeks': 4, 'history_weeks': 60}
+        before = self.client.get('/api/analytics/forecast/fleet/', params).data['forecast'][0]['freight']
+        DailyEntry.objects.create(car=self.car, inspection_date=self.first_week + timedelta(days=7 * 59 + 1), driver_name='d', freight=100000)
+        after = self.client.get('/api/analytics/forecast/fleet/', params).data['forecast'][0]['freight']
+        self.assertGreater(after, before)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get('/api/analytics/forecast/', {'car_id': 999}).status_code, 400)
+        self.assertEqual(self.client.get('/api/analytics/forecast/', {'car_id': self.car.id, 'horizon_weeks': 0}).status_code, 400)
+
+
+class RecomputeTests(APITestCase):
+    def test_command_corrects_drifted_summaries(self):
+        DailyEntry.objects.create(car=self.car, inspection_date=date(2025, 10, 2), driver_name='d', freight=100, gas=10)
+        make_week(self.car, date(2025, 9, 27))
+        DailyEntry.objects.filter(car=self.car).update(freight=500)
+        out = StringIO()
+        call_command('recompute_weekly', stdout=out)
+        self.assertIn('updated 1', out.getvalue())
+        self.assertEqual(WeeklySummary.objects.get().net_revenue, Decimal('490'))
+        self.assertEqual(recompute.recompute_weekly_summaries(), (1, 0))
+
+    def test_spawned_worker_sets_up_django(self):
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=init_worker) as pool:
+            # Raises AppRegistryNotReady in the worker unless init_worker ran django.setup()
+            pool.submit(exec, 'from cars.models import WeeklySummary').result(timeout=60)
+
+
+class JobQueueTests(APITestCase):
+    week_start = date(2025, 9, 27)
+
+    def test_inline_without_async_jobs(self):
+        DailyEntry.objects.create(car=self.car, inspection_date=date(2025, 10, 2), driver_name='d', maintenance=50)
+        make_week(self.car, self.week_start, description='brakes')
+        self.assertEqual(MaintenanceEntry.objects.get().spare_part_type, 'brakes')
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(ASYNC_JOBS=True)
+    def test_queued_jobs_coalesce_and_run(self):
+        DailyEntry.objects.create(car=self.car, inspection_date=date(2025, 10, 2), driver_name='d', maintenance=50)
+        summary = make_week(self.car, self.week_start, description='brakes')
+        jobs.run_pending_jobs()
+        summary.description = 'tires'
+        summary.save()
+        summary.save()
+        self.assertEqual(Job.objects.filter(status='pending').count(), 1)
+        self.assertEqual(MaintenanceEntry.objects.get().spare_part_type, 'brakes')
+        response = self.client.get('/api/jobs/', {'status': 'pending'})
+        self.assertEqual(len(response.data), 1)
+
+        self.assertEqual(jobs.run_pending_jobs(), 1)
+        self.assertEqual(MaintenanceEntry.objects.get().spare_part_type, 'tires')
+        job_id = response.data[0]['id']
+        self.assertEqual(self.client.get(f'/api/jobs/{job_id}/').data['status'], 'succeeded')
+
+    @override_settings(ASYNC_JOBS=True)
+    def test_failing_job_retries_then_fails(self):
+        calls = []
+
+        def failing(car_id, week_start, **payload):
+            calls.append(car_id)
+            raise RuntimeError('boom')
+
+        with mock.patch.dict(jobs.JOB_HANDLERS, {'failing': failing}), mock.patch.object(jobs, 'RETRY_BACKOFF', 0):
+            job = jobs.enqueue('failing', car_id=self.car.id)
+            for _ in range(4):
+                jobs.run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, len(calls)), ('failed', 3, 3))
+        self.assertIn('boom', job.last_error)
+
+    def test_job_list_rejects_bad_limit(self):
+        for limit in ('-1', '0', 'x'):
+            self.assertEqual(self.client.get('/api/jobs/', {'limit': limit}).status_code, 400, limit)
+        self.assertEqual(self.client.get('/api/jobs/', {'limit': 10000}).status_code, 200)
+        self.assertEqual(self.client.get('/api/jobs/999/').status_code, 404)
+
+
+class ArchiveTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        archive_root = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_root.cleanup)
+        settings_override = override_settings(ARCHIVE_ROOT=archive_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for i in range(20):
+            day = date(2023, 12, 16) + timedelta(days=i)
+            DailyEntry.objects.create(car=self.car, inspection_date=day, driver_name='d', freight=100 + i, gas=Decimal('7.25'))
+        for week_start in (date(2023, 12, 16), date(2023, 12, 23), date(2023, 12, 30)):
+            make_week(self.car, week_start, driver_salary=30)
+
+    def reports(self):
+        return [
+            self.client.get('/api/weekly/detail/', {'car_id': self.car.id, 'date': '2024-01-02'}).json(),
+            self.client.get('/api/monthly/detail/', {'car_id': self.car.id, 'year': 2023, 'month': 12}).json(),
+            self.client.get('/api/yearly/detail/', {'car_id': self.car.id, 'year': 2023}).json(),
+        ]
+
+    def test_round_trip_keeps_reports_and_rows(self):
+        before = self.reports()
+        fields = ('id', 'inspection_date', 'freight', 'gas', 'created_at')
+        rows = list(DailyEntry.objects.filter(inspection_date__year=2023).order_by('inspection_date').values(*fields))
+        self.assertEqual(archive_partition(self.car.id, 2023), len(rows))
+        self.assertFalse(DailyEntry.objects.filter(inspection_date__year=2023).exists())
+        self.assertEqual(self.reports(), before)
+
+        response = self.client.post('/api/daily-entries/', {
+            'car_id': self.car.id, 'inspection_date': '2023-12-20', 'day_name': 'Wednesday', 'freight': 1,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(restore_partition(ArchivedPartition.objects.get()), len(rows))
+        restored = DailyEntry.objects.filter(inspection_date__year=2023).order_by('inspection_date').values(*fields)
+        self.assertEqual(list(restored), rows)
+        self.assertEqual(self.reports(), before)
+
+    def test_restore_stamps_updated_at_last(self):
+        archive_partition(self.car.id, 2023)
+        with CaptureQueriesContext(connection) as queries:
+            restore_partition(ArchivedPartition.objects.get())
+        statements = [q['sql'] for q in queries]
+        last_insert = max(i for i, sql in enumerate(statements) if sql.startswith('INSERT INTO "cars_dailyentry"'))
+        stamp = next(i for i, sql in enumerate(statements) if sql.startswith('UPDATE "cars_dailyentry" SET "updated_at"'))
+        self.assertGreater(stamp, last_insert)
+        self.assertEqual(DailyEntry.objects.filter(inspection_date__year=2023).values('updated_at').distinct().count(), 1)
+
+    def test_report_requests_skip_partition_lookups_without_archive(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.reports()
+        self.assertFalse([q for q in queries if 'cars_archivedpartition' in q['sql']])
+
+    @skipUnless(os.path.isdir('/proc/self/fd'), 'needs /proc/self/fd')
+    def test_open_column_files_stay_bounded(self):
+        cars = [make_car(f'Archived {i}') for i in range(12)]
+        for car in cars:
+            DailyEntry.objects.create(car=car, inspection_date=date(2023, 6, 1), driver_name='d', freight=5)
+            archive_partition(car.id, 2023)
+        open_files = len(os.listdir('/proc/self/fd'))
+        limit = 3 * len(archive.COLUMNS)
+        with override_settings(ARCHIVE_MAX_OPEN_FILES=limit):
+            for car in cars:
+                entries = archive.archived_entries(car.id, date(2023, 5, 27))
+                self.assertEqual([entry.freight for entry in entries], [Decimal('5.00')])
+            self.assertLessEqual(len(os.listdir('/proc/self/fd')) - open_files, limit)
+        archive.close_partitions()
+
+
+class ImportTests(APITestCase):
+    url = '/api/daily-entries/import/'
+
+    def upload(self, content, name='entries.csv'):
+        upload = io.BytesIO(content)
+        upload.name = name
+        return self.client.post(self.url, {'file': upload}, format='multipart')
+
+    def test_imports_valid_rows_and_reports_rejected_ones(self):
+        make_week(self.car, date(2025, 9, 27), description='pads')
+        DailyEntry.objects.create(car=self.car, inspection_date=date(2025, 9, 28), driver_name='d', freight=5)
+        car = self.car.id
+        response = self.upload((
+            'car_id,inspection_date,driver_name,freight,gas,maintenance,area\n'
+            f'{car},2025-10-01,a,100,10,,x\n'
+            f'{car},2025-10-02,b,200,,30,\n'
+            f'{car},2025-10-02,b,200,,30,\n'
+            f'{car},2025-09-28,b,200,,30,\n'
+            '999,2025-10-02,b,200,,30,\n'
+            f'{car},bad,b,abc,,30,\n'
+        ).encode())
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual((response.data['created'], response.data['rejected']), (2, 4))
+        self.assertEqual(sorted(error['row'] for error in response.data['errors']), [4, 5, 6, 7])
+        self.assertEqual(WeeklySummary.objects.get().net_revenue, Decimal('305') - 40)
+        maintenance = MaintenanceEntry.objects.get()
+        self.assertEqual((maintenance.price, maintenance.spare_part_type), (Decimal('30'), 'pads'))
+        self.assertEqual(DailyEntry.objects.get(inspection_date=date(2025, 10, 1)).day_name, 'Wednesday')
+
+    def test_utf8_with_bom(self):
+        content = f'car_id,inspection_date,driver_name,freight\n{self.car.id},2025-10-01,سائق,100\n'
+        response = self.upload(content.encode('utf-8-sig'))
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(DailyEntry.objects.get().driver_name, 'سائق')
+
+    def test_rejects_other_encodings_before_importing(self):
+        rows = ''.join(f'{self.car.id},2025-10-{day:02d},d,100\n' for day in range(1, 8))
+        content = f'car_id,inspection_date,driver_name,freight\n{rows}{self.car.id},2025-10-08,سائق,100\n'
+        response = self.upload(content.encode('cp1256'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('UTF-8', response.data['detail'])
+        self.assertIn('line 9', response.data['detail'])
+        self.assertFalse(DailyEntry.objects.exists())
+
+    def test_rejects_unsupported_files(self):
+        self.assertEqual(self.upload(b'x', name='entries.txt').status_code, 400)
+        self.assertEqual(self.client.post(self.url, {}, format='multipart').status_code, 400)
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class SyncTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            DailyEntry.objects.create(car=self.car, inspection_date=date(2025, 10, 4) + timedelta(days=i), driver_name='d', freight=10)
+        make_week(self.car, date(2025, 10, 4))
+
+    def read_all(self, **params):
+        response = self.client.get('/api/sync/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        changes = list(response.data['changes'])
+        while response.data['has_more']:
+            response = self.client.get('/api/sync/', {**params, 'since': response.data['next']})
+            changes += response.data['changes']
+        return changes, response.data['next']
+
+    def test_paged_feed_returns_every_row_once(self):
+        changes, token = self.read_all(limit=2)
+        keys = [(c['type'], c['id']) for c in changes]
+        self.assertEqual(len(keys), len(set(keys)))
+        self.assertEqual(len(keys), 1 + DailyEntry.objects.count() + WeeklySummary.objects.count())
+        self.assertEqual(self.client.get('/api/sync/', {'since': token}).data['changes'], [])
+
+    def test_creates_and_deletes_since_cursor(self):
+        _, token = self.read_all()
+        entry = DailyEntry.objects.create(car=self.car, inspection_date=date(2025, 10, 9), driver_name='d', freight=5, maintenance=3)
+        response = self.client.get('/api/sync/', {'since': token})
+        self.assertEqual(
+            [(c['type'], c['op']) for c in response.data['changes']],
+            [('daily_entry', 'create'), ('maintenance_entry', 'create')],
+        )
+        self.assertEqual(response.data['changes'][0]['data']['freight'], '5.00')
+
+        entry_id = entry.id
+        entry.delete()
+        changes = self.client.get('/api/sync/', {'since': response.data['next']}).data['changes']
+        self.assertEqual([(c['type'], c['op'], c['id']) for c in changes], [('daily_entry', 'delete', entry_id)])
+
+    def test_archive_and_restore(self):
+        with tempfile.TemporaryDirectory() as archive_root, override_settings(ARCHIVE_ROOT=archive_root):
+            for i in range(5):
+                DailyEntry.objects.create(car=self.car, inspection_date=date(2023, 12, 20) + timedelta(days=i), driver_name='d', freight=1)
+            _, token = self.read_all()
+            archived_ids = set(DailyEntry.objects.filter(inspection_date__year=2023).values_list('id', flat=True))
+            archive_partition(self.car.id, 2023)
+            response = self.client.get('/api/sync/', {'since': token})
+            changes = response.data['changes']
+            self.assertEqual({(c['type'], c['op']) for c in changes}, {('daily_entry', 'delete')})
+            self.assertEqual({c['id'] for c in changes}, archived_ids)
+
+            restore_partition(ArchivedPartition.objects.get())
+            changes = self.client.get('/api/sync/', {'since': response.data['next']}).data['changes']
+            self.assertEqual({(c['type'], c['op']) for c in changes}, {('daily_entry', 'update')})
+            self.assertEqual({c['id'] for c in changes}, archived_ids)
+
+    def test_invalid_and_expired_cursors(self):
+        _, token = self.read_all()
+        self.assertEqual(self.client.get('/api/sync/', {'since': 'junk'}).status_code, 400)
+        with override_settings(SYNC_TOMBSTONE_RETENTION_DAYS=0):
+            self.assertEqual(self.client.get('/api/sync/', {'since': token}).status_code, 410)
+
+
+class CompressionTests(APITestCase):
+    payload = b'{"weeks":[' + b','.join(b'{"freight":"%d.00"}' % i for i in range(200)) + b']}'
+
+    def compress(self, content_type, accept_encoding='gzip', **meta):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding, **meta)
+        return CompressionMiddleware(lambda request: HttpResponse(self.payload, content_type=content_type))(request)
+
+    def test_json_is_compressed(self):
+        response = self.compress('application/json')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), self.payload)
+        self.assertFalse(self.compress('application/json', accept_encoding='').has_header('Content-Encoding'))
+
+    def test_html_and_csrf_responses_are_not_compressed(self):
+        self.assertFalse(self.compress('text/html; charset=utf-8').has_header('Content-Encoding'))
+        response = self.compress('application/json', CSRF_COOKIE_USED=True)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, self.payload)
+
+    @override_settings(COMPRESSION_MIN_SIZE=100)
+    def test_api_report_round_trip(self):
+        for day in range(27, 31):
+            DailyEntry.objects.create(car=self.car, inspection_date=date(2025, 9, day), driver_name='d', freight=100, gas=10)
+        url = '/api/monthly/detail/'
+        params = {'car_id': self.car.id, 'year': 2025, 'month': 9}
+        plain = self.client.get(url, params)
+        compressed = self.client.get(url, params, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(compressed.content)), plain.json())
+        browsable = self.client.get(url, params, HTTP_ACCEPT='text/html', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(browsable.has_header('Content-Encoding'))
+
+    def test_fast_renderer_matches_drf(self):
+        data = {
+            'amount': Decimal('12.50'), 'when': timezone.make_aware(datetime(2025, 10, 2, 8, 30)),
+            'day': date(2025, 10, 2), 'text': 'سيارة ', 'big': 2 ** 70,
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class MonthlyReportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        # The week of 2025-09-27 runs into October
+        for day, freight in ((date(2025, 9, 27), 100), (date(2025, 9, 30), 200), (date(2025, 10, 2), 400)):
+            DailyEntry.objects.create(car=self.car, inspection_date=day, driver_name='d', freight=freight, gas=10)
+        make_week(self.car, date(2025, 9, 27), odometer_start=100, odometer_end=250, driver_salary=50)
+        make_week(self.car, date(2025, 10, 4), odometer_start=250, odometer_end=300)
+        DailyEntry.objects.create(car=self.car, inspection_date=date(2025, 10, 5), driver_name='d', freight=800, gas=20)
+
+    def monthly(self, month, **params):
+        response = self.client.get('/api/monthly/detail/', {'car_id': self.car.id, 'year': 2025, 'month': month, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.json()
+
+    def test_split_week_rules(self):
+        september = self.monthly(9)
+        # Daily totals cover the calendar month, the week and its nets belong to the month it starts in
+        self.assertEqual(Decimal(september['daily_totals']['freight']), Decimal('300'))
+        self.assertEqual([week['week_start'] for week in september['weeks']], ['2025-09-27'])
+        self.assertEqual(Decimal(september['weeks'][0]['net_revenue']), Decimal('700') - 30 - 50)
+        self.assertEqual(Decimal(september['net_driver_total']), Decimal('700') - 30)
+        self.assertEqual((september['distance_total'], Decimal(september['gas_per_km'])), (150, Decimal('0.1333')))
+        october = self.monthly(10)
+        self.assertEqual(Decimal(october['daily_totals']['freight']), Decimal('1200'))
+        self.assertEqual([week['week_start'] for week in october['weeks']], ['2025-10-04'])
+        self.assertEqual((october['odometer_start'], october['odometer_end']), (250, 300))
+
+    def test_matches_yearly_detail(self):
+        yearly = self.client.get('/api/yearly/detail/', {'car_id': self.car.id, 'year': 2025}).json()
+        for month in range(1, 13):
+            monthly = self.client.get('/api/monthly/detail/', {'car_id': self.car.id, 'year': 2025, 'month': month}).json()
+            self.assertEqual(yearly['months'][month - 1], monthly, month)
+
+    def test_query_count_does_not_grow_with_weeks(self):
+        for i in range(2, 5):
+            make_week(self.car, date(2025, 10, 4) + timedelta(days=7 * i))
+        with CaptureQueriesContext(connection) as queries:
+            self.monthly(10)
+        self.assertLessEqual(len(queries), 5, [query['sql'] for query in queries])
+
+
+class AdminTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        self.other = make_car('Zed')
+        self.week = make_week(self.car, date(2025, 9, 27), driver_salary=20)
+        DailyEntry.objects.create(car=self.car, inspection_date=date(2025, 9, 28), driver_name='d', freight=50, gas=5)
+
+    def test_changelists_and_car_filter(self):
+        for url in ('/admin/cars/dailyentry/', '/admin/cars/weeklysummary/', '/admin/cars/maintenanceentry/',
+                    f'/admin/cars/dailyentry/?car={self.car.id}', '/admin/cars/dailyentry/?inspection_date__year=2025',
+                    '/admin/cars/dailyentry/?car=abc'):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+        response = self.client.get(f'/admin/cars/dailyentry/?car={self.other.id}')
+        self.assertContains(response, 'Zed')
+        self.assertContains(response, 'select2')
+        self.assertContains(response, '0 results')
+        response = self.client.get('/admin/autocomplete/', {
+            'term': 'Ze', 'app_label': 'cars', 'model_name': 'dailyentry', 'field_name': 'car',
+        })
+        self.assertEqual([result['text'] for result in response.json()['results']], [str(self.other)])
+
+    def test_recompute_action_runs_inline(self):
+        WeeklySummary.objects.filter(pk=self.week.pk).update(net_car=999)
+        response = self.client.post('/admin/cars/weeklysummary/', {
+            'action': 'recompute_weeks', '_selected_action': [self.week.pk],
+        }, follow=True)
+        self.assertContains(response, 'Recomputed weekly summaries for 1 car(s)')
+        self.week.refresh_from_db()
+        self.assertEqual(self.week.net_car, expected_nets(self.week)['net_car'])
+
+    @override_settings(ASYNC_JOBS=True)
+    def test_recompute_action_queues_one_job_per_car(self):
+        WeeklySummary.objects.filter(pk=self.week.pk).update(net_car=999)
+        ids = list(DailyEntry.objects.values_list('id', flat=True))
+        response = self.client.post('/admin/cars/dailyentry/', {'action': 'recompute_weeks', '_selected_action': ids}, follow=True)
+        self.assertContains(response, 'Queued weekly recompute')
+        self.assertEqual(Job.objects.filter(job_type='recompute_weekly', status='pending').count(), 1)
+        jobs.run_pending_jobs()
+        self.week.refresh_from_db()
+        self.assertEqual(self.week.net_car, expected_nets(self.week)['net_car'])
+
+
+class CarDeletionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.keep = make_car('Keep')
+        DailyEntry.objects.create(car=self.keep, inspection_date=date(2024, 1, 1), driver_name='d', maintenance=2)
+        for i in range(200):
+            DailyEntry.objects.create(car=self.car, inspection_date=date(2023, 1, 1) + timedelta(days=i * 2), driver_name='d', maintenance=i % 2)
+        make_week(self.car, date(2023, 12, 30))
+
+    def test_delete_removes_rows_and_archives_in_bounded_queries(self):
+        with tempfile.TemporaryDirectory() as archive_root, override_settings(ARCHIVE_ROOT=archive_root):
+            archive_partition(self.car.id, 2023)
+            path = partition_dir(2023, self.car.id)
+            self.assertTrue(path.exists())
+            version = get_data_version()
+            with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+                response = self.client.delete(f'/api/cars/{self.car.id}/')
+            self.assertEqual(response.status_code, 204)
+            self.assertLess(len(queries), 40)
+            self.assertFalse(path.exists())
+        self.assertNotEqual(get_data_version(), version)
+        self.assertFalse(DailyEntry.objects.filter(car_id=self.car.id).exists())
+        self.assertFalse(MaintenanceEntry.objects.filter(car_id=self.car.id).exists())
+        self.assertFalse(WeeklySummary.objects.filter(car_id=self.car.id).exists())
+        self.assertFalse(ArchivedPartition.objects.exists())
+        self.assertTrue(SyncTombstone.objects.filter(model='car', object_id=self.car.id).exists())
+        self.assertEqual(DailyEntry.objects.filter(car=self.keep).count(), 1)
+
+    @override_settings(ASYNC_JOBS=True)
+    def test_async_delete_queues_a_single_job(self):
+        response = self.client.delete(f'/api/cars/{self.keep.id}/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.delete(f'/api/cars/{self.keep.id}/').data['job_id'], response.data['job_id'])
+        jobs.run_pending_jobs()
+        self.assertEqual(self.client.get(response.data['status_url']).data['status'], 'succeeded')
+        self.assertFalse(Car.objects.filter(pk=self.keep.id).exists())
+        self.assertEqual(self.client.delete(f'/api/cars/{self.keep.id}/').status_code, 404)
+
+
+@override_settings(
+    THROTTLE_ENABLED=True, THROTTLE_API_KEYS=frozenset({'dispatch-key'}),
+    THROTTLE_BUCKETS={'default': {'capacity': 3, 'rate': 0.5}, 'reports': {'capacity': 4, 'rate': 0.5}},
+)
+class ThrottlingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+        self.report_url = f'/api/monthly/detail/?car_id={self.car.id}&year=2025&month=1'
+
+    def exhaust(self, client, url='/api/cars/', **extra):
+        statuses = [client.get(url, **extra).status_code for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+
+    def test_report_budget_is_separate(self):
+        self.assertEqual([self.client.get(self.report_url).status_code for _ in range(3)], [200, 200, 429])
+        response = self.client.get(self.report_url)
+        self.assertEqual((response.status_code, response['Retry-After']), (429, '4'))
+        self.assertEqual(self.client.get('/api/cars/').status_code, 200)
+
+    def test_clients_are_told_apart_by_user_key_and_address(self):
+        self.exhaust(self.client)
+        self.assertEqual(APIClient(REMOTE_ADDR='10.0.0.9').get('/api/cars/').status_code, 200)
+        # Same address: a listed API key and a logged-in user have their own budgets
+        self.exhaust(self.client, HTTP_X_API_KEY='dispatch-key')
+        user = User.objects.create_user('driver', password='secret')
+        self.client.force_authenticate(user)
+        self.exhaust(self.client)
+        self.client.force_authenticate(None)
+        # An unknown key does not buy a fresh budget
+        self.assertEqual(self.client.get('/api/cars/', HTTP_X_API_KEY='made-up').status_code, 429)
+
+    def test_report_concurrency_cap(self):
+        with mock.patch.object(throttling, '_report_slots', threading.BoundedSemaphore(1)) as slots:
+            slots.acquire()
+            response = self.client.get(self.report_url)
+            self.assertEqual((response.status_code, response['Retry-After']), (429, '1'))
+            slots.release()
+            self.assertEqual(self.client.get(self.report_url).status_code, 200)
+
+
+class ProfilingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/monthly/detail/?car_id={self.car.id}&year=2025&month=1'
+
+    def test_non_staff_get_the_normal_response(self):
+        self.assertIn('daily_totals', self.client.get(self.url + '&_profile=1').json())
+        self.client.force_login(User.objects.create_user('user', 'user@example.com', 'pw'))
+        self.assertIn('daily_totals', self.client.get(self.url + '&_profile=1').json())
+
+    def test_staff_get_queries_plans_and_profile(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        report = self.client.get(self.url + '&_profile=1').json()
+        self.assertEqual(report['status'], 200)
+        self.assertGreater(report['query_count'], 0)
+        self.assertTrue(all(q['explain'] for q in report['queries'] if q['sql'].startswith('SELECT')))
+        self.assertIn('get_monthly_detail', report['profile'])
+        self.assertIn('queries', self.client.get(self.url, HTTP_X_PROFILE='1').json())
+
+    def test_profile_file_mode_keeps_the_response(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        with tempfile.TemporaryDirectory() as profile_dir, override_settings(PROFILE_DIR=profile_dir):
+            response = self.client.get(self.url + '&_profile=file')
+            self.assertIn('daily_totals', response.json())
+            self.assertTrue(os.path.exists(response['X-Profile-File']))
+
+
+class WeeklyRangeTests(APITestCase):
+    params = {'from': '2023-12-01', 'to': '2024-02-29'}
+
+    def setUp(self):
+        super().setUp()
+        rng = random.Random(2)
+        week_start = date(2023, 12, 2)
+        while week_start < date(2024, 2, 20):
+            if rng.random() < 0.7:
+                make_week(self.car, week_start, odometer_start=1, odometer_end=rng.randint(1, 900),
+                          driver_salary=rng.randint(0, 500), custody=3, perished=1, description='w')
+            for i in range(7):
+                if rng.random() < 0.6:
+                    DailyEntry.objects.create(car=self.car, inspection_date=week_start + timedelta(days=i), driver_name='d',
+                                              freight=rng.randint(0, 900), gas=rng.randint(0, 90))
+            week_start += timedelta(days=7)
+
+    def weekly_range(self, **params):
+        response = self.client.get('/api/weekly/range/', {'car_id': self.car.id, **self.params, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['weeks']
+
+    def test_weeks_match_weekly_detail(self):
+        weeks = self.weekly_range(entries=1)
+        self.assertEqual(len(weeks), 14)
+        for week in weeks:
+            self.assertEqual(week, self.client.get('/api/weekly/detail/', {'car_id': self.car.id, 'date': week['week_start']}).json())
+        lite = self.weekly_range()
+        self.assertEqual(lite[3]['daily_entries'], [])
+        self.assertEqual(lite[3]['totals'], weeks[3]['totals'])
+
+    def test_archived_weeks_are_unchanged(self):
+        before = self.weekly_range(entries=1)
+        with tempfile.TemporaryDirectory() as archive_root, override_settings(ARCHIVE_ROOT=archive_root):
+            archive_partition(self.car.id, 2023)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.weekly_range(entries=1), before)
+        self.assertLess(len(queries), 15)
+
+    def test_invalid_ranges(self):
+        for params in ({'from': '2024-02-01', 'to': '2024-01-01'}, {'from': '2020-02-01', 'to': '2024-01-01'}):
+            response = self.client.get('/api/weekly/range/', {'car_id': self.car.id, **params})
+            self.assertEqual(response.status_code, 400, params)
+
+
+class RankingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        rng = random.Random(3)
+        self.cars = [self.car] + [make_car(f'Car {i}') for i in range(7)]
+        for car in self.cars:
+            for k in range(10):
+                week_start = date(2023, 12, 30) + timedelta(days=7 * k)
+                make_week(car, week_start, odometer_start=1, odometer_end=5, driver_salary=rng.randint(0, 500),
+                          custody=3, perished=rng.randint(0, 9))
+                for i in range(3):
+                    DailyEntry.objects.create(car=car, inspection_date=week_start + timedelta(days=i * 2), driver_name='d',
+                                              freight=rng.randint(0, 900), default_freight=rng.randint(0, 50), gas=rng.randint(0, 90))
+
+    def monthly_totals(self, metric, start, end):
+        totals = {}
+        for car in self.cars:
+            for month in (1, 2, 3):
+                report = self.client.get('/api/monthly/detail/', {'car_id': car.id, 'year': 2024, 'month': month}).json()
+                for week in report['weeks']:
+                    if start <= week['week_start'] <= end:
+                        totals[car.id] = totals.get(car.id, Decimal(0)) + Decimal(week[metric])
+        return totals
+
+    def test_ranking_matches_weekly_reports(self):
+        for metric in ('net_car', 'net_driver', 'net_expenses'):
+            totals = self.monthly_totals(metric, '2024-01-01', '2024-02-29')
+            response = self.client.get('/api/analytics/ranking/', {'metric': metric, 'from': '2024-01-01', 'to': '2024-02-29', 'n': 3})
+            data = response.json()
+            self.assertEqual(data['car_count'], len(self.cars))
+            ranked = sorted(totals.items(), key=lambda item: -item[1])
+            self.assertEqual([(row['car_id'], Decimal(row['value'])) for row in data['top']], ranked[:3])
+            self.assertEqual([(row['car_id'], Decimal(row['value'])) for row in data['bottom']], ranked[::-1][:3])
+            self.assertEqual([row['rank'] for row in data['top']], [1, 2, 3])
+            self.assertEqual(data['top'][0]['percentile'], 1.0)
+            self.assertEqual(data['bottom'][0]['percentile'], 0.0)
+
+    def test_archived_weeks_keep_their_rank(self):
+        params = {'from': '2023-12-30', 'to': '2024-02-29', 'n': 5}
+        before = self.client.get('/api/analytics/ranking/', params).json()
+        with tempfile.TemporaryDirectory() as archive_root, override_settings(ARCHIVE_ROOT=archive_root):
+            archive_partition(self.cars[2].id, 2023)
+            archive_partition(self.cars[2].id, 2024)
+            caches[REPORT_CACHE_ALIAS].clear()
+            self.assertEqual(self.client.get('/api/analytics/ranking/', params).json(), before)
+
+    def test_unknown_metric(self):
+        response = self.client.get('/api/analytics/ranking/', {'metric': 'x', 'from': '2024-01-01', 'to': '2024-02-29'})
+        self.assertEqual(response.status_code, 400)
+
+
+class OdometerTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        readings = [(1000, 1500), (1500, 2000), (2100, 2600), (2500, 2400), (2400, 3000)]
+        for i, (start, end) in enumerate(readings):
+            week_start = date(2024, 1, 6) + timedelta(days=7 * i)
+            make_week(self.car, week_start, odometer_start=start, odometer_end=end)
+            DailyEntry.objects.create(car=self.car, inspection_date=week_start, driver_name='d', gas=50)
+        make_week(make_car('Other'), date(2024, 1, 6), odometer_start=10, odometer_end=20)
+
+    def test_anomalies_and_corrected_distance(self):
+        data = self.client.get('/api/analytics/odometer/').json()
+        self.assertEqual(data['weeks_analyzed'], 6)
+        rows = [week for week in data['weeks'] if week['car_id'] == self.car.id]
+        self.assertEqual([week['anomalies'] for week in rows], [[], [], ['gap'], ['rollback', 'overlap'], []])
+        self.assertEqual([week['gap'] for week in rows], [None, 0, 100, -100, 0])
+        self.assertEqual([week['corrected_distance'] for week in rows], [500, 500, 600, 0, 600])
+
+    def test_filtered_view_uses_the_previous_week(self):
+        data = self.client.get('/api/analytics/odometer/', {
+            'from': '2024-01-20', 'car_id': self.car.id, 'anomalies_only': 1,
+        }).json()
+        self.assertEqual(data['weeks_analyzed'], 3)
+        self.assertEqual([week['week_start'] for week in data['weeks']], ['2024-01-20', '2024-01-27'])
+        self.assertEqual(data['weeks'][0]['previous_odometer_end'], 2000)
+
+    def test_reports_with_corrected_distance(self):
+        params = {'car_id': self.car.id, 'year': 2024}
+        raw = self.client.get('/api/monthly/detail/', {**params, 'month': 1}).json()
+        corrected = self.client.get('/api/monthly/detail/', {**params, 'month': 1, 'distance': 'corrected'}).json()
+        self.assertEqual(raw['distance_total'], 500 + 500 + 500 + 0)
+        self.assertEqual(corrected['distance_total'], 500 + 500 + 600 + 0)
+        yearly = self.client.get('/api/yearly/detail/', {**params, 'distance': 'corrected'}).json()
+        self.assertEqual(yearly['months'][0], corrected)
+        self.assertEqual(yearly['distance_total'], 2200)
+        response = self.client.get('/api/analytics/fuel-efficiency/', {'car_id': self.car.id, 'distance': 'corrected'})
+        self.assertEqual(response.status_code, 200)
+
+
+class WorkerWarmupTests(APITestCase):
+    def test_import_app_loads_the_request_path(self):
+        warmup.import_app()
+        for name in warmup.WARM_MODULES:
+            self.assertIn(name, sys.modules)
+
+    def test_every_pool_thread_gets_a_connection(self):
+        threads = 3
+        barrier = threading.Barrier(threads)
+
+        def connected():
+            # Hold each check until every thread has one, so all pool threads report
+            barrier.wait(5)
+            try:
+                return threading.get_ident(), connection.connection is not None
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(threads) as pool:
+            warmup.warm_worker(pool, threads)
+            results = [future.result() for future in [pool.submit(connected) for _ in range(threads)]]
+        self.assertEqual(len({ident for ident, _ in results}), threads)
+        self.assertTrue(all(ok for _, ok in results))
+
+    def test_report_periods(self):
+        weeks, months = warmup.report_periods(date(2025, 10, 8))
+        self.assertEqual(weeks, [date(2025, 10, 4), date(2025, 9, 27)])
+        self.assertEqual(months, [(2025, 10), (2025, 9)])
+        self.assertEqual(warmup.report_periods(date(2025, 1, 2))[1], [(2025, 1), (2024, 12)])
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class ReportCacheTests(TransactionTestCase):
+    """warm_reports computes in threads, which only see committed rows."""
+
+    def setUp(self):
+        caches[REPORT_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.cars = [make_car(f'Car {i}') for i in range(4)]
+        for car in self.cars:
+            for i in range(40):
+                DailyEntry.objects.create(car=car, inspection_date=date(2025, 9, 1) + timedelta(days=i), driver_name='d', freight=i, gas=3)
+            make_week(car, date(2025, 10, 4), odometer_start=1, odometer_end=50)
+
+    def warm(self, *args):
+        out = StringIO()
+        call_command('warm_reports', '--date', '2025-10-08', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def reports(self, car):
+        return (
+            self.client.get('/api/weekly/detail/', {'car_id': car.id, 'date': '2025-10-05'}).json(),
+            self.client.get('/api/monthly/detail/', {'car_id': car.id, 'year': 2025, 'month': 9}).json(),
+        )
+
+    def test_warmed_reports_are_served_from_the_cache(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('needs a file-backed SQLite test database')
+        self.assertIn('Computed 16 report(s), 0 already cached', self.warm('--workers', '3'))
+        car = self.cars[2]
+        with CaptureQueriesContext(connection) as queries:
+            weekly, monthly = self.reports(car)
+        self.assertEqual(len(queries), 2)  # the car lookups
+        self.assertEqual(Decimal(weekly['totals']['freight']), sum(Decimal(i) for i in range(33, 40)))
+        self.assertIn('Computed 0 report(s), 16 already cached', self.warm())
+
+        caches[REPORT_CACHE_ALIAS].clear()
+        self.assertEqual(self.reports(car), (weekly, monthly))
+
+    def test_write_invalidates_only_that_car(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('needs a file-backed SQLite test database')
+        self.warm()
+        car = self.cars[2]
+        weekly, monthly = self.reports(car)
+        DailyEntry.objects.create(car=car, inspection_date=date(2025, 10, 7), driver_name='d', freight=1000)
+        fresh_weekly, fresh_monthly = self.reports(car)
+        self.assertEqual(Decimal(fresh_weekly['totals']['freight']), Decimal(weekly['totals']['freight']) + 1000)
+        self.assertEqual(fresh_monthly, monthly)
+        self.assertIn('Computed 2 report(s), 14 already cached', self.warm())
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'reports': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'reports-test'},
+    })
+    def test_per_process_cache_turns_caching_off(self):
+        self.assertFalse(report_cache_enabled())
+        self.assertEqual([warning.id for warning in check_report_cache(None)], ['cars.W001'])
+        with self.assertRaises(CommandError):
+            self.warm()
+        weekly, _ = self.reports(self.cars[0])
+        DailyEntry.objects.create(car=self.cars[0], inspection_date=date(2025, 10, 7), driver_name='d', freight=1000)
+        self.assertNotEqual(self.reports(self.cars[0])[0], weekly)
+
+
+class SparePartTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = make_car('Other')
+        self.week = make_week(self.car, date(2025, 9, 27), description=' Oil  filter. ')
+        DailyEntry.objects.create(car=self.car, inspection_date=date(2025, 9, 29), driver_name='d', maintenance=100)
+        DailyEntry.objects.create(car=self.car, inspection_date=date(2025, 9, 30), driver_name='d', maintenance=300)
+        self.other_week = make_week(self.other, date(2025, 9, 27), description='oil filter')
+        DailyEntry.objects.create(car=self.other, inspection_date=date(2025, 10, 1), driver_name='d', maintenance=50)
+
+    def test_descriptions_share_one_normalized_part(self):
+        part = SparePart.objects.get()
+        self.assertEqual(part.name, 'Oil filter')
+        self.assertEqual(MaintenanceEntry.objects.filter(spare_part=part).count(), 3)
+
+    def test_stats_per_car_and_per_model(self):
+        response = self.client.get('/api/maintenance/parts/stats/', {'part': 'OIL FILTER'})
+        self.assertEqual(response.status_code, 200, response.data)
+        rows = response.data['rows']
+        self.assertEqual(
+            [(row['car_id'], row['count'], Decimal(row['total']), Decimal(row['average'])) for row in rows],
+            [(self.car.id, 2, Decimal('400'), Decimal('200')), (self.other.id, 1, Decimal('50'), Decimal('50'))],
+        )
+        self.assertEqual(response.json()['rows'][0]['last_replaced'], '2025-09-30')
+        response = self.client.get('/api/maintenance/parts/stats/', {'group': 'car_model', 'year': 2025})
+        self.assertEqual(
+            [(row['car_model'], row['year'], row['count']) for row in response.data['rows']],
+            [('Other', 2025, 1), ('Test car', 2025, 2)],
+        )
+
+    def test_explicit_part_survives_description_changes(self):
+        response = self.client.post('/api/maintenance/parts/', {'name': 'Brake pads'}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.client.post('/api/maintenance/parts/', {'name': 'brake  pads!'}, format='json').status_code, 400)
+        patched = self.client.patch('/api/maintenance/by-date/', {
+            'car_id': self.other.id, 'date': '2025-10-01', 'spare_part_id': response.data['id'],
+        }, format='json')
+        self.assertEqual(patched.data['spare_part_name'], 'Brake pads')
+
+        for week in (self.week, self.other_week):
+            week.description = 'Air filter'
+            week.save()
+        entry = MaintenanceEntry.objects.get(car=self.other)
+        self.assertEqual((entry.spare_part_type, entry.spare_part.name), ('Air filter', 'Brake pads'))
+        self.assertEqual(
+            {part['name']: part['entry_count'] for part in self.client.get('/api/maintenance/parts/').data},
+            {'Air filter': 2, 'Brake pads': 1, 'Oil filter': 0},
+        )
+
+
+@override_settings(SERVICE_INTERVALS={
+    'oil_change': (7000, 180), 'oil_filter': (10000, 180), 'air_filter': (20000, 365), 'gas_filter': (40000, 365),
+})
+class ServiceDueTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(10):
+            make_week(self.car, date(2025, 1, 4) + timedelta(days=7 * i), odometer_start=1000 + 700 * i, odometer_end=1700 + 700 * i)
+        MaintenanceEntry.objects.create(car=self.car, date=date(2025, 1, 7), oil_change=100)
+        self.other = make_car('Other')
+
+    def test_due_by_distance_and_date(self):
+        rows = {(row.car_id, row.service): row for row in refresh_service_due(date(2025, 3, 15))}
+        oil = rows[(self.car.id, 'oil_change')]
+        self.assertEqual((oil.odometer_at_service, oil.current_odometer, oil.km_since, oil.days_since), (1300, 8000, 6700, 67))
+        self.assertEqual((oil.status, oil.km_remaining, oil.due_date), ('due', 300, date(2025, 3, 18)))
+        air = rows[(self.car.id, 'air_filter')]
+        self.assertEqual((air.last_service_date, air.km_since, air.days_since, air.status), (None, 7000, 70, 'ok'))
+        self.assertEqual(rows[(self.other.id, 'oil_change')].status, 'unknown')
+
+        refresh_service_due(date(2025, 9, 1))
+        self.assertEqual(ServiceDue.objects.get(car=self.car, service='oil_change').status, 'overdue')
+        self.assertEqual(ServiceDue.objects.count(), 8)
+
+    def test_due_endpoint(self):
+        refresh_service_due(date(2025, 3, 15))
+        response = self.client.get('/api/maintenance/due/')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            [(row['car_id'], row['service'], row['status']) for row in response.data['cars']],
+            [(self.car.id, 'oil_change', 'due')],
+        )
+        self.assertEqual(response.data['intervals']['oil_change'], {'km': 7000, 'days': 180})
+        self.assertEqual(self.client.get('/api/maintenance/due/', {'status': 'all', 'service': 'gas_filter'}).data['count'], 2)
+        self.assertEqual(self.client.get('/api/maintenance/due/', {'status': 'late'}).status_code, 400)
+
+    def test_missing_snapshot_is_not_computed_in_the_request(self):
+        response = self.client.get('/api/maintenance/due/')
+        self.assertEqual((response.data['computed_at'], response.data['cars']), (None, []))
+        self.assertFalse(ServiceDue.objects.exists())
+        with override_settings(ASYNC_JOBS=True):
+            self.client.get('/api/maintenance/due/')
+            self.client.get('/api/maintenance/due/')
+            self.assertEqual(Job.objects.filter(job_type='compute_service_due', status=Job.PENDING).count(), 1)
+            self.assertFalse(ServiceDue.objects.exists())
+            jobs.run_pending_jobs()
+        self.assertIsNotNone(self.client.get('/api/maintenance/due/').data['computed_at'])
+
+
+class CarGroupTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.car2 = make_car('B')
+        self.car3 = make_car('C')
+        for car, k in ((self.car, 1), (self.car2, 2), (self.car3, 5)):
+            for day in (date(2025, 9, 27), date(2025, 9, 30), date(2025, 10, 2)):
+                DailyEntry.objects.create(car=car, inspection_date=day, driver_name='d', freight=100 * k, gas=10 * k)
+            make_week(car, date(2025, 9, 27), odometer_end=100 * k, driver_salary=50)
+        response = self.client.post('/api/groups/', {'name': 'North', 'car_ids': [self.car.id, self.car2.id]}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.group_id = response.data['id']
+
+    def test_weekly_rollup_matches_member_reports(self):
+        weekly = self.client.get(f'/api/groups/{self.group_id}/weekly/', {'date': '2025-10-01'}).data
+        self.assertEqual((weekly['car_count'], weekly['totals']['distance']), (2, 300))
+        self.assertEqual(Decimal(weekly['totals']['daily_totals']['freight']), Decimal('900'))
+        members = [
+            self.client.get('/api/weekly/detail/', {'car_id': car.id, 'date': '2025-10-01'}).data
+            for car in (self.car, self.car2)
+        ]
+        self.assertEqual(Decimal(weekly['totals']['net_car']), sum(Decimal(report['net_car']) for report in members))
+
+    def test_monthly_rollup_matches_member_reports(self):
+        monthly = self.client.get(f'/api/groups/{self.group_id}/monthly/', {'year': 2025, 'month': 9}).data
+        members = [
+            self.client.get('/api/monthly/detail/', {'car_id': car.id, 'year': 2025, 'month': 9}).data
+            for car in (self.car, self.car2)
+        ]
+        self.assertEqual(
+            Decimal(monthly['totals']['net_car_total']), sum(Decimal(report['net_car_total']) for report in members),
+        )
+        self.assertEqual(Decimal(monthly['totals']['daily_totals']['gas']), Decimal('60'))
+
+    def test_member_writes_and_membership_changes_refresh_rollup(self):
+        url = f'/api/groups/{self.group_id}/weekly/'
+        self.client.get(url, {'date': '2025-10-01'})
+        DailyEntry.objects.create(car=self.car2, inspection_date=date(2025, 10, 1), driver_name='d', freight=1000)
+        weekly = self.client.get(url, {'date': '2025-10-01'}).data
+        self.assertEqual(Decimal(weekly['totals']['daily_totals']['freight']), Decimal('1900'))
+
+        car_ids = [self.car.id, self.car2.id, self.car3.id]
+        response = self.client.patch(f'/api/groups/{self.group_id}/', {'car_ids': car_ids}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        weekly = self.client.get(url, {'date': '2025-10-01'}).data
+        self.assertEqual((weekly['car_count'], Decimal(weekly['totals']['daily_totals']['freight'])), (3, Decimal('3400')))
+
+    def test_rename_refreshes_rollups(self):
+        weekly, monthly = f'/api/groups/{self.group_id}/weekly/', f'/api/groups/{self.group_id}/monthly/'
+        self.assertEqual(self.client.get(weekly, {'date': '2025-10-01'}).data['name'], 'North')
+        self.assertEqual(self.client.get(monthly, {'year': 2025, 'month': 9}).data['name'], 'North')
+        response = self.client.patch(f'/api/groups/{self.group_id}/', {'name': 'North depot'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.client.get(weekly, {'date': '2025-10-01'}).data['name'], 'North depot')
+        self.assertEqual(self.client.get(monthly, {'year': 2025, 'month': 9}).data['name'], 'North depot')
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get('/api/groups/999/weekly/', {'date': '2025-10-01'}).status_code, 404)
+        monthly = f'/api/groups/{self.group_id}/monthly/'
+        for params in ({'year': 2025}, {'year': 2025, 'month': 13}, {'year': 9999, 'month': 12}):
+            self.assertEqual(self.client.get(monthly, params).status_code, 400, params)
+        response = self.client.get('/api/monthly/detail/', {'car_id': self.car.id, 'year': 9999, 'month': 12})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(EVENT_KEEPALIVE_SECONDS=0.05)
+class EventStreamTests(APITestCase):
+    def test_car_and_fleet_streams(self):
+        subscribers = get_broadcaster().subscriber_count
+        car_stream = iter(EventStream(self.car.id))
+        fleet_stream = iter(EventStream(None))
+        self.assertIn('connected', next(car_stream))
+        next(fleet_stream)
+        self.assertEqual(get_broadcaster().subscriber_count, subscribers + 2)
+
+        other = make_car('Other')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/daily-entries/', {
+                'car_id': self.car.id, 'inspection_date': '2025-10-02', 'day_name': 'Thursday', 'gas': 10,
+            }, format='json')
+            self.assertEqual(response.status_code, 201, response.data)
+            MaintenanceEntry.objects.create(car=self.car, date=date(2025, 10, 2), price=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            DailyEntry.objects.create(car=other, inspection_date=date(2025, 10, 2), day_name='Thursday')
+        frames = next(car_stream)
+        self.assertIn('event: daily_entry', frames)
+        self.assertIn('event: maintenance_entry', frames)
+        self.assertIn('"week_start":"2025-09-27"', frames)
+        self.assertNotIn(f'"car_id":{other.id}', frames)
+        self.assertIn(f'"car_id":{other.id}', next(fleet_stream) + next(fleet_stream))
+
+        car_stream.close()
+        fleet_stream.close()
+        self.assertEqual(get_broadcaster().subscriber_count, subscribers)
+
+    @override_settings(EVENT_STREAM_MAX_SECONDS=0)
+    def test_endpoint(self):
+        self.assertEqual(self.client.get('/api/events/', {'car_id': 'x'}).status_code, 400)
+        subscribers = get_broadcaster().subscriber_count
+        response = self.client.get('/api/events/', {'car_id': self.car.id}, HTTP_LAST_EVENT_ID='5')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        # The stream ends right after its opening frames
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn(': connected', content)
+        self.assertIn('event: resync', content)
+        self.assertEqual(get_broadcaster().subscriber_count, subscribers)
+        self.assertEqual(Car.objects.count(), 1)
+
+    @override_settings(EVENT_WSGI_STREAM_MAX_SECONDS=0.2)
+    def test_wsgi_streams_end_early(self):
+        start = time.monotonic()
+        frames = list(EventStream(self.car.id))
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertIn('connected', frames[0])
+
+    def test_several_processes_need_a_cross_process_broadcaster(self):
+        with mock.patch.object(events, 'server_processes', 3):
+            response = self.client.get('/api/events/', {'car_id': self.car.id})
+            self.assertEqual(response.status_code, 503)
+            with mock.patch.object(events.InProcessBroadcaster, 'cross_process', True):
+                self.assertTrue(events.streams_supported())
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class WeekLockingTests(TransactionTestCase):
+    """Concurrent writes to the same car and week leave the stored nets equal to a fresh aggregation."""
+
+    THREADS = 8
+    ENTRIES_PER_THREAD = 40
+    WEEKS = (date(2025, 9, 27), date(2025, 10, 4))
+
+    def setUp(self):
+        caches[REPORT_CACHE_ALIAS].clear()
+
+    def run_threads(self, target, count):
+        errors = []
+
+        def run(n):
+            try:
+                target(n, errors)
+            except Exception as exc:
+                errors.append(repr(exc))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_concurrent_daily_entries_and_weekly_edits(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('needs a file-backed SQLite test database')
+        cars = [make_car('A'), make_car('B')]
+        for car in cars:
+            for week_start in self.WEEKS:
+                make_week(car, week_start)
+        days = [self.WEEKS[0] + timedelta(days=i) for i in range(14)]
+
+        def post(n, errors):
+            client = APIClient()
+            rnd = random.Random(n)
+            for i in range(self.ENTRIES_PER_THREAD):
+                car, day = rnd.choice(cars), rnd.choice(days)
+                if i % 5 == 0:
+                    response = client.post('/api/weekly/', {
+                        'car_id': car.id, 'week_ref_date': day.isoformat(), 'odometer_start': 0, 'odometer_end': 10,
+                        'driver_salary': rnd.randint(0, 100), 'custody': rnd.randint(0, 20),
+                    }, format='json')
+                    if response.status_code != 201:
+                        errors.append(response.status_code)
+                response = client.post('/api/daily-entries/', {
+                    'car_id': car.id, 'inspection_date': day.isoformat(), 'day_name': day.strftime('%A'),
+                    'driver_name': 'driver', 'freight': rnd.randint(1, 500), 'default_freight': rnd.randint(0, 50),
+                    'gas': rnd.randint(0, 50),
+                }, format='json')
+                if response.status_code != 201:
+                    errors.append(response.status_code)
+
+        self.assertEqual(self.run_threads(post, self.THREADS), [])
+        self.assertEqual(DailyEntry.objects.count(), self.THREADS * self.ENTRIES_PER_THREAD)
+        for summary in WeeklySummary.objects.all():
+            nets = expected_nets(summary)
+            self.assertEqual({field: getattr(summary, field) for field in nets}, nets, (summary.car_id, summary.week_start))
+            self.assertNotEqual(summary.net_revenue, 0)
+
+    def test_recompute_waits_for_concurrent_write(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('needs a file-backed SQLite test database')
+        car = make_car()
+        week_start = self.WEEKS[0]
+        DailyEntry.objects.create(car=car, inspection_date=week_start, day_name='Saturday', driver_name='d', freight=100)
+        summary = make_week(car, week_start)
+        week_totals = recompute.week_totals
+        totals_read = threading.Event()
+
+        def slow_week_totals(*args, **kwargs):
+            totals = week_totals(*args, **kwargs)
+            if threading.current_thread().name == 'slow':
+                totals_read.set()
+                time.sleep(1)
+            return totals
+
+        def slow_recompute():
+            try:
+                recompute.recompute_week(car.id, week_start)
+            finally:
+                connection.close()
+
+        with mock.patch.object(recompute, 'week_totals', slow_week_totals):
+            thread = threading.Thread(target=slow_recompute, name='slow')
+            thread.start()
+            totals_read.wait(5)
+            # Waits for the recompute's lock, then recomputes with its own entry included
+            DailyEntry.objects.create(car=car, inspection_date=week_start, day_name='Saturday', driver_name='d', freight=50)
+            thread.join()
+        summary.refresh_from_db()
+        self.assertEqual(summary.net_revenue, Decimal('150'))
+
+
+class LoadTestHelperTests(TestCase):
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('daily_burst=2, weekly_report'), {'daily_burst': 2.0, 'weekly_report': 1.0})
+        for text in ('nope=1', 'daily_burst=x', 'daily_burst=0'):
+            with self.assertRaises(ValueError):
+                parse_mix(text)
+
+    def test_stats_and_comparison(self):
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+        self.assertEqual(percentile([], 95), 0.0)
+        stats = route_stats([3, 1, 2, 4], {'200': 3, '500': 1}, 2)
+        self.assertEqual((stats['rps'], stats['errors'], stats['error_rate'], stats['p50_ms']), (2.0, 1, 0.25, 2))
+        rows = compare({'totals': stats, 'routes': {'GET /a': stats}}, {'totals': dict(stats, rps=4.0), 'routes': {'GET /b': stats}})
+        self.assertEqual([row[0] for row in rows], ['TOTAL', 'GET /a', 'GET /b'])
+        self.assertEqual(rows[0][3]['rps'], 1.0)
+        self.assertIsNone(rows[1][2])
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class LoadTestRunTests(LiveServerTestCase):
+    def test_short_run_against_live_server(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('needs a file-backed SQLite test database')
+        caches[REPORT_CACHE_ALIAS].clear()
+        with tempfile.TemporaryDirectory() as results_dir:
+            output = os.path.join(results_dir, 'run.json')
+            call_command(
+                'load_test', '--url', self.live_server_url, '--duration', '1', '--concurrency', '2',
+                '--cars', '1', '--history-weeks', '1', '--seed', '1', '--output', output,
+                stdout=StringIO(), stderr=StringIO(),
+            )
+            with open(output) as f:
+                result = json.load(f)
+        self.assertGreater(result['totals']['requests'], 0)
+        self.assertEqual(result['totals']['errors'], 0, result['totals']['statuses'])
+        self.assertFalse(Car.objects.exists())
+
+    def test_invalid_options(self):
+        for args in (['--mix', 'nope=1'], ['--duration', '0']):
+            with self.assertRaises(CommandError):
+                call_command('load_test', '--url', self.live_server_url, *args, stdout=StringIO())
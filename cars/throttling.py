@@ -0,0 +1,123 @@
+"""
+Per-client request budgets.
+
+Every client has a token bucket per scope in the Django cache. Clients are the
+authenticated user, else the API key in THROTTLE_API_KEY_HEADER when it is one
+of THROTTLE_API_KEYS (so integrations behind one NAT address get their own
+budgets, while made-up keys cannot buy fresh ones), else the IP address. Scopes: `default` for regular CRUD calls and `reports` for
+the expensive report endpoints. A request spends its cost in tokens; buckets
+refill continuously at `rate` tokens per second up to `capacity`. Report views
+are marked with @report_endpoint(cost), which also caps how many reports one
+worker process computes at the same time, so report bursts cannot take every
+worker away from drivers' writes.
+
+Rejected requests get 429 with a Retry-After header (DRF's Throttled handling).
+With the default per-process cache the budgets are per worker; configure a
+shared cache (CACHE_BACKEND) to enforce them across workers.
+"""
+import functools
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+DEFAULT_BUCKETS = {
+    'default': {'capacity': 120, 'rate': 10.0},
+    'reports': {'capacity': 60, 'rate': 1.0},
+}
+
+_bucket_lock = threading.Lock()
+_report_slots = None
+_report_slots_lock = threading.Lock()
+
+
+def bucket_config(scope):
+    buckets = getattr(settings, 'THROTTLE_BUCKETS', DEFAULT_BUCKETS)
+    return buckets.get(scope) or DEFAULT_BUCKETS[scope]
+
+
+def client_ident(request, get_ident):
+    """Bucket owner of a DRF request; get_ident(request) gives the client IP address."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user-{user.pk}'
+    header = getattr(settings, 'THROTTLE_API_KEY_HEADER', 'X-API-Key')
+    key = request.META.get('HTTP_' + header.upper().replace('-', '_'))
+    if key and key in getattr(settings, 'THROTTLE_API_KEYS', ()):
+        # Hashed: cache keys show up in cache dumps and monitoring
+        return 'key-' + hashlib.sha256(key.encode()).hexdigest()[:32]
+    return get_ident(request)
+
+
+def take_tokens(key, cost, capacity, rate, now=None):
+    """
+    Spend `cost` tokens from the bucket stored under `key`.
+    Returns 0 when allowed, otherwise the seconds until enough tokens are available.
+    """
+    now = time.time() if now is None else now
+    with _bucket_lock:
+        tokens, updated = cache.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        if tokens >= cost:
+            wait = 0.0
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / rate
+        cache.set(key, (tokens, now), timeout=int(capacity / rate) + 60)
+    return wait
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Default throttle: each request costs `cost` tokens from the client's `scope` bucket."""
+    scope = 'default'
+    cost = 1
+
+    def allow_request(self, request, view):
+        if not getattr(settings, 'THROTTLE_ENABLED', True):
+            return True
+        ident = client_ident(request, self.get_ident)
+        config = bucket_config(self.scope)
+        self.wait_seconds = take_tokens(
+            f'throttle:{self.scope}:{ident}', self.cost, config['capacity'], config['rate'],
+        )
+        return self.wait_seconds == 0
+
+    def wait(self):
+        return self.wait_seconds
+
+
+def _slots():
+    global _report_slots
+    with _report_slots_lock:
+        if _report_slots is None:
+            _report_slots = threading.BoundedSemaphore(getattr(settings, 'REPORT_MAX_CONCURRENCY', 2))
+        return _report_slots
+
+
+def report_endpoint(cost):
+    """
+    Mark a function view as an expensive report (apply below @api_view):
+    it spends `cost` tokens from the client's reports bucket, and runs only
+    when one of the worker's REPORT_MAX_CONCURRENCY report slots is free.
+    """
+    throttle = type(f'ReportThrottle{cost}', (TokenBucketThrottle,), {'scope': 'reports', 'cost': cost})
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(request, *args, **kwargs):
+            if not getattr(settings, 'THROTTLE_ENABLED', True):
+                return func(request, *args, **kwargs)
+            slots = _slots()
+            if not slots.acquire(blocking=False):
+                raise Throttled(wait=1, detail='Too many reports are being computed, try again shortly.')
+            try:
+                return func(request, *args, **kwargs)
+            finally:
+                slots.release()
+        wrapper.throttle_classes = [throttle]
+        return wrapper
+    return decorator
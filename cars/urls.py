@@ -5,11 +5,21 @@ urlpatterns = [
     path('cars/', views.car_list_create, name='car-list-create'),
     path('cars/<int:pk>/', views.car_detail, name='car-detail'),
 
+    # Car groups (depots)
+    path('groups/', views.car_group_list_create, name='car-group-list-create'),
+    path('groups/<int:pk>/', views.car_group_detail, name='car-group-detail'),
+    path('groups/<int:pk>/weekly/', views.get_group_weekly, name='car-group-weekly'),
+    path('groups/<int:pk>/monthly/', views.get_group_monthly, name='car-group-monthly'),
+
     # Daily & weekly endpoints
     path('daily-entries/', views.create_daily_entry, name='create-daily-entry'),
+    path('daily-entries/import/', views.import_daily_entries, name='import-daily-entries'),
     path('weekly/', views.create_weekly_summary, name='create-weekly-summary'),
     path('weekly/detail/', views.get_weekly_detail, name='get-weekly-detail'),
+    path('weekly/range/', views.get_weekly_range, name='get-weekly-range'),
     path('monthly/detail/', views.get_monthly_detail, name='get-monthly-detail'),
+    path('yearly/detail/', views.get_yearly_detail, name='get-yearly-detail'),
+    path('yearly/detail/fleet/', views.get_fleet_yearly_detail, name='get-fleet-yearly-detail'),
 
     # Update by date endpoints
     path('daily-entries/by-date/', views.update_daily_entry_by_date, name='update-daily-by-date'),
@@ -19,4 +29,24 @@ urlpatterns = [
     path('maintenance/', views.create_maintenance_entry, name='create-maintenance'),
     path('maintenance/by-date/', views.update_maintenance_by_date, name='update-maintenance-by-date'),
     path('maintenance/month/', views.get_maintenance_month, name='maintenance-month'),
+    path('maintenance/parts/', views.spare_part_list, name='spare-part-list'),
+    path('maintenance/parts/stats/', views.get_spare_part_stats, name='spare-part-stats'),
+    path('maintenance/due/', views.get_service_due, name='maintenance-due'),
+
+    # Analytics
+    path('analytics/fuel-efficiency/', views.get_fuel_efficiency_analysis, name='analytics-fuel-efficiency'),
+    path('analytics/forecast/', views.get_car_forecast, name='analytics-forecast'),
+    path('analytics/forecast/fleet/', views.get_fleet_forecast, name='analytics-forecast-fleet'),
+    path('analytics/ranking/', views.get_fleet_ranking, name='analytics-ranking'),
+    path('analytics/odometer/', views.get_odometer_timeline, name='analytics-odometer'),
+
+    # Background jobs
+    path('jobs/', views.job_list, name='job-list'),
+    path('jobs/<int:pk>/', views.job_detail, name='job-detail'),
+
+    # Offline client sync
+    path('sync/', views.sync_changes, name='sync-changes'),
+
+    # Live change events (server-sent events)
+    path('events/', views.event_stream, name='event-stream'),
 ]
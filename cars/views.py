@@ -1,18 +1,54 @@
+import math
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from django.db.models import Sum
-from datetime import datetime, timedelta
-from decimal import Decimal
 
-from .models import Car, DailyEntry, WeeklySummary, week_start_from_date
+from .models import (
+    Car, CarGroup, DailyEntry, Job, MaintenanceEntry, ServiceDue, SparePart, WeeklySummary,
+    compute_weekly_nets, week_start_from_date,
+)
+from .analytics import INTERVAL_Z, fit_trend_seasonal, fuel_efficiency_outliers
+from .archive import archived_entries, archived_totals, archived_week_totals, merge_totals
+from .cache import cached_report, versioned_key
+from .events import EventStream, streams_supported
+from .groups import cached_group_monthly, cached_group_weekly
+from .importer import DailyEntryImporter, iter_file_rows
+from .jobs import dedupe_key, enqueue
+from .odometer import corrected_distances, timeline
+from .parts import STATS_GROUPS, part_key, part_stats
+from .ranking import RANKING_METRICS, fleet_ranking
+from .recompute import lock_weeks
+from .reports import fleet_totals, monthly_reports, yearly_reports
+from .sync import SyncTokenExpired, get_changes
+from .throttling import report_endpoint
 from .serializers import (
     CarSerializer,
+    CarGroupSerializer,
     DailyEntrySerializer,
     WeeklyCreateSerializer,
     WeeklyDetailSerializer,
+    WeeklyRangeSerializer,
     MonthlyDetailSerializer,
+    YearlyDetailSerializer,
+    FleetYearlySerializer,
+    FleetRankingSerializer,
     MaintenanceEntrySerializer,
+    SparePartSerializer,
+    SparePartStatSerializer,
+    ServiceDueSerializer,
+    JobSerializer,
 )
 
 
@@ -40,7 +76,8 @@ def car_detail(request, pk):
     """
     GET: Get car by id
     PUT: Update car by id
-    DELETE: Delete car by id
+    DELETE: Delete car by id with all its data. With ASYNC_JOBS the deletion runs in the
+    background and 202 is returned with the job to poll at /api/jobs/<id>/.
     """
     try:
         car = Car.objects.get(pk=pk)
@@ -59,10 +96,99 @@ def car_detail(request, pk):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     elif request.method == 'DELETE':
-        car.delete()
+        job = enqueue('delete_car', payload={'target_car_id': car.id}, dedupe=dedupe_key('delete_car', car.id))
+        if job is not None:
+            return Response({
+                'message': 'Car deletion queued',
+                'job_id': job.id,
+                'status_url': f'/api/jobs/{job.id}/',
+            }, status=status.HTTP_202_ACCEPTED)
         return Response({'message': 'Car deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
 
 
+@api_view(['GET', 'POST'])
+def car_group_list_create(request):
+    """
+    GET: Get all car groups (depots) with their member car ids
+    POST: Create a group ({"name": ..., "car_ids": [...]})
+    """
+    if request.method == 'GET':
+        groups = CarGroup.objects.prefetch_related('cars')
+        return Response(CarGroupSerializer(groups, many=True).data)
+
+    serializer = CarGroupSerializer(data=request.data)
+    if serializer.is_valid():
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
+def car_group_detail(request, pk):
+    """
+    GET: Get a car group
+    PUT/PATCH: Rename it or replace its members (car_ids)
+    DELETE: Delete the group (its cars are kept)
+    """
+    try:
+        group = CarGroup.objects.get(pk=pk)
+    except CarGroup.DoesNotExist:
+        return Response({'error': 'Car group not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'GET':
+        return Response(CarGroupSerializer(group).data)
+    if request.method == 'DELETE':
+        group.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    serializer = CarGroupSerializer(group, data=request.data, partial=request.method == 'PATCH')
+    if serializer.is_valid():
+        serializer.save()
+        return Response(serializer.data)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@report_endpoint(cost=2)
+def get_group_weekly(request, pk):
+    """
+    GET /api/groups/<id>/weekly/?date=YYYY-MM-DD
+    Week totals of a car group plus the week of each member car, from grouped queries
+    over all members. date can be any date within the target week (Sat-Fri).
+    """
+    try:
+        group = CarGroup.objects.get(pk=pk)
+    except CarGroup.DoesNotExist:
+        return Response({'error': 'Car group not found'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        ref_date = datetime.strptime(request.query_params.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return Response({'detail': 'date is a required query param (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(cached_group_weekly(group, week_start_from_date(ref_date)))
+
+
+@api_view(['GET'])
+@report_endpoint(cost=4)
+def get_group_monthly(request, pk):
+    """
+    GET /api/groups/<id>/monthly/?year=YYYY&month=MM
+    Month totals of a car group plus the month totals of each member car, following
+    the rules of the monthly detail, from grouped queries over all members.
+    """
+    try:
+        group = CarGroup.objects.get(pk=pk)
+    except CarGroup.DoesNotExist:
+        return Response({'error': 'Car group not found'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        y = int(request.query_params.get('year', ''))
+        m = int(request.query_params.get('month', ''))
+        # month_bounds() needs the first day of the following month
+        if not (1 <= y <= 9998 and 1 <= m <= 12):
+            raise ValueError
+    except ValueError:
+        return Response({'detail': 'year and month are required query params (YYYY, 1-12)'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(cached_group_monthly(group, y, m))
+
+
 # Daily entry endpoint
 @api_view(['POST'])
 def create_daily_entry(request):
@@ -74,6 +200,33 @@ def create_daily_entry(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+# Bulk import endpoint
+@api_view(['POST'])
+@report_endpoint(cost=20)
+def import_daily_entries(request):
+    """
+    POST /api/daily-entries/import/ (multipart form, field `file`: .csv or .xlsx)
+    Streams the file, validates and bulk-inserts rows in chunks, then reconciles the
+    affected weekly summaries and maintenance entries once. Returns counts and the
+    rejected rows (row number and messages, first 500). For very large files use
+    `manage.py import_daily`.
+    """
+    upload = request.FILES.get('file')
+    if not upload:
+        return Response({'detail': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+    importer = DailyEntryImporter()
+    try:
+        stats = importer.run(iter_file_rows(upload.open('rb'), upload.name))
+    except ValueError as exc:
+        return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'rows': stats['rows'],
+        'created': stats['created'],
+        'rejected': stats['errors'],
+        'errors': [{'row': number, 'errors': messages} for number, _row, messages in importer.errors[:500]],
+    }, status=status.HTTP_201_CREATED if stats['created'] else status.HTTP_200_OK)
+
+
 # Weekly creation endpoint
 @api_view(['POST'])
 def create_weekly_summary(request):
@@ -98,10 +251,14 @@ def create_weekly_summary(request):
             'perished': serializer.validated_data.get('perished') or 0,
             'description': serializer.validated_data.get('description', ''),
         }
-        obj, _created = WeeklySummary.objects.update_or_create(
-            car=car, week_start=week_start,
-            defaults=defaults
-        )
+        # Take the week's lock before update_or_create locks the row, in the order
+        # recomputes take them (cars/recompute.py), so the two cannot deadlock
+        with transaction.atomic():
+            lock_weeks([(car.id, week_start)])
+            obj, _created = WeeklySummary.objects.update_or_create(
+                car=car, week_start=week_start,
+                defaults=defaults
+            )
         # save() computes net fields
         obj.save()
         data = WeeklyDetailSerializer(_build_weekly_payload(obj)).data
@@ -111,6 +268,7 @@ def create_weekly_summary(request):
 
 # Weekly detail endpoint
 @api_view(['GET'])
+@report_endpoint(cost=1)
 def get_weekly_detail(request):
     """
     GET /api/weekly/detail/?car_id=<id>&date=YYYY-MM-DD
@@ -129,7 +287,19 @@ def get_weekly_detail(request):
     except ValueError:
         return Response({'detail': 'date must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
 
-    ws = week_start_from_date(ref_date)
+    return Response(cached_weekly_detail(car, week_start_from_date(ref_date)))
+
+
+def weekly_detail_key(car_id, ws):
+    return versioned_key('weekly_detail', ws, car_id=car_id)
+
+
+def cached_weekly_detail(car, ws):
+    """Serialized weekly detail from the report cache, computed on a miss (see cars.warmup)."""
+    return cached_report(weekly_detail_key(car.id, ws), lambda: _weekly_detail_data(car, ws))
+
+
+def _weekly_detail_data(car, ws):
     summary = WeeklySummary.objects.filter(car=car, week_start=ws).first()
     if not summary:
         # Create an in-memory summary object for this response only (do not save)
@@ -149,12 +319,85 @@ def get_weekly_detail(request):
         if not summary.week_end or summary.week_end == ws or summary.week_end < ws:
             summary.week_end = ws + timedelta(days=6)
             summary.save(update_fields=["week_end"])
-    payload = _build_weekly_payload(summary)
-    return Response(WeeklyDetailSerializer(payload).data)
+    return WeeklyDetailSerializer(_build_weekly_payload(summary)).data
+
+
+# Consecutive weekly details for charts
+MAX_RANGE_WEEKS = 104
+
+
+@api_view(['GET'])
+@report_endpoint(cost=2)
+def get_weekly_range(request):
+    """
+    GET /api/weekly/range/?car_id=<id>&from=YYYY-MM-DD&to=YYYY-MM-DD[&entries=1]
+    One weekly detail per week (Sat-Fri) from the week of `from` to the week of `to`.
+    Daily entries are only included with entries=1.
+    """
+    params = request.query_params
+    car_id = params.get('car_id')
+    if not car_id or not params.get('from') or not params.get('to'):
+        return Response({'detail': 'car_id, from and to are required query params'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        car = Car.objects.get(pk=int(car_id))
+    except (ValueError, Car.DoesNotExist):
+        return Response({'detail': 'Invalid car_id'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        week_from = week_start_from_date(datetime.strptime(params['from'], '%Y-%m-%d').date())
+        week_to = week_start_from_date(datetime.strptime(params['to'], '%Y-%m-%d').date())
+    except ValueError:
+        return Response({'detail': 'from and to must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+    n_weeks = (week_to - week_from).days // 7 + 1
+    if n_weeks < 1:
+        return Response({'detail': 'to must not be before from'}, status=status.HTTP_400_BAD_REQUEST)
+    if n_weeks > MAX_RANGE_WEEKS:
+        return Response({'detail': f'At most {MAX_RANGE_WEEKS} weeks per request'}, status=status.HTTP_400_BAD_REQUEST)
+    include_entries = params.get('entries', '').lower() in ('1', 'true', 'yes')
+
+    summaries = {
+        s.week_start: s
+        for s in WeeklySummary.objects.filter(car=car, week_start__range=(week_from, week_to))
+    }
+    live = DailyEntry.objects.filter(car=car, week_start__range=(week_from, week_to))
+    totals = {
+        row.pop('week_start'): row
+        for row in live.order_by().values('week_start').annotate(**{f: Sum(f) for f in WEEKLY_TOTAL_FIELDS})
+    }
+    for (_car, ws), sums in archived_week_totals(WEEKLY_TOTAL_FIELDS, [car.id], week_from, week_to).items():
+        merge_totals(totals.setdefault(ws, {f: None for f in WEEKLY_TOTAL_FIELDS}), sums)
+    entries_by_week = {}
+    if include_entries:
+        rows = list(live.order_by('inspection_date')) + archived_entries(car.id, week_from, week_to)
+        for entry in sorted(rows, key=lambda e: e.inspection_date):
+            entries_by_week.setdefault(entry.week_start, []).append(entry)
+
+    weeks = []
+    for i in range(n_weeks):
+        ws = week_from + timedelta(weeks=i)
+        summary = summaries.get(ws)
+        if summary is None:
+            # Same in-memory placeholder as get_weekly_detail (not saved)
+            summary = WeeklySummary(
+                car=car, week_start=ws, week_end=ws + timedelta(days=6),
+                odometer_start=0, odometer_end=0, driver_salary=0, custody=0, perished=0, description='',
+            )
+        elif not summary.week_end or summary.week_end <= ws:
+            summary.week_end = ws + timedelta(days=6)
+        aggs = dict(totals.get(ws) or {f: None for f in WEEKLY_TOTAL_FIELDS})
+        weeks.append(_build_weekly_payload(summary, aggs, entries_by_week.get(ws, [])))
+    return Response(WeeklyRangeSerializer({
+        'car_id': car.id, 'week_from': week_from, 'week_to': week_to, 'weeks': weeks,
+    }).data)
+
+
+def _use_corrected_distance(request):
+    """distance=corrected on efficiency reports: weekly distances from cars.odometer.corrected_distance."""
+    return request.query_params.get('distance') == 'corrected'
 
 
 # Monthly maintenance table endpoint
 @api_view(['GET'])
+@report_endpoint(cost=1)
 def get_maintenance_month(request):
     """
     GET /api/maintenance/month/?car_id=<id>&year=YYYY&month=MM
@@ -176,8 +419,7 @@ def get_maintenance_month(request):
     except Exception:
         return Response({'detail': 'Invalid car_id/year/month'}, status=status.HTTP_400_BAD_REQUEST)
 
-    from .models import MaintenanceEntry
-    entries = MaintenanceEntry.objects.filter(car=car, date__year=y, date__month=m).order_by('date', 'id')
+    entries = MaintenanceEntry.objects.filter(car=car, date__year=y, date__month=m).select_related('spare_part').order_by('date', 'id')
     
     # Get all entries for the year (for yearly totals)
     yearly_entries = MaintenanceEntry.objects.filter(car=car, date__year=y)
@@ -213,13 +455,15 @@ def get_maintenance_month(request):
 
 # Monthly detail endpoint
 @api_view(['GET'])
+@report_endpoint(cost=2)
 def get_monthly_detail(request):
     """
     GET /api/monthly/detail/?car_id=<id>&year=YYYY&month=MM
     Returns a monthly summary built from weekly summaries and daily entries in that month.
     - odometer_start: from the first weekly summary in the month (odometer_start)
     - odometer_end: from the last weekly summary in the month (odometer_end)
-    - distance_total: sum of weekly distances (max(0, end-start) per week)
+    - distance_total: sum of weekly distances (max(0, end-start) per week;
+      with distance=corrected the odometer-continuity corrected distance)
     - gas_total: sum of gas across all daily entries in the month
     - gas_per_km: gas_total / distance_total (0 if distance_total==0)
     - driver_salary_total, custody_total: sums from weekly summaries
@@ -234,159 +478,106 @@ def get_monthly_detail(request):
         car = Car.objects.get(pk=int(car_id))
         y = int(year)
         m = int(month)
-        if not (1 <= m <= 12):
+        if not (1 <= y <= 9998 and 1 <= m <= 12):
             raise ValueError
     except Exception:
         return Response({'detail': 'Invalid car_id/year/month'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(cached_monthly_detail(car, y, m, corrected_distance=_use_corrected_distance(request)))
 
-    # Compute month start/end
-    from datetime import date
-    if m == 12:
-        period_start = date(y, m, 1)
-        period_end = date(y + 1, 1, 1) - timedelta(days=1)
-    else:
-        period_start = date(y, m, 1)
-        period_end = date(y, m + 1, 1) - timedelta(days=1)
-
-    # Weekly summaries that start in this month
-    week_qs = WeeklySummary.objects.filter(car=car, week_start__gte=period_start, week_start__lte=period_end).order_by('week_start')
-
-    # Daily entries in this calendar month
-    daily_qs = DailyEntry.objects.filter(car=car, inspection_date__gte=period_start, inspection_date__lte=period_end)
-
-    # Aggregates from daily - get all expense fields
-    daily_aggs = daily_qs.aggregate(
-        freight=Sum('freight'), default_freight=Sum('default_freight'),
-        gas=Sum('gas'), oil=Sum('oil'), card=Sum('card'), fines=Sum('fines'), tips=Sum('tips'),
-        maintenance=Sum('maintenance'), spare_parts=Sum('spare_parts'), tires=Sum('tires'),
-        balance=Sum('balance'), washing=Sum('washing'), without=Sum('without'),
-        driver_expenses=Sum('driver_expenses')
+
+def monthly_detail_key(car_id, y, m, corrected_distance=False):
+    return versioned_key('monthly_detail', y, m, int(corrected_distance), car_id=car_id)
+
+
+def cached_monthly_detail(car, y, m, corrected_distance=False):
+    """Serialized monthly detail from the report cache, computed on a miss (see cars.warmup)."""
+    return cached_report(
+        monthly_detail_key(car.id, y, m, corrected_distance),
+        lambda: _monthly_detail_data(car, y, m, corrected_distance),
     )
-    # Normalize all to Decimal
-    def daily_dec(k):
-        return Decimal(str(daily_aggs.get(k) or 0))
-    
-    gas_total = daily_dec('gas')
-
-    # Distance and odometers from weekly
-    distance_total = 0
-    odo_start = 0
-    odo_end = 0
-    driver_salary_total = Decimal('0')
-    custody_total = Decimal('0')
-    perished_total = Decimal('0')
-    net_expenses_total = Decimal('0')
-    net_revenue_total = Decimal('0')
-    default_net_revenue_total = Decimal('0')
-    net_driver_total = Decimal('0')
-    net_car_total = Decimal('0')
-
-    weeks_list = []
-    for idx, wk in enumerate(week_qs):
-        if idx == 0:
-            odo_start = int(wk.odometer_start or 0)
-        odo_end = int(wk.odometer_end or 0)
-        dist = max(0, int((wk.odometer_end or 0) - (wk.odometer_start or 0)))
-        distance_total += dist
-
-        # Recompute weekly totals dynamically from daily entries in that week (do not trust stored net fields)
-        dqs = DailyEntry.objects.filter(car=car, week_start=wk.week_start)
-        daggs = dqs.aggregate(
-            freight=Sum('freight'), default_freight=Sum('default_freight'),
-            gas=Sum('gas'), oil=Sum('oil'), card=Sum('card'), fines=Sum('fines'), tips=Sum('tips'),
-            maintenance=Sum('maintenance'), spare_parts=Sum('spare_parts'), tires=Sum('tires'),
-            balance=Sum('balance'), washing=Sum('washing'), without=Sum('without'),
-            driver_expenses=Sum('driver_expenses')
-        )
-        def decv(k):
-            return Decimal(str(daggs.get(k) or 0))
-        weekly_expenses = (
-            decv('gas') + decv('oil') + decv('card') + decv('fines') + decv('tips') +
-            decv('maintenance') + decv('spare_parts') + decv('tires') + decv('balance') + decv('washing') + decv('without') + decv('driver_expenses')
-        ) + Decimal(str(wk.driver_salary or 0))
-        weekly_freight = decv('freight')
-        weekly_default_freight = decv('default_freight')
-        weekly_custody = Decimal(str(wk.custody or 0))
-        weekly_perished = Decimal(str(wk.perished or 0))
-        weekly_driver_salary = Decimal(str(wk.driver_salary or 0))
-        weekly_net = weekly_freight + weekly_custody - weekly_expenses
-        weekly_default_net = weekly_default_freight + weekly_custody - weekly_expenses
-        
-        # Calculate net_driver and net_car for this week
-        daily_expenses_only = weekly_expenses - weekly_driver_salary
-        weekly_net_driver = weekly_freight + weekly_custody - daily_expenses_only
-        weekly_net_car = weekly_freight + weekly_default_freight - (daily_expenses_only + weekly_driver_salary + weekly_perished)
-
-        driver_salary_total += weekly_driver_salary
-        custody_total += weekly_custody
-        perished_total += weekly_perished
-        net_expenses_total += weekly_expenses
-        net_revenue_total += weekly_net
-        default_net_revenue_total += weekly_default_net
-        net_driver_total += weekly_net_driver
-        net_car_total += weekly_net_car
-
-        weeks_list.append({
-            'week_start': wk.week_start,
-            'week_end': wk.week_end,
-            'odometer_start': wk.odometer_start,
-            'odometer_end': wk.odometer_end,
-            'distance': dist,
-            'driver_salary': wk.driver_salary,
-            'custody': wk.custody,
-            'perished': wk.perished,
-            'net_expenses': weekly_expenses,
-            'net_revenue': weekly_net,
-            'default_net_revenue': weekly_default_net,
-            'net_driver': weekly_net_driver,
-            'net_car': weekly_net_car,
-        })
 
-    gas_per_km = Decimal('0')
-    if distance_total > 0:
-        gas_per_km = (gas_total / Decimal(distance_total)).quantize(Decimal('0.0001'))
-
-    # Build daily totals dict from aggregated daily entries
-    daily_totals = {
-        'freight': daily_dec('freight'),
-        'default_freight': daily_dec('default_freight'),
-        'gas': daily_dec('gas'),
-        'oil': daily_dec('oil'),
-        'card': daily_dec('card'),
-        'fines': daily_dec('fines'),
-        'tips': daily_dec('tips'),
-        'maintenance': daily_dec('maintenance'),
-        'spare_parts': daily_dec('spare_parts'),
-        'tires': daily_dec('tires'),
-        'balance': daily_dec('balance'),
-        'washing': daily_dec('washing'),
-        'without': daily_dec('without'),
-        'driver_expenses': daily_dec('driver_expenses'),
-    }
-    
-    payload = {
-        'car_id': car.id,
-        'year': y,
-        'month': m,
-        'period_start': period_start,
-        'period_end': period_end,
-        'odometer_start': odo_start,
-        'odometer_end': odo_end,
-        'distance_total': distance_total,
-        'gas_total': gas_total,
-        'gas_per_km': gas_per_km,
-        'driver_salary_total': driver_salary_total,
-        'custody_total': custody_total,
-        'perished_total': perished_total,
-        'net_expenses_total': net_expenses_total,
-        'net_revenue_total': net_revenue_total,
-        'default_net_revenue_total': default_net_revenue_total,
-        'net_driver_total': net_driver_total,
-        'net_car_total': net_car_total,
-        'daily_totals': daily_totals,
-        'weeks': weeks_list,
-    }
-    return Response(MonthlyDetailSerializer(payload).data)
+
+def _monthly_detail_data(car, y, m, corrected_distance=False):
+    # Same month and week rules as the yearly reports: one grouped query over the month's entries
+    report = monthly_reports([car.id], y, [m], corrected_distance=corrected_distance)[car.id][0]
+    return MonthlyDetailSerializer(report).data
+
+
+# Yearly P&L endpoints
+@api_view(['GET'])
+@report_endpoint(cost=4)
+def get_yearly_detail(request):
+    """
+    GET /api/yearly/detail/?car_id=<id>&year=YYYY
+    Year totals plus the 12 monthly summaries (same fields and month/week rules as
+    /api/monthly/detail/), from one grouped query over the whole year.
+    """
+    car_id = request.query_params.get('car_id')
+    year = request.query_params.get('year')
+    if not car_id or not year:
+        return Response({'detail': 'car_id and year are required query params'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        car = Car.objects.get(pk=int(car_id))
+        y = int(year)
+        if not (1 <= y <= 9998):
+            raise ValueError
+    except Exception:
+        return Response({'detail': 'Invalid car_id/year'}, status=status.HTTP_400_BAD_REQUEST)
+    report = yearly_reports([car.id], y, corrected_distance=_use_corrected_distance(request))[car.id]
+    return Response(YearlyDetailSerializer(report).data)
+
+
+@api_view(['GET'])
+@report_endpoint(cost=15)
+def get_fleet_yearly_detail(request):
+    """
+    GET /api/yearly/detail/fleet/?year=YYYY
+    The yearly detail of every car plus fleet-wide monthly and yearly totals.
+    """
+    try:
+        y = int(request.query_params.get('year', ''))
+        if not (1 <= y <= 9998):
+            raise ValueError
+    except ValueError:
+        return Response({'detail': 'year is a required query param (YYYY)'}, status=status.HTTP_400_BAD_REQUEST)
+    reports = list(yearly_reports(
+        Car.objects.values_list('id', flat=True), y, corrected_distance=_use_corrected_distance(request),
+    ).values())
+    months, totals = fleet_totals(reports, y)
+    return Response(FleetYearlySerializer({'year': y, 'months': months, 'totals': totals, 'cars': reports}).data)
+
+
+@api_view(['GET'])
+@report_endpoint(cost=4)
+def get_fleet_ranking(request):
+    """
+    GET /api/analytics/ranking/?metric=net_car&from=YYYY-MM-DD&to=YYYY-MM-DD&n=10
+    Top and bottom n cars by the metric total over the weeks starting in [from, to],
+    with each car's rank (1 = best) and percentile (1.0 = best).
+    """
+    params = request.query_params
+    metric = params.get('metric', 'net_car')
+    if metric not in RANKING_METRICS:
+        return Response({'detail': f"metric must be one of: {', '.join(RANKING_METRICS)}"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        date_from = datetime.strptime(params.get('from', ''), '%Y-%m-%d').date()
+        date_to = datetime.strptime(params.get('to', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return Response({'detail': 'from and to are required query params (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+    if date_to < date_from:
+        return Response({'detail': 'to must not be before from'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        n = int(params.get('n', 10))
+        if not (1 <= n <= 100):
+            raise ValueError
+    except ValueError:
+        return Response({'detail': 'n must be an integer between 1 and 100'}, status=status.HTTP_400_BAD_REQUEST)
+
+    car_count, top, bottom = fleet_ranking(metric, date_from, date_to, n)
+    return Response(FleetRankingSerializer({
+        'metric': metric, 'period_start': date_from, 'period_end': date_to,
+        'car_count': car_count, 'top': top, 'bottom': bottom,
+    }).data)
 
 
 # Maintenance endpoints
@@ -414,7 +605,6 @@ def update_maintenance_by_date(request):
     except ValueError:
         return Response({'detail': 'date must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
 
-    from .models import MaintenanceEntry
     qs = MaintenanceEntry.objects.filter(car_id=car_id, date=ref_date)
     count = qs.count()
     if count == 0:
@@ -430,6 +620,99 @@ def update_maintenance_by_date(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['GET', 'POST'])
+def spare_part_list(request):
+    """
+    GET: The spare part catalog with the number of maintenance entries linked to each part
+    POST: Add a part to the catalog ({"name": ...}); entries link to it with spare_part_id
+    """
+    if request.method == 'GET':
+        parts = SparePart.objects.annotate(entry_count=Count('maintenance_entries'))
+        return Response(SparePartSerializer(parts, many=True).data)
+
+    serializer = SparePartSerializer(data=request.data)
+    if serializer.is_valid():
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@report_endpoint(cost=2)
+def get_spare_part_stats(request):
+    """
+    GET /api/maintenance/parts/stats/?group=car|car_model&part_id=<id>&part=<name>&car_id=<id>&year=YYYY
+    Count, total and average price and last replacement date of each catalog part,
+    per car (default) or per car model and year, in one grouped query.
+    - part_id or part (name, matched like descriptions), car_id and year are optional filters
+    """
+    params = request.query_params
+    group = params.get('group', 'car')
+    if group not in STATS_GROUPS:
+        return Response({'detail': f"group must be one of: {', '.join(STATS_GROUPS)}"}, status=status.HTTP_400_BAD_REQUEST)
+    part_ids = car_ids = year = None
+    try:
+        if params.get('part_id'):
+            part_ids = [int(params['part_id'])]
+        if params.get('car_id'):
+            car_ids = [int(params['car_id'])]
+        if params.get('year'):
+            year = int(params['year'])
+    except ValueError:
+        return Response({'detail': 'Invalid part_id/car_id/year'}, status=status.HTTP_400_BAD_REQUEST)
+    if params.get('part'):
+        part = SparePart.objects.filter(key=part_key(params['part'])).first()
+        if part is None:
+            return Response({'detail': 'Spare part not found.'}, status=status.HTTP_404_NOT_FOUND)
+        part_ids = [part.id] if part_ids is None or part.id in part_ids else []
+
+    rows = part_stats(group, part_ids, car_ids, year)
+    return Response({'group': group, 'rows': SparePartStatSerializer(rows, many=True).data})
+
+
+@api_view(['GET'])
+def get_service_due(request):
+    """
+    GET /api/maintenance/due/?status=due,overdue&service=oil_change&car_id=<id>
+    Cars due or overdue for an oil change or filter, most urgent first, from the
+    snapshot computed nightly by `manage.py compute_service_due`. Without a snapshot
+    the list is empty (computed_at null); with ASYNC_JOBS a compute job is queued.
+    - status: comma-separated ok, due, overdue, unknown, or all (default due,overdue)
+    - service, car_id: optional filters
+    """
+    params = request.query_params
+    statuses = params.get('status', f'{ServiceDue.DUE},{ServiceDue.OVERDUE}').split(',')
+    valid = [choice for choice, _label in ServiceDue.STATUS_CHOICES]
+    if statuses != ['all'] and not set(statuses) <= set(valid):
+        return Response({'detail': f"status must be 'all' or a comma-separated list of: {', '.join(valid)}"}, status=status.HTTP_400_BAD_REQUEST)
+    service = params.get('service')
+    if service and service not in settings.SERVICE_INTERVALS:
+        return Response({'detail': f"service must be one of: {', '.join(settings.SERVICE_INTERVALS)}"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        car_id = int(params['car_id']) if params.get('car_id') else None
+    except ValueError:
+        return Response({'detail': 'Invalid car_id'}, status=status.HTTP_400_BAD_REQUEST)
+
+    computed_at = ServiceDue.objects.aggregate(at=Max('computed_at'))['at']
+    if computed_at is None and settings.ASYNC_JOBS:
+        # A fleet-wide compute and write does not belong in a read; run_jobs does it
+        enqueue('compute_service_due')
+    rows = ServiceDue.objects.select_related('car').order_by(F('due_ratio').desc(nulls_last=True), 'car_id', 'service')
+    if statuses != ['all']:
+        rows = rows.filter(status__in=statuses)
+    if service:
+        rows = rows.filter(service=service)
+    if car_id is not None:
+        rows = rows.filter(car_id=car_id)
+    data = ServiceDueSerializer(rows, many=True).data
+    return Response({
+        'computed_at': computed_at,
+        'intervals': {name: {'km': km, 'days': days} for name, (km, days) in settings.SERVICE_INTERVALS.items()},
+        'count': len(data),
+        'cars': data,
+    })
+
+
 # Update daily entry by car and date
 @api_view(['PUT', 'PATCH'])
 def update_daily_entry_by_date(request):
@@ -499,17 +782,29 @@ def update_weekly_by_date(request):
     return Response(WeeklyDetailSerializer(payload).data)
 
 
-def _build_weekly_payload(summary: WeeklySummary):
-    """Utility: build response dict for WeeklyDetailSerializer."""
+# Column totals of a weekly detail, in response order
+WEEKLY_TOTAL_FIELDS = (
+    'freight', 'default_freight', 'gas', 'oil', 'card', 'fines', 'tips', 'maintenance',
+    'spare_parts', 'tires', 'balance', 'washing', 'without', 'driver_expenses', 'daily_expense_total',
+)
+
+
+def _build_weekly_payload(summary: WeeklySummary, aggs=None, entries=None):
+    """
+    Utility: build response dict for WeeklyDetailSerializer.
+    `aggs` (column totals incl. archived rows) and `entries` can be passed in when
+    they were loaded for several weeks at once; otherwise they are queried here.
+    """
     ws = summary.week_start
-    entries = DailyEntry.objects.filter(car=summary.car, week_start=ws).order_by('inspection_date')
-    # Aggregate column totals
-    aggs = entries.aggregate(
-        freight=Sum('freight'), default_freight=Sum('default_freight'), gas=Sum('gas'), oil=Sum('oil'), card=Sum('card'),
-        fines=Sum('fines'), tips=Sum('tips'), maintenance=Sum('maintenance'),
-        spare_parts=Sum('spare_parts'), tires=Sum('tires'), balance=Sum('balance'),
-        washing=Sum('washing'), without=Sum('without'), driver_expenses=Sum('driver_expenses')
-    )
+    if aggs is None:
+        entries = DailyEntry.objects.filter(car_id=summary.car_id, week_start=ws).order_by('inspection_date')
+        # Aggregate column totals
+        aggs = entries.aggregate(**{f: Sum(f) for f in WEEKLY_TOTAL_FIELDS})
+        # Entries of archived years are read from the columnar archive
+        merge_totals(aggs, archived_totals(summary.car_id, tuple(aggs), week_start=ws))
+        archived = archived_entries(summary.car_id, ws)
+        if archived:
+            entries = sorted(list(entries) + archived, key=lambda e: e.inspection_date)
     for k in list(aggs.keys()):
         aggs[k] = aggs[k] or 0
 
@@ -524,34 +819,13 @@ def _build_weekly_payload(summary: WeeklySummary):
         gas_per_km = (gas_total / Decimal(distance)).quantize(Decimal('0.0001'))
 
     # Dynamically recompute weekly net values so new daily entries are reflected immediately
-    def dec(v):
-        return Decimal(str(v or 0))
-    expenses = (
-        dec(aggs.get('gas')) + dec(aggs.get('oil')) + dec(aggs.get('card')) + dec(aggs.get('fines')) +
-        dec(aggs.get('tips')) + dec(aggs.get('maintenance')) + dec(aggs.get('spare_parts')) +
-        dec(aggs.get('tires')) + dec(aggs.get('balance')) + dec(aggs.get('washing')) + dec(aggs.get('without')) + dec(aggs.get('driver_expenses'))
-    ) + dec(summary.driver_salary)
-    total_freight = dec(aggs.get('freight'))
-    default_total_freight = dec(aggs.get('default_freight'))
-    custody_dec = dec(summary.custody)
-    perished_dec = dec(summary.perished)
-    driver_salary_dec = dec(summary.driver_salary)
-    
-    net_expenses = expenses
-    net_revenue = total_freight + custody_dec - expenses
-    default_net_revenue = default_total_freight + custody_dec - expenses
-    
-    # Daily expenses only (without driver_salary)
-    daily_expenses_only = expenses - driver_salary_dec
-    
-    # net_driver = (freight + custody) - daily_expenses_only (NO driver_salary)
-    net_driver = total_freight + custody_dec - daily_expenses_only
-    
-    # net_car = (freight + default_freight) - (daily_expenses_only + driver_salary + perished)
-    net_car = total_freight + default_total_freight - (daily_expenses_only + driver_salary_dec + perished_dec)
+    nets = compute_weekly_nets(
+        freight=aggs['freight'], default_freight=aggs['default_freight'], daily_expenses=aggs['daily_expense_total'],
+        driver_salary=summary.driver_salary, custody=summary.custody, perished=summary.perished,
+    )
 
     return {
-        'car_id': summary.car.id,
+        'car_id': summary.car_id,
         'week_start': summary.week_start,
         'week_end': summary.week_end,
         'odometer_start': summary.odometer_start,
@@ -562,11 +836,410 @@ def _build_weekly_payload(summary: WeeklySummary):
         'custody': summary.custody,
         'perished': summary.perished,
         'description': summary.description,
-        'net_expenses': net_expenses,
-        'net_revenue': net_revenue,
-        'default_net_revenue': default_net_revenue,
-        'net_driver': net_driver,
-        'net_car': net_car,
+        'net_expenses': nets['net_expenses'],
+        'net_revenue': nets['net_revenue'],
+        'default_net_revenue': nets['default_net_revenue'],
+        'net_driver': nets['net_driver'],
+        'net_car': nets['net_car'],
         'totals': aggs,
-        'daily_entries': DailyEntrySerializer(entries, many=True).data,
+        'daily_entries': DailyEntrySerializer(entries or [], many=True).data,
     }
+
+
+# Fleet fuel-efficiency analysis endpoint
+@api_view(['GET'])
+@report_endpoint(cost=10)
+def get_fuel_efficiency_analysis(request):
+    """
+    GET /api/analytics/fuel-efficiency/?car_id=<id>&from=YYYY-MM-DD&to=YYYY-MM-DD&window=4&z=3&min_weeks=4
+    Loads (car, week, gas, distance) for every weekly summary in one query and flags
+    weeks whose gas_per_km is a z-score outlier against that car's other weeks.
+    - car_id, from, to are optional filters (default: whole fleet, all history)
+    - window: weeks in the trailing rolling average (default 4)
+    - z: absolute z-score threshold, a positive number (default 3)
+    - min_weeks: weeks with distance a car needs before it can be flagged (default 4)
+    - distance=corrected: use odometer-continuity corrected distances (see cars.odometer)
+    """
+    params = request.query_params
+    week_qs = WeeklySummary.objects.all()
+    car_ids = date_from = date_to = None
+    try:
+        if params.get('car_id'):
+            car_ids = [int(params['car_id'])]
+            week_qs = week_qs.filter(car_id__in=car_ids)
+        if params.get('from'):
+            date_from = datetime.strptime(params['from'], '%Y-%m-%d').date()
+            week_qs = week_qs.filter(week_start__gte=date_from)
+        if params.get('to'):
+            date_to = datetime.strptime(params['to'], '%Y-%m-%d').date()
+            week_qs = week_qs.filter(week_start__lte=date_to)
+        window = int(params.get('window', 4))
+        z_threshold = float(params.get('z', 3))
+        min_weeks = int(params.get('min_weeks', 4))
+        if window < 1 or not math.isfinite(z_threshold) or z_threshold <= 0 or min_weeks < 2:
+            raise ValueError
+    except ValueError:
+        return Response({'detail': 'Invalid car_id/from/to/window/z/min_weeks'}, status=status.HTTP_400_BAD_REQUEST)
+
+    gas_sq = (
+        DailyEntry.objects.filter(car=OuterRef('car'), week_start=OuterRef('week_start'))
+        .values('car').annotate(total=Sum('gas')).values('total')
+    )
+    rows = list(
+        week_qs.order_by('car_id', 'week_start')
+        .annotate(gas_total=Coalesce(Subquery(gas_sq), Value(Decimal('0.00')), output_field=DecimalField()))
+        .values_list('car_id', 'week_start', 'odometer_start', 'odometer_end', 'gas_total')
+    )
+    if not rows:
+        return Response({'weeks_analyzed': 0, 'cars_analyzed': 0, 'flagged': []})
+    # Add gas from entries in the columnar archive
+    archived = archived_week_totals(('gas',), car_ids, week_from=date_from, week_to=date_to)
+    if archived:
+        rows = [r[:4] + (r[4] + archived.get((r[0], r[1]), {}).get('gas', 0),) for r in rows]
+
+    corrected = None
+    if _use_corrected_distance(request):
+        corrected = corrected_distances(car_ids, date_from, date_to)
+
+    car_ids, week_starts, odo_start, odo_end, gas = zip(*rows)
+    car_arr = np.array(car_ids, dtype=np.int64)
+    if corrected is not None:
+        distance = np.array([corrected[key] for key in zip(car_ids, week_starts)], dtype=np.float64)
+    else:
+        distance = np.maximum(np.array(odo_end, dtype=np.float64) - np.array(odo_start, dtype=np.float64), 0.0)
+    result = fuel_efficiency_outliers(
+        car_arr, np.array(gas, dtype=np.float64), distance,
+        window=window, z_threshold=z_threshold, min_weeks=min_weeks,
+    )
+
+    flagged = []
+    for i in np.flatnonzero(result['flagged']):
+        z_score = float(result['z_score'][i])
+        flagged.append({
+            'car_id': car_ids[i],
+            'week_start': week_starts[i],
+            'gas': gas[i],
+            'distance': int(distance[i]),
+            'gas_per_km': round(float(result['gas_per_km'][i]), 4),
+            'rolling_gas_per_km': round(float(result['rolling_gas_per_km'][i]), 4),
+            'baseline_gas_per_km': round(float(result['baseline_gas_per_km'][i]), 4),
+            # Infinite when the car's other weeks all had the same gas_per_km
+            'z_score': round(z_score, 2) if math.isfinite(z_score) else None,
+        })
+    return Response({
+        'weeks_analyzed': len(rows),
+        'cars_analyzed': int(np.unique(car_arr).size),
+        'window': window,
+        'z_threshold': z_threshold,
+        'flagged': flagged,
+    })
+
+
+@api_view(['GET'])
+@report_endpoint(cost=5)
+def get_odometer_timeline(request):
+    """
+    GET /api/analytics/odometer/?car_id=<id>&from=YYYY-MM-DD&to=YYYY-MM-DD&anomalies_only=1
+    Weekly odometer readings compared with each car's previous week (LAG() in one query):
+    distance, gap to the previous end reading, rollback/gap/overlap anomalies and the
+    corrected distance used by reports with distance=corrected.
+    - car_id, from, to are optional filters (default: whole fleet, all history)
+    """
+    params = request.query_params
+    car_ids = date_from = date_to = None
+    try:
+        if params.get('car_id'):
+            car_ids = [int(params['car_id'])]
+        if params.get('from'):
+            date_from = datetime.strptime(params['from'], '%Y-%m-%d').date()
+        if params.get('to'):
+            date_to = datetime.strptime(params['to'], '%Y-%m-%d').date()
+    except ValueError:
+        return Response({'detail': 'Invalid car_id/from/to'}, status=status.HTTP_400_BAD_REQUEST)
+    anomalies_only = params.get('anomalies_only', '').lower() in ('1', 'true', 'yes')
+
+    rows = timeline(car_ids, date_from, date_to)
+    flagged = [r for r in rows if r['anomalies']]
+    return Response({
+        'weeks_analyzed': len(rows),
+        'cars_analyzed': len({r['car_id'] for r in rows}),
+        'anomaly_count': len(flagged),
+        'distance_total': sum(max(0, r['distance']) for r in rows),
+        'corrected_distance_total': sum(r['corrected_distance'] for r in rows),
+        'weeks': flagged if anomalies_only else rows,
+    })
+
+
+FORECAST_SERIES = ('freight', 'expenses', 'net_car')
+
+
+def _load_weekly_series(grid_start, n_weeks):
+    """
+    Load weekly freight, expenses and net_car for every car on a shared weekly grid
+    with one grouped query over daily entries and one over weekly summaries.
+    Returns (car_ids, series, observed):
+    - series: (3, cars, weeks) array in FORECAST_SERIES order
+    - observed: (cars, weeks) 1.0 from each car's first recorded week onward
+    """
+    grid_end = grid_start + timedelta(days=7 * n_weeks)
+    daily = list(
+        DailyEntry.objects.filter(week_start__gte=grid_start, week_start__lt=grid_end)
+        .order_by().values('car_id', 'week_start')
+        .annotate(freight=Sum('freight'), default_freight=Sum('default_freight'), expenses=Sum('daily_expense_total'))
+        .values_list('car_id', 'week_start', 'freight', 'default_freight', 'expenses')
+    )
+    weekly = list(
+        WeeklySummary.objects.filter(week_start__gte=grid_start, week_start__lt=grid_end)
+        .order_by().values_list('car_id', 'week_start', 'driver_salary', 'custody', 'perished')
+    )
+    # Weeks from the columnar archive; scatter() adds them to live rows of the same week
+    archived = archived_week_totals(
+        ('freight', 'default_freight', 'daily_expense_total'),
+        week_from=grid_start, week_to=grid_end - timedelta(days=1),
+    )
+    daily += [
+        (car_id, week, sums['freight'], sums['default_freight'], sums['daily_expense_total'])
+        for (car_id, week), sums in archived.items()
+    ]
+    car_ids = sorted({r[0] for r in daily} | {r[0] for r in weekly})
+    row_of = {car_id: i for i, car_id in enumerate(car_ids)}
+    shape = (len(car_ids), n_weeks)
+
+    def scatter(rows, columns):
+        out = [np.zeros(shape) for _ in columns]
+        if rows:
+            r = np.array([row_of[row[0]] for row in rows])
+            c = np.array([(row[1] - grid_start).days // 7 for row in rows])
+            for target, col in zip(out, columns):
+                np.add.at(target, (r, c), np.array([row[col] or 0 for row in rows], dtype=np.float64))
+        return out
+
+    freight, default_freight, daily_expenses = scatter(daily, (2, 3, 4))
+    driver_salary, _custody, perished = scatter(weekly, (2, 3, 4))
+
+    has_data = np.zeros(shape, dtype=bool)
+    for rows in (daily, weekly):
+        if rows:
+            has_data[[row_of[row[0]] for row in rows], [(row[1] - grid_start).days // 7 for row in rows]] = True
+    first_week = np.where(has_data.any(axis=1), has_data.argmax(axis=1), n_weeks)
+    observed = (np.arange(n_weeks)[None, :] >= first_week[:, None]).astype(np.float64)
+
+    expenses = daily_expenses + driver_salary
+    net_car = freight + default_freight - (expenses + perished)
+    return car_ids, np.stack([freight, expenses, net_car]), observed
+
+
+def _get_forecast_fit(history_weeks, horizon, level):
+    """
+    Fit every car's series plus the fleet totals in one batch, cached per fleet data version.
+    Returns a dict with car_ids, last_week_start, history_points and
+    forecast/lower/upper arrays of shape (3, cars + 1, horizon); the last row is the fleet.
+    """
+    key = versioned_key('forecast', history_weeks, horizon, level)
+    return cached_report(key, lambda: _fit_forecast(history_weeks, horizon, level))
+
+
+def _fit_forecast(history_weeks, horizon, level):
+
+    # Anchor on the last complete week that has data
+    latest = [
+        DailyEntry.objects.aggregate(m=Max('week_start'))['m'],
+        WeeklySummary.objects.aggregate(m=Max('week_start'))['m'],
+    ]
+    latest = [d for d in latest if d]
+    last_complete = week_start_from_date(timezone.localdate()) - timedelta(days=7)
+    last_week = min(max(latest), last_complete) if latest else last_complete
+    grid_start = last_week - timedelta(days=7 * (history_weeks - 1))
+
+    car_ids, series, observed = _load_weekly_series(grid_start, history_weeks)
+    n_cars = len(car_ids)
+    fleet = series.sum(axis=1, keepdims=True)
+    fleet_observed = observed.max(axis=0, initial=0.0)[None, :]
+    Y = np.concatenate([series, fleet], axis=1).reshape(-1, history_weeks)
+    W = np.tile(np.concatenate([observed, fleet_observed]), (len(FORECAST_SERIES), 1))
+    harmonics = 2 if history_weeks >= 52 else 0
+    forecast, lower, upper = fit_trend_seasonal(Y, W, horizon, level=level, harmonics=harmonics)
+
+    out_shape = (len(FORECAST_SERIES), n_cars + 1, horizon)
+    fit = {
+        'car_ids': car_ids,
+        'last_week_start': last_week,
+        'history_points': np.concatenate([observed, fleet_observed]).sum(axis=1).astype(int).tolist(),
+        'forecast': forecast.reshape(out_shape),
+        'lower': lower.reshape(out_shape),
+        'upper': upper.reshape(out_shape),
+    }
+    return fit
+
+
+def _parse_forecast_params(params):
+    """Return (history_weeks, horizon_weeks, level) from query params; raise ValueError if invalid."""
+    horizon = int(params.get('horizon_weeks', 12))
+    history_weeks = int(params.get('history_weeks', 104))
+    level = int(params.get('level', 95))
+    if not (1 <= horizon <= 52) or not (8 <= history_weeks <= 520) or level not in INTERVAL_Z:
+        raise ValueError
+    return history_weeks, horizon, level
+
+
+def _forecast_payload(fit, row, horizon):
+    """Build the per-week projection list for one row of a cached forecast fit."""
+    weeks = []
+    for h in range(horizon):
+        week = {'week_start': fit['last_week_start'] + timedelta(days=7 * (h + 1))}
+        for s, name in enumerate(FORECAST_SERIES):
+            week[name] = round(float(fit['forecast'][s, row, h]), 2)
+            week[f'{name}_lower'] = round(float(fit['lower'][s, row, h]), 2)
+            week[f'{name}_upper'] = round(float(fit['upper'][s, row, h]), 2)
+        weeks.append(week)
+    return weeks
+
+
+# Forecast endpoints
+@api_view(['GET'])
+@report_endpoint(cost=5)
+def get_car_forecast(request):
+    """
+    GET /api/analytics/forecast/?car_id=<id>&horizon_weeks=12&history_weeks=104&level=95
+    Projects weekly freight, expenses and net_car for a car from a trend + yearly-seasonal
+    model fitted over its weekly history, with prediction intervals at `level` percent (80/90/95).
+    """
+    car_id = request.query_params.get('car_id')
+    if not car_id:
+        return Response({'detail': 'car_id is required query param'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        car = Car.objects.get(pk=int(car_id))
+        history_weeks, horizon, level = _parse_forecast_params(request.query_params)
+    except (ValueError, Car.DoesNotExist):
+        return Response({'detail': 'Invalid car_id/horizon_weeks/history_weeks/level'}, status=status.HTTP_400_BAD_REQUEST)
+
+    fit = _get_forecast_fit(history_weeks, horizon, level)
+    payload = {
+        'car_id': car.id,
+        'horizon_weeks': horizon,
+        'history_weeks': history_weeks,
+        'level': level,
+        'last_week_start': fit['last_week_start'],
+        'history_points': 0,
+        'forecast': [],
+    }
+    if car.id in fit['car_ids']:
+        row = fit['car_ids'].index(car.id)
+        payload['history_points'] = fit['history_points'][row]
+        payload['forecast'] = _forecast_payload(fit, row, horizon)
+    return Response(payload)
+
+
+@api_view(['GET'])
+@report_endpoint(cost=5)
+def get_fleet_forecast(request):
+    """
+    GET /api/analytics/forecast/fleet/?horizon_weeks=12&history_weeks=104&level=95
+    Same projection as the per-car forecast, for the weekly totals of the whole fleet.
+    """
+    try:
+        history_weeks, horizon, level = _parse_forecast_params(request.query_params)
+    except ValueError:
+        return Response({'detail': 'Invalid horizon_weeks/history_weeks/level'}, status=status.HTTP_400_BAD_REQUEST)
+
+    fit = _get_forecast_fit(history_weeks, horizon, level)
+    fleet_row = len(fit['car_ids'])
+    return Response({
+        'cars': len(fit['car_ids']),
+        'horizon_weeks': horizon,
+        'history_weeks': history_weeks,
+        'level': level,
+        'last_week_start': fit['last_week_start'],
+        'history_points': fit['history_points'][fleet_row],
+        'forecast': _forecast_payload(fit, fleet_row, horizon),
+    })
+
+
+# Background job status endpoints
+@api_view(['GET'])
+def job_list(request):
+    """
+    GET /api/jobs/?status=<pending|running|succeeded|failed>&job_type=<type>&car_id=<id>&limit=50
+    Most recent background jobs first.
+    """
+    qs = Job.objects.all()
+    params = request.query_params
+    if params.get('status'):
+        qs = qs.filter(status=params['status'])
+    if params.get('job_type'):
+        qs = qs.filter(job_type=params['job_type'])
+    try:
+        if params.get('car_id'):
+            qs = qs.filter(car_id=int(params['car_id']))
+        limit = int(params.get('limit', 50))
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return Response({'detail': 'Invalid car_id/limit: limit must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(JobSerializer(qs[:min(limit, 500)], many=True).data)
+
+
+@api_view(['GET'])
+def job_detail(request, pk):
+    """GET /api/jobs/<id>/: status, attempts and last error of a background job."""
+    try:
+        job = Job.objects.get(pk=pk)
+    except Job.DoesNotExist:
+        return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(JobSerializer(job).data)
+
+
+@api_view(['GET'])
+@report_endpoint(cost=1)
+def sync_changes(request):
+    """
+    GET /api/sync/?since=<token>&limit=500&car_id=<id>
+    Delta-sync feed for offline clients: created/updated cars, daily entries, weekly
+    summaries and maintenance entries plus deletes, after the position in `since`
+    (a full snapshot when omitted). Follow `next` while `has_more` is true.
+    410 when the token is older than tombstone retention: start over without `since`.
+    """
+    params = request.query_params
+    try:
+        limit = max(1, min(int(params.get('limit', 500)), 2000))
+        car_id = int(params['car_id']) if params.get('car_id') else None
+    except ValueError:
+        return Response({'detail': 'Invalid car_id/limit'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        return Response(get_changes(params.get('since'), limit=limit, car_id=car_id))
+    except SyncTokenExpired:
+        return Response({'detail': 'Sync token expired, run a full sync without since'}, status=status.HTTP_410_GONE)
+    except ValueError as exc:
+        return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+# Live change events (plain Django view: DRF renders whole responses, this one streams)
+@require_GET
+def event_stream(request):
+    """
+    GET /api/events/?car_id=<id>
+    Server-sent events with a compact delta for every daily entry, weekly summary and
+    maintenance entry write of one car (or the whole fleet without car_id), so dashboards
+    update without polling the weekly detail. See cars/events.py.
+    """
+    car_id = None
+    if request.GET.get('car_id'):
+        try:
+            car_id = int(request.GET['car_id'])
+        except ValueError:
+            return JsonResponse({'detail': 'Invalid car_id'}, status=400)
+        if not Car.objects.filter(pk=car_id).exists():
+            return JsonResponse({'detail': 'Invalid car_id'}, status=400)
+
+    if not streams_supported():
+        return JsonResponse({
+            'detail': 'Live events need EVENT_BROADCASTER=cars.events.PostgresBroadcaster when several server processes serve the API',
+        }, status=503)
+
+    stream = EventStream(car_id, resumed='HTTP_LAST_EVENT_ID' in request.META)
+    # Under ASGI the stream is iterated on the event loop and holds no thread
+    content = stream.__aiter__() if isinstance(request, ASGIRequest) else iter(stream)
+    response = StreamingHttpResponse(content, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop Nginx from buffering the stream
+    return response
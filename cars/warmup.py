@@ -0,0 +1,183 @@
+"""
+Warm-up of server workers and of the report cache.
+
+Workers (gunicorn.conf.py): Django imports views, serializers and their dependencies (NumPy for the
+analytics) lazily on the first request that resolves a URL, and opens a
+database connection per thread on its first query. Under a cold worker the
+first requests pay for both. These helpers do that work before a worker
+accepts traffic: import_app() in the gunicorn master (shared with the forked
+workers when preload_app is on), warm_worker() in each worker.
+
+Report cache (`manage.py warm_reports`): when a new week or month starts every
+dashboard asks for its car's weekly and monthly detail at once, each computed
+cold. warm_report_cache() computes them ahead of time and stores them under
+the same data-versioned keys the views read, so they stay valid until the
+car's data changes. This needs a 'reports' cache shared with the web workers
+(REPORT_CACHE_BACKEND, file-based by default); a per-process backend turns
+report caching off and there is nothing to warm.
+"""
+import importlib
+import logging
+import queue
+import threading
+from datetime import timedelta
+
+from django.db import connection, connections
+from django.urls import get_resolver
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+WARM_MODULES = (
+    'numpy',
+    'cars.views',
+    'cars.serializers',
+    'cars.reports',
+    'cars.ranking',
+    'cars.odometer',
+    'cars.groups',
+    'cars.analytics',
+    'cars.sync',
+    'cars.admin',
+)
+
+# Seconds to wait for every worker thread to pick up its warm-up task
+THREAD_WARMUP_TIMEOUT = 10
+
+
+def import_app():
+    """Import the request-path modules and build the URL resolver."""
+    from rest_framework.settings import api_settings
+
+    for name in WARM_MODULES:
+        importlib.import_module(name)
+    get_resolver().resolve('/api/cars/')
+    # DRF imports its default classes on first access
+    for setting in ('DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES', 'DEFAULT_AUTHENTICATION_CLASSES',
+                    'DEFAULT_PERMISSION_CLASSES', 'DEFAULT_THROTTLE_CLASSES', 'DEFAULT_CONTENT_NEGOTIATION_CLASS'):
+        getattr(api_settings, setting)
+
+
+def open_connections():
+    """Open (and check) this thread's connection to every configured database."""
+    for conn in connections.all():
+        conn.ensure_connection()
+        if conn.vendor == 'postgresql':
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+
+
+def prime_caches():
+    """Load the values every request reads first into this worker's cache."""
+    from .cache import get_data_version
+    get_data_version()
+
+
+def warm_worker(thread_pool=None, threads=1):
+    """
+    Warm one worker process. With a thread pool (gthread workers) every pool thread
+    opens its own connection, since Django connections are per thread.
+    """
+    import_app()
+    prime_caches()
+    if thread_pool is None:
+        open_connections()
+        return
+    barrier = threading.Barrier(threads)
+
+    def warm_thread():
+        # Hold each task until all threads have one, so every thread gets warmed
+        try:
+            barrier.wait(THREAD_WARMUP_TIMEOUT)
+        except threading.BrokenBarrierError:
+            pass
+        open_connections()
+
+    for future in [thread_pool.submit(warm_thread) for _ in range(threads)]:
+        try:
+            future.result()
+        except Exception:
+            logger.exception('Worker thread warm-up failed')
+
+
+def report_periods(ref_date=None):
+    """(week starts, (year, month) pairs) of the current and previous week and month."""
+    from .models import week_start_from_date
+
+    ref_date = ref_date or timezone.localdate()
+    week = week_start_from_date(ref_date)
+    first = ref_date.replace(day=1)
+    previous = first - timedelta(days=1)
+    return [week, week - timedelta(days=7)], [(first.year, first.month), (previous.year, previous.month)]
+
+
+def shared_cache():
+    """False when report caching is off (per-process reports cache): entries warmed here would not reach the server."""
+    from .cache import report_cache_enabled
+    return report_cache_enabled()
+
+
+def warm_report_cache(car_ids=None, ref_date=None, workers=4, force=False, on_car=None):
+    """
+    Compute the weekly and monthly details of the current and previous periods for
+    every car (or car_ids) into the report cache, `workers` cars at a time.
+    Entries already cached for the current data version are skipped unless force.
+    Returns (computed, skipped); on_car(car_id, computed, skipped) is called per car.
+    """
+    from .cache import REPORT_CACHE_TIMEOUT, cache
+    from .models import Car
+    from .views import _monthly_detail_data, _weekly_detail_data, monthly_detail_key, weekly_detail_key
+
+    if not shared_cache():
+        # Entries would land in this process only, where the server never reads them
+        logger.warning('Report caching is off (per-process reports cache), nothing to warm')
+        return 0, 0
+    weeks, months = report_periods(ref_date)
+    cars = Car.objects.order_by('id')
+    if car_ids is not None:
+        cars = cars.filter(id__in=car_ids)
+    pending = queue.SimpleQueue()
+    for car in cars:
+        pending.put(car)
+    totals = {'computed': 0, 'skipped': 0}
+    lock = threading.Lock()
+
+    def warm_car(car):
+        # Same keys and builders as cached_weekly_detail / cached_monthly_detail in views
+        tasks = [(weekly_detail_key(car.id, ws), _weekly_detail_data, (car, ws)) for ws in weeks]
+        tasks += [(monthly_detail_key(car.id, y, m), _monthly_detail_data, (car, y, m)) for y, m in months]
+        computed = skipped = 0
+        for key, build, args in tasks:
+            if not force and cache.get(key) is not None:
+                skipped += 1
+                continue
+            cache.set(key, build(*args), REPORT_CACHE_TIMEOUT)
+            computed += 1
+        return computed, skipped
+
+    def work():
+        try:
+            while True:
+                try:
+                    car = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    computed, skipped = warm_car(car)
+                except Exception:
+                    logger.exception('Warming reports of car %s failed', car.id)
+                    continue
+                with lock:
+                    totals['computed'] += computed
+                    totals['skipped'] += skipped
+                    if on_car:
+                        on_car(car.id, computed, skipped)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=work) for _ in range(max(1, workers))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return totals['computed'], totals['skipped']
@@ -0,0 +1,26 @@
+"""
+Process pool entry points for management commands.
+
+A worker started with the spawn or forkserver method imports this module
+before Django is set up, so it must not import models at module level:
+init_worker() sets Django up and the entry points import what they need
+when they run.
+"""
+import os
+
+
+def init_worker():
+    """Process pool initializer: make Django usable in a freshly started worker process."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def recompute_partition(car_ids, date_from=None, date_to=None):
+    """Recompute one partition of cars. Returns (car_ids, checked, changed)."""
+    from .recompute import recompute_weekly_summaries
+
+    checked, changed = recompute_weekly_summaries(car_ids, date_from, date_to)
+    return car_ids, checked, changed
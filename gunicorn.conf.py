@@ -0,0 +1,75 @@
+"""
+Production gunicorn profile (Linux).
+
+    gunicorn -c gunicorn.conf.py
+
+Every setting can be overridden with an environment variable (below) or on the
+command line. Measure a change with `python manage.py bench_server`.
+
+- gthread workers with keep-alive; with PostgreSQL each process serves
+  GUNICORN_THREADS requests at once, so a slow report does not block a
+  driver's write on the same worker.
+- preload_app: Django, the views and NumPy are imported once in the master and
+  shared copy-on-write by the workers, so workers start (and restart) quickly.
+- Each worker imports the request path, primes its cache and opens a database
+  connection per thread (cars/warmup.py) before it accepts traffic.
+- max_requests with jitter recycles workers one at a time to bound memory growth.
+"""
+import multiprocessing
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+wsgi_app = 'project.wsgi:application'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# With PostgreSQL (DATABASE_URL) requests spend much of their time waiting on the
+# database, so 2n+1 processes with 4 threads each keep the CPUs busy. SQLite runs
+# inside the process and the reports are CPU-bound Python, so there single-threaded
+# processes, one per core, are fastest (extra threads only add GIL contention); at
+# least two, so one keeps serving while the other is recycled by max_requests.
+_postgres = bool(os.environ.get('DATABASE_URL'))
+_cpus = multiprocessing.cpu_count()
+workers = _env_int('WEB_CONCURRENCY', min(_cpus * 2 + 1, 9) if _postgres else max(2, _cpus))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = _env_int('GUNICORN_THREADS', 4 if _postgres else 1)
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+
+# Keep client connections open between requests (behind Nginx use a few seconds more than its keepalive)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+timeout = _env_int('GUNICORN_TIMEOUT', 60)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 200)
+backlog = _env_int('GUNICORN_BACKLOG', 2048)
+
+# Heartbeat files on tmpfs, so a slow disk cannot make healthy workers look stuck
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+# Set GUNICORN_ACCESS_LOG= (empty) to turn the access log off, e.g. when Nginx already logs requests
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    # With preload_app Django is already set up here; import the rest of the request
+    # path once so the forked workers share it, and fork without open connections.
+    if server.cfg.preload_app:
+        from django.db import connections
+        from cars.warmup import import_app
+        import_app()
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    from cars.events import set_server_processes
+    from cars.warmup import warm_worker
+    # With several workers, /api/events/ needs a broadcaster that crosses processes
+    set_server_processes(worker.cfg.workers)
+    warm_worker(getattr(worker, 'tpool', None), worker.cfg.threads)
+    worker.log.info('Worker %s warmed up', worker.pid)
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'cars.middleware.CompressionMiddleware',  # gzip/brotli for API responses
     'whitenoise.middleware.WhiteNoiseMiddleware',  # For serving static files in production
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -54,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'cars.profiling.ProfilingMiddleware',  # staff-only ?_profile=1 on API views
 ]
 
 ROOT_URLCONF = 'project.urls'
@@ -97,10 +99,87 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # SQLite has one writer at a time: transactions take the write lock when
+                # they begin and wait up to 20 s for it, instead of failing with
+                # "database is locked" when concurrent requests write to the same week
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+            # A file, not the default in-memory database: the locking tests write from
+            # several threads, which needs SQLite's file locks
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
 
 
+# Cache
+# 'default' holds per-process state such as throttle budgets (cars/throttling.py).
+# 'reports' holds the data versions and cached reports (cars/cache.py). It must be
+# shared by every worker process and by management commands, which bump versions
+# and warm reports: by default a file-based cache on this machine. With several
+# servers use a networked backend (e.g. django.core.cache.backends.redis.RedisCache).
+# On a per-process backend (LocMemCache) reports are not cached at all.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'car-management'),
+    },
+    'reports': {
+        'BACKEND': os.environ.get('REPORT_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('REPORT_CACHE_LOCATION', str(BASE_DIR / 'cache' / 'reports')),
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('REPORT_CACHE_MAX_ENTRIES', '20000'))},
+    },
+}
+
+# Seconds a cached report may live before it is recomputed, even if no write bumped its version
+REPORT_CACHE_TIMEOUT = int(os.environ.get('REPORT_CACHE_TIMEOUT', '300'))
+
+
+# Background jobs (cars/jobs.py)
+# When True, derived-data updates are queued and executed by `manage.py run_jobs`;
+# when False they run inline during the request.
+ASYNC_JOBS = os.environ.get('ASYNC_JOBS', 'False') == 'True'
+
+
+# Maintenance due predictions (cars/service_due.py): interval per service type in km and days,
+# whichever runs out first. A service is due once DUE_RATIO of either interval is used up.
+SERVICE_INTERVALS = {
+    'oil_change': (int(os.environ.get('SERVICE_OIL_CHANGE_KM', '10000')), int(os.environ.get('SERVICE_OIL_CHANGE_DAYS', '180'))),
+    'oil_filter': (int(os.environ.get('SERVICE_OIL_FILTER_KM', '10000')), int(os.environ.get('SERVICE_OIL_FILTER_DAYS', '180'))),
+    'air_filter': (int(os.environ.get('SERVICE_AIR_FILTER_KM', '20000')), int(os.environ.get('SERVICE_AIR_FILTER_DAYS', '365'))),
+    'gas_filter': (int(os.environ.get('SERVICE_GAS_FILTER_KM', '40000')), int(os.environ.get('SERVICE_GAS_FILTER_DAYS', '365'))),
+}
+SERVICE_DUE_RATIO = float(os.environ.get('SERVICE_DUE_RATIO', '0.9'))
+
+
+# Columnar archive of closed years of daily entries (cars/archive.py)
+ARCHIVE_ROOT = os.environ.get('ARCHIVE_ROOT', str(BASE_DIR / 'archive'))
+# Memory-mapped column files each process keeps open (one file descriptor each), well below `ulimit -n`
+ARCHIVE_MAX_OPEN_FILES = int(os.environ.get('ARCHIVE_MAX_OPEN_FILES', '256'))
+
+# Where ?_profile=file saves request profiles (cars/profiling.py)
+PROFILE_DIR = os.environ.get('PROFILE_DIR', str(BASE_DIR / 'profiles'))
+
+
+# Delta-sync feed for offline clients (cars/sync.py)
+# Changes are served once they are this many seconds old, so late-committing writes are not skipped
+SYNC_SETTLE_SECONDS = int(os.environ.get('SYNC_SETTLE_SECONDS', '2'))
+# Tombstones of deleted rows are kept this long; older sync tokens get 410 and must resync
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', '90'))
+
+
+# Live change events (cars/events.py, GET /api/events/)
+# cars.events.InProcessBroadcaster reaches the streams of this process only (one ASGI process);
+# cars.events.PostgresBroadcaster relays writes between processes through PostgreSQL LISTEN/NOTIFY.
+EVENT_BROADCASTER = os.environ.get('EVENT_BROADCASTER', 'cars.events.InProcessBroadcaster')
+EVENT_KEEPALIVE_SECONDS = int(os.environ.get('EVENT_KEEPALIVE_SECONDS', '15'))
+# Streams are closed after this long and reconnected by the client
+EVENT_STREAM_MAX_SECONDS = int(os.environ.get('EVENT_STREAM_MAX_SECONDS', '3600'))
+# Shorter under WSGI, where every open stream holds a worker thread
+EVENT_WSGI_STREAM_MAX_SECONDS = int(os.environ.get('EVENT_WSGI_STREAM_MAX_SECONDS', '60'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -146,8 +225,45 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings (optional)
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 10
+    'PAGE_SIZE': 10,
+    # orjson-based JSON output, identical to the stock JSONRenderer (cars/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'cars.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    # Per-client token buckets (cars/throttling.py); report views use @report_endpoint(cost)
+    'DEFAULT_THROTTLE_CLASSES': [
+        'cars.throttling.TokenBucketThrottle',
+    ],
+    # Set to the number of reverse proxies in front of the app so clients are told apart by X-Forwarded-For
+    'NUM_PROXIES': int(os.environ['NUM_PROXIES']) if os.environ.get('NUM_PROXIES') else None,
+}
+
+# Request budgets: a bucket holds up to `capacity` tokens and refills at `rate` tokens per second.
+# CRUD requests cost 1 token from `default`; reports cost 1-20 tokens from `reports`.
+THROTTLE_ENABLED = os.environ.get('THROTTLE_ENABLED', 'True') == 'True'
+THROTTLE_BUCKETS = {
+    'default': {
+        'capacity': int(os.environ.get('THROTTLE_DEFAULT_CAPACITY', '120')),
+        'rate': float(os.environ.get('THROTTLE_DEFAULT_RATE', '10')),
+    },
+    'reports': {
+        'capacity': int(os.environ.get('THROTTLE_REPORTS_CAPACITY', '60')),
+        'rate': float(os.environ.get('THROTTLE_REPORTS_RATE', '1')),
+    },
 }
+# API keys with their own budgets, sent in THROTTLE_API_KEY_HEADER (comma-separated;
+# other clients are told apart by user, else IP address)
+THROTTLE_API_KEY_HEADER = os.environ.get('THROTTLE_API_KEY_HEADER', 'X-API-Key')
+THROTTLE_API_KEYS = frozenset(key.strip() for key in os.environ.get('THROTTLE_API_KEYS', '').split(',') if key.strip())
+# Reports computed at the same time by one worker process; more get 429
+REPORT_MAX_CONCURRENCY = int(os.environ.get('REPORT_MAX_CONCURRENCY', '2'))
+
+# Response compression (cars/middleware.py): Brotli when the client accepts it and
+# the brotli package is installed, otherwise gzip; smaller responses are sent as is
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', '6'))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', '5'))
 
 # CORS configuration
 # Allow specific production frontend and local dev ports starting with 300x